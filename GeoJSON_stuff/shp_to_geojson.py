@@ -2,6 +2,7 @@ import geopandas as gpd
 import pyproj
 from shapely.ops import transform
 import json
+import sys
 
 # Function to reproject geometry
 def reproject_geometry(geometry, src_crs, dest_crs):
@@ -10,7 +11,10 @@ def reproject_geometry(geometry, src_crs, dest_crs):
 
 # File paths
 input_shapefile = '/workspaces/asbestos-dashboard-heroku/GeoJSON_stuff/Shapefile/electoral_districs_can/lfed000b21a_e.shp'
-output_geojson = 'fed_electoral_output_geojson_manitoba.geojson'
+# Province to keep, as a Statistics Canada PRUID (46 = Manitoba). Pass another one on the command line,
+# e.g. `python shp_to_geojson.py 47` for Saskatchewan.
+pruid = sys.argv[1] if len(sys.argv) > 1 else "46"
+output_geojson = f'fed_electoral_output_geojson_{pruid}.geojson' if pruid != "46" else 'fed_electoral_output_geojson_manitoba.geojson'
 
 # Read the shapefile
 gdf = gpd.read_file(input_shapefile)
@@ -24,7 +28,7 @@ gdf = gdf.to_crs(dest_crs)
 
 # Filter the GeoDataFrame for specific province
 # gdf_filtered = gdf[gdf['PRNAME'] == 'Manitoba']
-gdf_filtered = gdf[gdf['PRUID'] == "46"]
+gdf_filtered = gdf[gdf['PRUID'] == pruid]
 
 # Save to GeoJSON - uncomment if filtering for specific province
 gdf_filtered.to_file(output_geojson, driver='GeoJSON')
@@ -0,0 +1,245 @@
+# Replays realistic dropdown sessions against the Dash callback endpoint at rising concurrency.
+#
+# Usage:
+#   python Scaling/seed_synthetic_data.py --database-url sqlite:///loadtest.sqlite
+#   DATABASE_URL=sqlite:///loadtest.sqlite MAPBOX_ACCESS_TOKEN=... gunicorn app:server &
+#   python Scaling/load_test.py --url http://127.0.0.1:8000 --concurrency 1,2,4,8,16 --duration 30
+
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGGREGATE_CSV = os.path.join(REPO_ROOT, 'CSV_DATA_FILES', 'aggregateByFSA_asbestos_data.csv')
+
+# Component properties the dashboard callbacks read
+INPUTS = {
+    'area': ('area-dropdown', 'value'),
+    'condition': ('condition-dropdown', 'value'),
+    'condition_mode': ('condition-mode', 'value'),
+    'map': ('map-dropdown', 'value'),
+    'table': ('table-dropdown', 'value'),
+    'pathname': ('url', 'pathname'),
+    'search': ('search-input', 'value'),
+    'region': ('region-dropdown', 'value'),
+    'boundary': ('boundary-dropdown', 'value'),
+    'map_state': ('map-state', 'data'),
+}
+
+# Outputs, inputs and states of each callback, in the order they are registered in callbacks_and_layout.py
+CALLBACKS = {
+    'update_chart': ([('area-chart', 'figure')], ['area', 'condition', 'condition_mode', 'pathname', 'region', 'boundary'], []),
+    'update_map': ([('map-plot', 'figure'), ('map-state', 'data')], ['area', 'condition', 'condition_mode', 'map', 'pathname', 'region', 'boundary'], ['map_state']),
+    'update_table': ([('pivot-table', 'data'), ('search-summary', 'children')], ['area', 'condition', 'condition_mode', 'table', 'pathname', 'search', 'region'], []),
+}
+
+CONDITIONS = [
+    'All Conditions', 'Vermiculite', 'Piping', 'Drywall', 'Insulation', 'Tiling', 'Floor_Tiles',
+    'Ceiling_Tiles', 'Ducting', 'Plaster', 'Stucco_Stipple', 'Fittings'
+]
+MAP_TYPES = ['Point Scatter Map', 'Density Heatmap', 'Choropleth Tile Map']
+TABLE_TYPES = ['Notifications', 'Totals', 'Percentages', 'Co-occurrence']
+
+# How often a user changes each dropdown during a session
+CHANGE_WEIGHTS = {'area': 0.4, 'condition': 0.3, 'map': 0.15, 'table': 0.15}
+
+
+def load_areas():
+    """
+    Reads the FSA codes used for the area dropdown.
+
+    Returns:
+    list: "All Areas" followed by the FSA codes.
+    """
+    fsa_df = pd.read_csv(AGGREGATE_CSV)
+    codes = [fsa for fsa in fsa_df['Forward_Sortation_Area'].dropna().unique() if fsa not in ('Total', 'Overall')]
+    return ['All Areas'] + codes
+
+
+def build_payload(callback, state, changed):
+    """
+    Builds the JSON body the Dash renderer posts to _dash-update-component.
+
+    Parameters:
+    callback (str): The callback name in CALLBACKS.
+    state (dict): The current value of every input.
+    changed (str): The input that triggered the callback.
+
+    Returns:
+    dict: The request body.
+    """
+    outputs, input_names, state_names = CALLBACKS[callback]
+    if len(outputs) == 1:
+        output_id, output_prop = outputs[0]
+        output = f"{output_id}.{output_prop}"
+        outputs_spec = {'id': output_id, 'property': output_prop}
+    else:
+        output = '..' + '...'.join(f"{output_id}.{output_prop}" for output_id, output_prop in outputs) + '..'
+        outputs_spec = [{'id': output_id, 'property': output_prop} for output_id, output_prop in outputs]
+    return {
+        'output': output,
+        'outputs': outputs_spec,
+        'inputs': [
+            {'id': INPUTS[name][0], 'property': INPUTS[name][1], 'value': state[name]}
+            for name in input_names
+        ],
+        'changedPropIds': [f"{INPUTS[changed][0]}.{INPUTS[changed][1]}"],
+        'state': [
+            {'id': INPUTS[name][0], 'property': INPUTS[name][1], 'value': state[name]}
+            for name in state_names
+        ],
+    }
+
+
+def post_callback(url, payload, timeout):
+    """
+    Posts one callback request.
+
+    Returns:
+    tuple: The latency in seconds, whether the request succeeded and the response body. 204 counts
+    as success because it is what Dash returns for PreventUpdate.
+    """
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/_dash-update-component",
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    start = time.perf_counter()
+    body = b''
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            ok = response.status in (200, 204)
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - start, ok, body
+
+
+def run_session(url, region, areas, deadline, results, lock, rng, think_time, timeout):
+    """
+    Simulates one user: loads the home page, then keeps changing dropdowns until the deadline.
+
+    Each change fires every callback that reads the changed dropdown, as the browser would, and
+    component state returned by the server (such as map-state) is sent back on the next call.
+    """
+    state = {
+        'area': 'All Areas',
+        'condition': 'All Conditions',
+        'condition_mode': 'OR',
+        'map': 'Point Scatter Map',
+        'table': 'Notifications',
+        'pathname': '/',
+        'search': None,
+        'region': region,
+        'boundary': 'fsa',
+        'map_state': None,
+    }
+    changed = 'pathname'
+    while time.time() < deadline:
+        for callback, (outputs, input_names, _) in CALLBACKS.items():
+            if changed not in input_names:
+                continue
+            latency, ok, body = post_callback(url, build_payload(callback, state, changed), timeout)
+            with lock:
+                results[callback].append((latency, ok, len(body)))
+            if ok and body and ('map-state', 'data') in outputs:
+                state['map_state'] = json.loads(body)['response'].get('map-state', {}).get('data', state['map_state'])
+
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+        changed = rng.choices(list(CHANGE_WEIGHTS), weights=list(CHANGE_WEIGHTS.values()))[0]
+        choices = {'area': areas, 'condition': CONDITIONS, 'map': MAP_TYPES, 'table': TABLE_TYPES}[changed]
+        state[changed] = rng.choice(choices)
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return float('nan')
+    # Rounded first so float noise such as 0.07 * 100 = 7.000000000000001 does not push the rank up by one
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(round(fraction * len(sorted_values), 9)) - 1))
+    return sorted_values[rank]
+
+
+def run_level(url, region, areas, concurrency, duration, think_time, timeout, seed):
+    """
+    Runs concurrent sessions for a fixed duration.
+
+    Returns:
+    dict: The (latency, ok, response bytes) samples per callback.
+    """
+    results = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(concurrency):
+            pool.submit(run_session, url, region, areas, deadline, results, lock, random.Random(seed + i), think_time, timeout)
+    return results
+
+
+def summarize(concurrency, duration, results):
+    """
+    Builds one report row per callback for a concurrency level.
+
+    Returns:
+    list: Dictionaries with throughput, latency percentiles, mean response size and error rate.
+    """
+    rows = []
+    for callback in CALLBACKS:
+        samples = results.get(callback, [])
+        latencies = sorted(latency * 1000 for latency, _, _ in samples)
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        rows.append({
+            'concurrency': concurrency,
+            'callback': callback,
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / duration, 2),
+            'p50_ms': round(percentile(latencies, 0.50), 1),
+            'p95_ms': round(percentile(latencies, 0.95), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'mean_kb': round(sum(size for _, _, size in samples) / len(samples) / 1024, 1) if samples else 0.0,
+            'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard callbacks.")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--region', default='MB', help="Region code selected by every simulated user")
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32', help="Comma-separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument('--think-time', type=float, default=0, help="Mean pause between dropdown changes, in seconds")
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Optional CSV file for the report")
+    args = parser.parse_args()
+
+    areas = load_areas()
+    report = []
+    for concurrency in [int(level) for level in args.concurrency.split(',')]:
+        print(f"Running {concurrency} concurrent users for {args.duration}s...")
+        results = run_level(args.url, args.region, areas, concurrency, args.duration, args.think_time, args.timeout, args.seed)
+        report.extend(summarize(concurrency, args.duration, results))
+
+    report_df = pd.DataFrame(report)
+    print(report_df.to_string(index=False))
+    if args.output:
+        report_df.to_csv(args.output, index=False)
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+# Measures how long a freshly started app takes to serve the first rendered dashboard.
+#
+# Each run starts the server, then records the time from process start until:
+#   healthz - the server answers /healthz
+#   layout  - the Dash index page and layout are served
+#   render  - the page and the landing chart, map and table callbacks have all returned
+#   ready   - /ready reports that warm-up has finished
+#
+# Usage:
+#   DATABASE_URL=sqlite:///loadtest.sqlite MAPBOX_ACCESS_TOKEN=... python Scaling/measure_cold_start.py --runs 5
+#   python Scaling/measure_cold_start.py --clear-cache   # also start without the serving cache on disk
+
+import argparse
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from load_test import CALLBACKS, build_payload, post_callback
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LANDING_STATE = {
+    'area': 'All Areas',
+    'condition': 'All Conditions',
+    'condition_mode': 'OR',
+    'map': 'Point Scatter Map',
+    'table': 'Notifications',
+    'pathname': '/',
+    'search': None,
+    'boundary': 'fsa',
+}
+
+
+def get_status(url, timeout=2):
+    """
+    Fetches a URL and returns its status code, or None if the server is not answering yet.
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+def wait_for(url, statuses, deadline, interval=0.02):
+    """
+    Polls a URL until it answers with one of the given statuses.
+
+    Returns:
+    float: The time it did, or None if the deadline passed first.
+    """
+    while time.time() < deadline:
+        if get_status(url) in statuses:
+            return time.time()
+        time.sleep(interval)
+    return None
+
+
+def render_landing_page(url, region, timeout):
+    """
+    Requests what the browser needs to draw the landing page: the index, the layout,
+    the page content and the chart, map and table callbacks, which the browser fires in parallel.
+
+    Returns:
+    bool: Whether every request succeeded.
+    """
+    base = url.rstrip('/')
+    if get_status(f"{base}/", timeout) != 200 or get_status(f"{base}/_dash-layout", timeout) != 200:
+        return False
+
+    page = {
+        'output': 'page-content.children',
+        'outputs': {'id': 'page-content', 'property': 'children'},
+        'inputs': [{'id': 'url', 'property': 'pathname', 'value': '/'}],
+        'changedPropIds': ['url.pathname'],
+        'state': [],
+    }
+    _, ok, _ = post_callback(url, page, timeout)
+    if not ok:
+        return False
+
+    state = {**LANDING_STATE, 'region': region, 'map_state': None}
+    with ThreadPoolExecutor(max_workers=len(CALLBACKS)) as pool:
+        results = list(pool.map(lambda callback: post_callback(url, build_payload(callback, state, 'pathname'), timeout), CALLBACKS))
+    return all(ok for _, ok, _ in results)
+
+
+def clear_serving_cache():
+    cache_path = os.path.join(REPO_ROOT, os.getenv('SERVING_CACHE_PATH', 'cache/payload_cache.sqlite'))
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(cache_path + suffix):
+            os.remove(cache_path + suffix)
+
+
+def run_once(command, url, region, timeout, clear_cache):
+    """
+    Starts the server, times each milestone and stops the server again.
+
+    Returns:
+    dict: Seconds from process start to each milestone; None for milestones that were not reached.
+    """
+    if clear_cache:
+        clear_serving_cache()
+
+    env = {**os.environ, 'PREWARM_ENABLED': 'false'}
+    started = time.time()
+    process = subprocess.Popen(shlex.split(command), cwd=REPO_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = started + timeout
+    base = url.rstrip('/')
+    timings = {'healthz': None, 'layout': None, 'render': None, 'ready': None}
+    try:
+        healthy = wait_for(f"{base}/healthz", {200}, deadline)
+        if healthy is None:
+            return timings
+        timings['healthz'] = healthy - started
+
+        if get_status(f"{base}/_dash-layout", timeout) == 200:
+            timings['layout'] = time.time() - started
+        if render_landing_page(url, region, timeout):
+            timings['render'] = time.time() - started
+
+        ready = wait_for(f"{base}/ready", {200}, deadline, interval=0.1)
+        if ready is not None:
+            timings['ready'] = ready - started
+        return timings
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time from process start to the first rendered dashboard.")
+    parser.add_argument('--command', default='gunicorn app:server --bind 127.0.0.1:8050 --workers 1',
+                        help="Command that starts the server, run from the repository root")
+    parser.add_argument('--url', default='http://127.0.0.1:8050')
+    parser.add_argument('--region', default='MB')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120, help="Seconds to wait for each run")
+    parser.add_argument('--clear-cache', action='store_true', help="Delete the serving cache before every run")
+    parser.add_argument('--output', help="Optional CSV file for the report")
+    args = parser.parse_args()
+
+    report = []
+    for run in range(args.runs):
+        timings = run_once(args.command, args.url, args.region, args.timeout, args.clear_cache)
+        print(f"Run {run + 1}: {json.dumps({name: round(value, 2) if value is not None else None for name, value in timings.items()})}")
+        report.append({'run': run + 1, **timings})
+
+    report_df = pd.DataFrame(report)
+    print(report_df.round(2).to_string(index=False))
+    print(report_df.drop(columns='run').median().round(2).to_string())
+    if args.output:
+        report_df.to_csv(args.output, index=False)
+        print(f"Report saved to {args.output}")
+    if report_df['render'].isna().any():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
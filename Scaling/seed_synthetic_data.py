@@ -0,0 +1,118 @@
+# Seeds a local database with synthetic notifications for load testing.
+#
+# Usage:
+#   python Scaling/seed_synthetic_data.py --database-url sqlite:///loadtest.sqlite --rows 20000
+#   DATABASE_URL=sqlite:///loadtest.sqlite MAPBOX_ACCESS_TOKEN=... gunicorn app:server
+
+import argparse
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGGREGATE_CSV = os.path.join(REPO_ROOT, 'CSV_DATA_FILES', 'aggregateByFSA_asbestos_data.csv')
+
+CONDITION_COLUMNS = [
+    'Vermiculite', 'Piping', 'Drywall', 'Insulation', 'Tiling', 'Floor_Tiles',
+    'Ceiling_Tiles', 'Ducting', 'Plaster', 'Stucco_Stipple', 'Fittings'
+]
+
+# Rough share of notifications that mention each condition in the real data
+CONDITION_RATES = [0.12, 0.08, 0.35, 0.15, 0.15, 0.08, 0.05, 0.03, 0.06, 0.03, 0.03]
+
+CONTRACTORS = ['Western Waste Mgmt.', 'Wreck It Demolition', 'Prairie Abatement', 'Red River Environmental', 'Keewatin Remediation']
+STREETS = ['Portage Avenue', 'Main Street', 'Pembina Highway', 'Henderson Highway', 'Corydon Avenue', 'St Mary\'s Road']
+DESCRIPTIONS = [
+    'Removal of vermiculite insulation from attic.',
+    'Type II abatement of drywall joint compound in basement.',
+    'Removal of asbestos pipe wrap and fittings.',
+    'Demolition of plaster walls and ceiling tiles.',
+    'Removal of vinyl floor tiles and mastic.',
+]
+
+
+def load_fsa_codes():
+    """
+    Reads the real FSA codes so the synthetic data lines up with the boundary file and dropdowns.
+
+    Returns:
+    list: The Forward Sortation Area codes.
+    """
+    fsa_df = pd.read_csv(AGGREGATE_CSV)
+    return [fsa for fsa in fsa_df['Forward_Sortation_Area'].dropna().unique() if fsa not in ('Total', 'Overall')]
+
+
+def generate_notifications(n_rows, seed=0):
+    """
+    Generates synthetic notifications with the same columns as the source CSV.
+
+    Points are clustered around a random centre per FSA near Winnipeg so density and map views look realistic.
+
+    Parameters:
+    n_rows (int): The number of notifications to generate.
+    seed (int): The random seed.
+
+    Returns:
+    pd.DataFrame: The synthetic notifications.
+    """
+    rng = np.random.default_rng(seed)
+    fsa_codes = load_fsa_codes()
+    centres = {
+        fsa: (49.89 + rng.normal(0, 0.08), -97.13 + rng.normal(0, 0.12))
+        for fsa in fsa_codes
+    }
+
+    fsas = rng.choice(fsa_codes, size=n_rows)
+    lat = np.array([centres[fsa][0] for fsa in fsas]) + rng.normal(0, 0.01, n_rows)
+    lon = np.array([centres[fsa][1] for fsa in fsas]) + rng.normal(0, 0.015, n_rows)
+    start_dates = pd.Timestamp('2016-01-01') + pd.to_timedelta(rng.integers(0, 8 * 365, n_rows), unit='D')
+    street_numbers = rng.integers(1, 3000, n_rows)
+    streets = rng.choice(STREETS, size=n_rows)
+
+    df = pd.DataFrame({
+        'Forward_Sortation_Area': fsas,
+        'confirmationNo': np.arange(1000000, 1000000 + n_rows),
+        'Latitude': lat.round(7),
+        'Longitude': lon.round(7),
+        'formattedAddress': [f"{num} {street}, Winnipeg, MB {fsa} 1A1, Canada" for num, street, fsa in zip(street_numbers, streets, fsas)],
+        'postalCode': [f"{fsa} 1A1" for fsa in fsas],
+        'supportDescription': rng.choice(DESCRIPTIONS, size=n_rows),
+        'riskType': rng.choice(['Type I', 'Type II', 'Type III'], size=n_rows),
+        'submittedDate': 'Unavailable',
+        'startDate': start_dates.strftime('%Y-%m-%d'),
+        'endDate': (start_dates + pd.Timedelta(days=14)).strftime('%Y-%m-%d'),
+        'owner': rng.choice(['Private Owner', 'City of Winnipeg', 'Manitoba Housing'], size=n_rows),
+        'contractor': rng.choice(CONTRACTORS, size=n_rows),
+        'compName': rng.choice(CONTRACTORS, size=n_rows),
+    })
+    for column, rate in zip(CONDITION_COLUMNS, CONDITION_RATES):
+        df[column] = (rng.random(n_rows) < rate).astype(int)
+    df['startYear'] = start_dates.year
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a database with synthetic asbestos notifications.")
+    parser.add_argument('--database-url', default='sqlite:///loadtest.sqlite')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # setup_database reads the database URL through config at import time
+    os.environ['DATABASE_URL'] = args.database_url
+    sys.path.insert(0, REPO_ROOT)
+    from setup_database import create_engine_and_tables
+
+    df = generate_notifications(args.rows, args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path_1 = os.path.join(tmp_dir, 'notifications.csv')
+        df.to_csv(file_path_1, index=False)
+        create_engine_and_tables(file_path_1, args.database_url)
+
+    print(f"Seeded {len(df)} synthetic notifications into {args.database_url}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+import base64
+import binascii
+import hashlib
+import json
+import re
+import pandas as pd
+from flask import jsonify, request, abort, make_response
+from sqlalchemy import text
+from database import get_engine, get_data_version, build_filter_clause, CONDITION_COLUMNS
+from conditions import parse_condition_selection, selection_mask
+from serving_cache import fetch_table
+from utils import fetch_notification_detail
+from config import DEFAULT_REGION, REGIONS, region_table, postal_code_region, API_PAGE_SIZE, API_MAX_PAGE_SIZE
+
+FSA_PATTERN = re.compile(r'^[A-Z][0-9][A-Z]$')
+
+
+def request_etag(version):
+    """
+    Derives the ETag for the current request from the data version, the path and the query string.
+    The same request against the same data always gets the same tag.
+
+    Parameters:
+    version (str): The data version.
+
+    Returns:
+    str: The ETag.
+    """
+    params = sorted(request.args.items(multi=True))
+    return hashlib.sha1(json.dumps([version, request.path, params]).encode('utf-8')).hexdigest()
+
+
+def conditional_response(build_body):
+    """
+    Answers 304 Not Modified when the client already has the current representation, without running
+    build_body. Otherwise builds the body and tags it.
+
+    Parameters:
+    build_body (callable): Returns the JSON-serialisable body. Only called on a miss.
+
+    Returns:
+    flask.Response: The response.
+    """
+    etag = request_etag(get_data_version())
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build_body())
+    response.set_etag(etag)
+    # Clients must revalidate, which costs them a 304 until the data changes
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def encode_cursor(confirmation_no):
+    return base64.urlsafe_b64encode(json.dumps(confirmation_no).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Reads the confirmationNo a page ended on from a cursor.
+
+    Raises:
+    ValueError: If the cursor is malformed or does not hold an integer confirmationNo.
+    """
+    try:
+        confirmation_no = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    # The value is bound into the keyset query, and confirmationNo is an integer column
+    if not isinstance(confirmation_no, int) or isinstance(confirmation_no, bool):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return confirmation_no
+
+
+def records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def fetch_notifications_page(region, selected_area, selected_condition, after=None, limit=API_PAGE_SIZE):
+    """
+    Fetches one page of notifications in confirmationNo order, starting after a confirmationNo.
+
+    Keyset pagination keeps every page an index range scan, however deep the client pages.
+
+    Parameters:
+    region (str): The region whose partition is read.
+    selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
+    selected_condition (str): The condition to filter by. If "All Conditions", no condition filtering is applied.
+    after: The last confirmationNo of the previous page, or None for the first page.
+    limit (int): The page size.
+
+    Returns:
+    tuple: The page of notifications and the cursor for the next page, or None on the last page.
+    """
+    filter_sql, params = build_filter_clause(selected_area, selected_condition)
+    if after is not None:
+        filter_sql += ' AND "confirmationNo" > :after'
+        params['after'] = after
+    # One extra row tells us whether there is another page
+    params['limit'] = limit + 1
+    query = text(f'SELECT * FROM {region_table("data_table", region)} WHERE {filter_sql} ORDER BY "confirmationNo" LIMIT :limit')
+    page = pd.read_sql_query(query, con=get_engine(), params=params)
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page.iloc[:limit]
+        last = page['confirmationNo'].iloc[-1]
+        # numpy scalars are converted so the cursor holds a plain JSON value
+        next_cursor = encode_cursor(last.item() if hasattr(last, 'item') else last)
+    return page, next_cursor
+
+
+def fetch_fsa_aggregates(region, selected_area, selected_condition):
+    """
+    Reads the FSA aggregates for a region, restricted the same way filter_data restricts notifications:
+    to the selected area, and to FSAs with at least one notification of the selected condition.
+
+    Returns:
+    pd.DataFrame: The matching aggregate rows.
+    """
+    df = fetch_table(region_table('aggregated_fsa_table', region), get_data_version())
+    if df.empty:
+        # The region has no data loaded
+        return df
+    df = df[~df['Forward_Sortation_Area'].isin(['Total', 'Overall'])]
+    if selected_area != "All Areas":
+        df = df[df['Forward_Sortation_Area'] == selected_area]
+    if selected_condition in CONDITION_COLUMNS:
+        df = df[df[f"Total_{selected_condition}"] > 0]
+    elif selected_condition != "All Conditions":
+        # Combinations have no total column, so find the FSAs with a matching notification
+        notifications = fetch_table(region_table('map_table', region), get_data_version())
+        matching = notifications.loc[selection_mask(notifications, selected_condition), 'Forward_Sortation_Area']
+        df = df[df['Forward_Sortation_Area'].isin(set(matching))]
+    return df
+
+
+def fetch_fsa_detail(region, fsa, selected_condition):
+    """
+    Summarises the notifications in one FSA with a single aggregate query.
+
+    Returns:
+    dict: The notification count, the count per condition and the first and last start dates.
+    """
+    filter_sql, params = build_filter_clause(fsa, selected_condition)
+    condition_sums = ", ".join(f'SUM("{condition}") AS "{condition}"' for condition in CONDITION_COLUMNS)
+    query = text(
+        f'SELECT COUNT(*) AS notifications, MIN("startDate") AS first_start, MAX("startDate") AS last_start, {condition_sums} '
+        f'FROM {region_table("data_table", region)} WHERE {filter_sql}'
+    )
+    row = records(pd.read_sql_query(query, con=get_engine(), params=params))[0]
+    return {
+        'notifications': row['notifications'],
+        'first_start': row['first_start'],
+        'last_start': row['last_start'],
+        'conditions': {condition: int(row[condition] or 0) for condition in CONDITION_COLUMNS},
+    }
+
+
+def filter_args():
+    """
+    Reads and validates the region, area and condition query parameters, answering 400 if any is invalid.
+
+    Returns:
+    tuple: The region, area and condition.
+    """
+    region = request.args.get('region', DEFAULT_REGION)
+    selected_area = request.args.get('area', "All Areas")
+    selected_condition = request.args.get('condition', "All Conditions")
+    if region not in REGIONS or (selected_area != "All Areas" and not FSA_PATTERN.match(selected_area)):
+        abort(400)
+    try:
+        build_filter_clause(selected_area, selected_condition)
+    except ValueError:
+        abort(400)
+    return region, selected_area, selected_condition
+
+
+def register_api_routes(server):
+    """
+    Registers the read-only JSON data API on the Flask server.
+
+    Every response carries an ETag derived from the data version, so a repeat poll with If-None-Match
+    gets a 304 without querying the database.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app.
+    """
+    @server.route('/api/notifications')
+    def api_notifications():
+        region, selected_area, selected_condition = filter_args()
+        try:
+            limit = min(max(int(request.args.get('limit', API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            abort(400)
+
+        def build_body():
+            page, next_cursor = fetch_notifications_page(region, selected_area, selected_condition, after, limit)
+            return {'region': region, 'count': len(page), 'next_cursor': next_cursor, 'results': records(page)}
+
+        return conditional_response(build_body)
+
+    @server.route('/api/notifications/<confirmation_no>')
+    def api_notification_detail(confirmation_no):
+        region = request.args.get('region', DEFAULT_REGION)
+        if region not in REGIONS:
+            abort(400)
+        # confirmationNo is an integer column; Postgres rejects a text comparison rather than matching nothing
+        if not confirmation_no.isdigit():
+            abort(404)
+
+        def build_body():
+            detail = fetch_notification_detail(region, int(confirmation_no), get_data_version())
+            if detail is None:
+                abort(404)
+            return detail
+
+        return conditional_response(build_body)
+
+    @server.route('/api/fsa')
+    def api_fsa():
+        region, selected_area, selected_condition = filter_args()
+        return conditional_response(lambda: {
+            'region': region,
+            'results': records(fetch_fsa_aggregates(region, selected_area, selected_condition)),
+        })
+
+    @server.route('/api/fsa/<fsa>')
+    def api_fsa_detail(fsa):
+        fsa = fsa.upper()
+        region = postal_code_region(fsa)
+        if not FSA_PATTERN.match(fsa) or region is None:
+            abort(404)
+        selected_condition = request.args.get('condition', "All Conditions")
+        try:
+            parse_condition_selection(selected_condition)
+        except ValueError:
+            abort(400)
+
+        def build_body():
+            aggregate = records(fetch_fsa_aggregates(region, fsa, "All Conditions"))
+            if not aggregate:
+                abort(404)
+            return {
+                'fsa': fsa,
+                'region': region,
+                'aggregate': aggregate[0],
+                'detail': fetch_fsa_detail(region, fsa, selected_condition),
+            }
+
+        return conditional_response(build_body)
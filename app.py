@@ -1,7 +1,15 @@
 from dash import Dash
-from config import load_config
-from database import engine, start_idle_connection_closer
+from config import load_config, PREWARM_ENABLED
+from database import get_engine, start_idle_connection_closer, start_version_listener
 from callbacks_and_layout import app_layout, register_callbacks
+from tiles import register_tile_routes
+from search import register_search_routes
+from nearby import register_nearby_routes
+from api import register_api_routes
+from export import register_export_routes
+from prewarm import register_prewarm_routes, start_prewarm
+from health import register_health_routes, start_warmup
+from profiler import register_profiler_routes
 import logging
 
 # Configure logging
@@ -21,9 +29,39 @@ try:
     # Register callbacks
     register_callbacks(app)
 
+    # Profile callbacks on request or when they are slow
+    register_profiler_routes(server)
+
+    # Register the vector tile endpoint
+    register_tile_routes(server)
+
+    # Register the full-text search endpoint
+    register_search_routes(server)
+
+    # Register the proximity search endpoint
+    register_nearby_routes(server)
+
+    # Register the read-only JSON data API
+    register_api_routes(server)
+
+    # Register the streaming export endpoint
+    register_export_routes(server)
+
+    # Apply new data versions as soon as setup_database publishes them
+    start_version_listener()
+
+    # Liveness and readiness endpoints, with the first visitor's work done in the background
+    register_health_routes(server)
+    start_warmup()
+
+    # Pre-warm the serving cache in the background and report its progress
+    register_prewarm_routes(server)
+    if PREWARM_ENABLED:
+        start_prewarm()
+
     # MAIN ENTRY POINT
     if __name__ == "__main__":
-        start_idle_connection_closer(engine)
+        start_idle_connection_closer(get_engine())
         app.run_server(debug=True)
 
 except Exception as e:
@@ -1,24 +1,147 @@
 from dash import Input, Output, dcc, html, dash_table
 from dash.exceptions import PreventUpdate
-from utils import fetch_data, create_chart, create_map, create_table
-from dash.dependencies import Input, Output
-from utils import fetch_data
-from config import AREA_DROPDOWN_OPTIONS, CONDITION_DROPDOWN_OPTIONS, STYLE_CONFIG
+from serving_cache import get_payload, get_viewport_markers
+from dash.dependencies import Input, Output, State
+from dash import no_update, ctx, Patch
+from database import get_data_version
+from utils import fetch_area_options, fetch_region_options, fetch_boundary_options, figure_patch, fetch_notification_detail
+from utils import load_count_cube, create_trends, map_viewport, relayout_viewport, set_viewport_markers
+from search import search_notifications
+from nearby import find_nearby
+from export import export_url
+from config import AREA_DROPDOWN_OPTIONS, CONDITION_DROPDOWN_OPTIONS, REGION_DROPDOWN_OPTIONS, RISK_TYPE_DROPDOWN_OPTIONS, DEFAULT_REGION, STYLE_CONFIG
+from config import NEARBY_DEFAULT_RADIUS_M, NEARBY_MAX_RADIUS_M, BOUNDARY_SETS, DEFAULT_BOUNDARY_SET
+from conditions import format_condition_selection
+from cube import trend_measures
 
 iconHeight = 20
 
-# Fetch area options
-try:
-    area_options = AREA_DROPDOWN_OPTIONS + [{'label': i, 'value': i} for i in fetch_data('asbestos_data')['Forward_Sortation_Area'].dropna().unique()]
-except Exception as e:
-    print(f"Error fetching area options: {e}")
-    area_options = AREA_DROPDOWN_OPTIONS
+# Area options are filled in per region by update_area_options
+area_options = AREA_DROPDOWN_OPTIONS
+
+def notification_detail_panel():
+    """
+    Builds the side panel showing the notification under the cursor or last clicked on the scatter map.
+    """
+    return html.Div(
+        "Hover over or click a notification on the scatter map to see its details.",
+        id='notification-detail',
+        style={'flex': '1', 'backgroundColor': 'white', 'color': 'black', 'padding': '10px', 'overflowY': 'auto', 'maxHeight': '450px'}
+    )
+
+def notification_detail_view(detail):
+    """
+    Lays out a notification's details for the side panel.
+
+    Parameters:
+    detail (dict): The notification from fetch_notification_detail.
+
+    Returns:
+    list: The panel's children.
+    """
+    fields = [
+        ("Address", detail['formattedAddress']),
+        ("FSA", detail['Forward_Sortation_Area']),
+        ("Start", detail['startDate']),
+        ("End", detail['endDate']),
+        ("Submitted", detail['submittedDate']),
+        ("Owner", detail['owner']),
+        ("Contractor", detail['contractor']),
+        ("Risk type", detail['riskType']),
+        ("Materials", ", ".join(condition.replace('_', ' ') for condition in detail['conditions']) or "None recorded"),
+        ("Description", detail['supportDescription']),
+    ]
+    children = [html.H4(f"Notification {detail['confirmationNo']}", style={'marginTop': 0})]
+    for label, value in fields:
+        children += [html.Strong(label), html.P(str(value).strip() if value is not None else "Unavailable", style={'marginTop': '2px'})]
+    return children
+
+def condition_mode_toggle():
+    """
+    Builds the switch between matching any (OR) or all (AND) of the selected conditions.
+    """
+    return dcc.RadioItems(
+        id='condition-mode',
+        options=[
+            {'label': ' Any selected condition (OR)', 'value': 'OR'},
+            {'label': ' All selected conditions (AND)', 'value': 'AND'},
+        ],
+        value='OR',
+        inline=True,
+        inputStyle={'marginLeft': '10px'},
+        style={'marginTop': '5px'},
+    )
+
+def boundary_dropdown():
+    """
+    Builds the dropdown that picks the boundary set the bar chart and choropleth aggregate to.
+    """
+    return html.Div(
+        style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+        children=[
+            dcc.Dropdown(
+                id='boundary-dropdown',
+                options=[{'label': BOUNDARY_SETS[DEFAULT_BOUNDARY_SET]['label'], 'value': DEFAULT_BOUNDARY_SET}],
+                value=DEFAULT_BOUNDARY_SET,
+                clearable=False,
+                style=STYLE_CONFIG['dropdown'],
+            )
+        ]
+    )
+
+def nearby_panel():
+    """
+    Builds the panel listing the notifications near a clicked map point.
+    """
+    return html.Div(
+        style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'border': '3px solid white', 'marginBottom': '10px'},
+        children=[
+            html.Div(
+                children=[
+                    html.Label("Nearby radius (m): ", htmlFor='nearby-radius'),
+                    dcc.Input(
+                        id='nearby-radius',
+                        type='number',
+                        value=NEARBY_DEFAULT_RADIUS_M,
+                        min=10,
+                        max=NEARBY_MAX_RADIUS_M,
+                        step=10,
+                        debounce=True,
+                        style=STYLE_CONFIG['dropdown']
+                    ),
+                ]
+            ),
+            html.Div("Click a point on the map to list the notifications around it.", id='nearby-summary', style={'marginTop': '10px', 'marginBottom': '10px'}),
+            dash_table.DataTable(
+                id='nearby-table',
+                style_table=STYLE_CONFIG['table'],
+                style_header=STYLE_CONFIG['table']['header'],
+                style_cell=STYLE_CONFIG['table']['cell'],
+                page_size=50,
+                sort_action='native'
+            )
+        ]
+    )
 
 # Define the layout for the first page
 page_1_layout = html.Div(
     style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': STYLE_CONFIG['padding']},
     children=[
         html.H1("Asbestos Abatement Dashboard", style=STYLE_CONFIG['header']),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                dcc.Dropdown(
+                    id='region-dropdown',
+                    options=REGION_DROPDOWN_OPTIONS,
+                    value=DEFAULT_REGION,
+                    clearable=False,
+                    persistence=True,
+                    persistence_type='session',
+                    style=STYLE_CONFIG['dropdown'],
+                )
+            ]
+        ),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
             children=[
@@ -39,12 +162,15 @@ page_1_layout = html.Div(
                     id='condition-dropdown',
                     options=CONDITION_DROPDOWN_OPTIONS,
                     value='All Conditions',
-                    placeholder="Select Condition",
+                    placeholder="Select Conditions",
                     searchable=True,
+                    multi=True,
                     style=STYLE_CONFIG['dropdown']
-                )
+                ),
+                condition_mode_toggle()
             ]
         ),
+        boundary_dropdown(),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'border': '3px solid white', 'marginBottom': '10px'},
             children=[
@@ -64,9 +190,18 @@ page_1_layout = html.Div(
                     value='Point Scatter Map',
                     style=STYLE_CONFIG['dropdown']
                 ),
-                dcc.Graph(id='map-plot', style=STYLE_CONFIG['graph'])
+                html.Div(
+                    style={'display': 'flex', 'gap': '10px'},
+                    children=[
+                        html.Div(dcc.Graph(id='map-plot', style=STYLE_CONFIG['graph']), style={'flex': '3', 'minWidth': 0}),
+                        notification_detail_panel(),
+                    ]
+                ),
+                # The selection the map is currently showing, so update_map can send only what changed
+                dcc.Store(id='map-state')
             ]
         ),
+        nearby_panel(),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'border': '3px solid white', 'marginBottom': '10px'},
             children=[
@@ -75,11 +210,27 @@ page_1_layout = html.Div(
                     options=[
                         {"label": html.Span([html.Img(src='/workspaces/asbestos-dashboard-heroku/assets/circlearrows3_icon.png', height=iconHeight), " Notifications"]), "value": "Notifications"},
                         {"label": html.Span([html.Img(src='/workspaces/asbestos-dashboard-heroku/assets/sigma_icon.png', height=iconHeight), " Totals"]), "value": "Totals"},
-                        {"label": html.Span([html.Img(src='/workspaces/asbestos-dashboard-heroku/assets/percent_icon.png', height=iconHeight), " Percentages"]), "value": "Percentages"}
+                        {"label": html.Span([html.Img(src='/workspaces/asbestos-dashboard-heroku/assets/percent_icon.png', height=iconHeight), " Percentages"]), "value": "Percentages"},
+                        {"label": html.Span([html.Img(src='/workspaces/asbestos-dashboard-heroku/assets/sigma_icon.png', height=iconHeight), " Co-occurrence"]), "value": "Co-occurrence"}
                     ],
                     value='Notifications',
                     style=STYLE_CONFIG['dropdown']
                 ),
+                html.Div(
+                    style={'marginTop': '10px'},
+                    children=[
+                        html.A("Download CSV", id='export-csv-link', href='/export/notifications.csv'),
+                        html.A("Download Parquet", id='export-parquet-link', href='/export/notifications.parquet', style={'marginLeft': '10px'}),
+                    ]
+                ),
+                dcc.Input(
+                    id='search-input',
+                    type='search',
+                    placeholder="Search address, description, owner or contractor",
+                    debounce=True,
+                    style={**STYLE_CONFIG['dropdown'], 'width': '100%', 'marginTop': '10px', 'marginBottom': '10px'}
+                ),
+                html.Div(id='search-summary', style={'marginBottom': '10px'}),
                 dash_table.DataTable(
                     id='pivot-table',
                     style_table=STYLE_CONFIG['table'],
@@ -101,6 +252,20 @@ page_2_layout = html.Div(
     children=[
         html.H1("Chart", style=STYLE_CONFIG['header']),
         html.H2("Asbestos Abatement Dashboard", style=STYLE_CONFIG['header']),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                dcc.Dropdown(
+                    id='region-dropdown',
+                    options=REGION_DROPDOWN_OPTIONS,
+                    value=DEFAULT_REGION,
+                    clearable=False,
+                    persistence=True,
+                    persistence_type='session',
+                    style=STYLE_CONFIG['dropdown'],
+                )
+            ]
+        ),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
             children=[
@@ -121,12 +286,15 @@ page_2_layout = html.Div(
                     id='condition-dropdown',
                     options=CONDITION_DROPDOWN_OPTIONS,
                     value='All Conditions',
-                    placeholder="Select Condition",
+                    placeholder="Select Conditions",
                     searchable=True,
+                    multi=True,
                     style=STYLE_CONFIG['dropdown']
-                )
+                ),
+                condition_mode_toggle()
             ]
         ),
+        boundary_dropdown(),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'border': '3px solid white', 'marginBottom': '10px'},
             children=[
@@ -142,6 +310,20 @@ page_3_layout = html.Div(
     children=[
         html.H1("Map", style=STYLE_CONFIG['header']),
         html.H2("Asbestos Abatement Dashboard", style=STYLE_CONFIG['header']),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                dcc.Dropdown(
+                    id='region-dropdown',
+                    options=REGION_DROPDOWN_OPTIONS,
+                    value=DEFAULT_REGION,
+                    clearable=False,
+                    persistence=True,
+                    persistence_type='session',
+                    style=STYLE_CONFIG['dropdown'],
+                )
+            ]
+        ),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
             children=[
@@ -162,12 +344,15 @@ page_3_layout = html.Div(
                     id='condition-dropdown',
                     options=CONDITION_DROPDOWN_OPTIONS,
                     value='All Conditions',
-                    placeholder="Select Condition",
+                    placeholder="Select Conditions",
                     searchable=True,
+                    multi=True,
                     style=STYLE_CONFIG['dropdown']
-                )
+                ),
+                condition_mode_toggle()
             ]
         ),
+        boundary_dropdown(),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'border': '3px solid white', 'marginBottom': '10px'},
             children=[
@@ -181,9 +366,18 @@ page_3_layout = html.Div(
                     value='Point Scatter Map',
                     style=STYLE_CONFIG['dropdown']
                 ),                
-                dcc.Graph(id='map-plot', style=STYLE_CONFIG['graph'])
+                html.Div(
+                    style={'display': 'flex', 'gap': '10px'},
+                    children=[
+                        html.Div(dcc.Graph(id='map-plot', style=STYLE_CONFIG['graph']), style={'flex': '3', 'minWidth': 0}),
+                        notification_detail_panel(),
+                    ]
+                ),
+                # The selection the map is currently showing, so update_map can send only what changed
+                dcc.Store(id='map-state')
             ]
         ),
+        nearby_panel(),
     ]
 )
 
@@ -191,6 +385,20 @@ page_3_layout = html.Div(
 page_4_layout = html.Div(
     style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': STYLE_CONFIG['padding']},
     children=[
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                dcc.Dropdown(
+                    id='region-dropdown',
+                    options=REGION_DROPDOWN_OPTIONS,
+                    value=DEFAULT_REGION,
+                    clearable=False,
+                    persistence=True,
+                    persistence_type='session',
+                    style=STYLE_CONFIG['dropdown'],
+                )
+            ]
+        ),
         html.Div(
             style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
             children=[
@@ -211,10 +419,12 @@ page_4_layout = html.Div(
                     id='condition-dropdown',
                     options=CONDITION_DROPDOWN_OPTIONS,
                     value='All Conditions',
-                    placeholder="Select Condition",
+                    placeholder="Select Conditions",
                     searchable=True,
+                    multi=True,
                     style=STYLE_CONFIG['dropdown']
-                )
+                ),
+                condition_mode_toggle()
             ]
         ),
         html.H1("Data Table", style=STYLE_CONFIG['header']),
@@ -226,11 +436,27 @@ page_4_layout = html.Div(
                     options=[
                         {"label": "Notifications", "value": "Notifications"},
                         {"label": "Totals", "value": "Totals"},
-                        {"label": "Percentages", "value": "Percentages"}
+                        {"label": "Percentages", "value": "Percentages"},
+                        {"label": "Co-occurrence", "value": "Co-occurrence"}
                     ],
                     value='Notifications',
                     style=STYLE_CONFIG['dropdown']
-                ),                
+                ),
+                html.Div(
+                    style={'marginTop': '10px'},
+                    children=[
+                        html.A("Download CSV", id='export-csv-link', href='/export/notifications.csv'),
+                        html.A("Download Parquet", id='export-parquet-link', href='/export/notifications.parquet', style={'marginLeft': '10px'}),
+                    ]
+                ),
+                dcc.Input(
+                    id='search-input',
+                    type='search',
+                    placeholder="Search address, description, owner or contractor",
+                    debounce=True,
+                    style={**STYLE_CONFIG['dropdown'], 'width': '100%', 'marginTop': '10px', 'marginBottom': '10px'}
+                ),
+                html.Div(id='search-summary', style={'marginBottom': '10px'}),
                 dash_table.DataTable(
                     id='pivot-table',
                     style_table=STYLE_CONFIG['table'],
@@ -248,6 +474,81 @@ page_4_layout = html.Div(
     ]
 )
 
+# Define the layout for the fifth page (year-over-year trends)
+page_5_layout = html.Div(
+    style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': STYLE_CONFIG['padding']},
+    children=[
+        html.H1("Year-over-Year Trends", style=STYLE_CONFIG['header']),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                dcc.Dropdown(
+                    id='region-dropdown',
+                    options=REGION_DROPDOWN_OPTIONS,
+                    value=DEFAULT_REGION,
+                    clearable=False,
+                    persistence=True,
+                    persistence_type='session',
+                    style=STYLE_CONFIG['dropdown'],
+                )
+            ]
+        ),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                dcc.Dropdown(
+                    id='area-dropdown',
+                    options=area_options,
+                    value='All Areas',
+                    placeholder="Select a Forward Sortation Area",
+                    searchable=True,
+                    style=STYLE_CONFIG['dropdown'],
+                )
+            ]
+        ),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                # Each selected condition is drawn as its own line, so there is no AND/OR toggle here
+                dcc.Dropdown(
+                    id='condition-dropdown',
+                    options=CONDITION_DROPDOWN_OPTIONS,
+                    value='All Conditions',
+                    placeholder="Select Conditions",
+                    searchable=True,
+                    multi=True,
+                    style=STYLE_CONFIG['dropdown']
+                )
+            ]
+        ),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'marginBottom': '10px'},
+            children=[
+                dcc.Dropdown(
+                    id='risk-type-dropdown',
+                    options=RISK_TYPE_DROPDOWN_OPTIONS,
+                    value='All Risk Types',
+                    clearable=False,
+                    style=STYLE_CONFIG['dropdown']
+                )
+            ]
+        ),
+        html.Div(
+            style={'backgroundColor': STYLE_CONFIG['backgroundColor'], 'padding': '10px', 'border': '3px solid white', 'marginBottom': '10px'},
+            children=[
+                dcc.Graph(id='trends-chart', style=STYLE_CONFIG['graph']),
+                dash_table.DataTable(
+                    id='trends-table',
+                    style_table={**STYLE_CONFIG['table'], 'height': 'auto'},
+                    style_header=STYLE_CONFIG['table']['header'],
+                    style_cell=STYLE_CONFIG['table']['cell'],
+                    sort_action='native',
+                )
+            ]
+        )
+    ]
+)
+
 # Define the main layout with navigation
 app_layout = html.Div([
     dcc.Location(id='url', refresh=False),
@@ -256,6 +557,7 @@ app_layout = html.Div([
         dcc.Link('Bar Chart', href='/bar-chart', style={'marginLeft': '10px'}),
         dcc.Link('Map', href='/map', style={'marginLeft': '10px'}),
         dcc.Link('Data Table', href='/data-table', style={'marginLeft': '10px'}),
+        dcc.Link('Trends', href='/trends', style={'marginLeft': '10px'}),
     ], style={'padding': '10px', 'backgroundColor': STYLE_CONFIG['backgroundColor']}),
     html.Div(id='page-content')
 ])
@@ -272,53 +574,199 @@ def register_callbacks(app):
             return page_3_layout
         elif pathname == '/data-table':
             return page_4_layout
+        elif pathname == '/trends':
+            return page_5_layout
         else:
             return page_1_layout
 
+    @app.callback(Output('region-dropdown', 'options'), [Input('url', 'pathname')])
+    def update_region_options(pathname):
+        return fetch_region_options()
+
+    @app.callback(
+        [Output('area-dropdown', 'options'), Output('area-dropdown', 'value')],
+        [Input('region-dropdown', 'value')],
+        [State('area-dropdown', 'value')]
+    )
+    def update_area_options(region, selected_area):
+        # Each region's areas are only fetched the first time the region is selected
+        options = fetch_area_options(region)
+        if selected_area in [option['value'] for option in options]:
+            return options, no_update
+        return options, 'All Areas'
+
+    @app.callback(
+        [Output('boundary-dropdown', 'options'), Output('boundary-dropdown', 'value')],
+        [Input('region-dropdown', 'value')],
+        [State('boundary-dropdown', 'value')]
+    )
+    def update_boundary_options(region, boundary_set):
+        options = fetch_boundary_options(region)
+        if boundary_set in [option['value'] for option in options]:
+            return options, no_update
+        return options, DEFAULT_BOUNDARY_SET
+
     @app.callback(
         Output('area-chart', 'figure'),
-        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value')],
-        [Input('url', 'pathname')]
+        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value'), Input('condition-mode', 'value')],
+        [Input('url', 'pathname'), Input('region-dropdown', 'value'), Input('boundary-dropdown', 'value')]
     )
-    def update_chart(selected_area, selected_condition, pathname):
+    def update_chart(selected_area, selected_conditions, condition_mode, pathname, region, boundary_set):
         if pathname not in ['/bar-chart', '/']:
             raise PreventUpdate
         try:
-            df_chart = fetch_data('aggregated_fsa_table')
-            chart = create_chart(df_chart, selected_area, selected_condition)
-            return chart
+            selected_condition = format_condition_selection(selected_conditions, condition_mode)
+            return get_payload('chart', region, selected_area, selected_condition, boundary_set=boundary_set)
         except Exception as e:
             print(f"Error in update_chart: {e}")
             return {}
 
     @app.callback(
-        Output('map-plot', 'figure'),
-        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value'), Input('map-dropdown', 'value'), Input('url', 'pathname')]
+        [Output('map-plot', 'figure'), Output('map-state', 'data')],
+        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value'), Input('condition-mode', 'value'), Input('map-dropdown', 'value'), Input('url', 'pathname'), Input('region-dropdown', 'value'), Input('boundary-dropdown', 'value')],
+        [State('map-state', 'data')]
     )
-    def update_map(selected_area, selected_condition, selected_map, pathname):
+    def update_map(selected_area, selected_conditions, condition_mode, selected_map, pathname, region, boundary_set, map_state):
         if pathname not in ['/map', '/']:
             raise PreventUpdate
         try:
-            df_map = fetch_data('map_table')
-            df_map_summary = fetch_data('aggregated_fsa_table')
-            map_plot = create_map(df_map, df_map_summary, selected_map, selected_area, selected_condition)
-            return map_plot
+            selected_condition = format_condition_selection(selected_conditions, condition_mode)
+            # Read the version first, so a refresh during this call can only lead to a full figure next time
+            version = get_data_version()
+            figure = get_payload('map', region, selected_area, selected_condition, selected_map, boundary_set)
+            new_state = {'region': region, 'area': selected_area, 'condition': selected_condition, 'map': selected_map, 'boundary': boundary_set, 'version': version}
+            # A new selection re-centres the map, so the scatter markers are picked for the view the figure opens on
+            markers = None
+            mapbox = figure.get('layout', {}).get('mapbox', {})
+            if selected_map == "Point Scatter Map" and figure.get('data') and mapbox.get('center', {}).get('lat') is not None:
+                markers = get_viewport_markers(region, selected_area, selected_condition, map_viewport(mapbox['center'], mapbox['zoom']))
+
+            # Changing the area or condition only changes the traces and view, so the browser gets just those;
+            # a new map type, region, boundary set or data version sends the whole figure
+            same_figure = map_state and all(map_state.get(key) == new_state[key] for key in ('region', 'map', 'boundary', 'version'))
+            if same_figure and ctx.triggered_id in ('area-dropdown', 'condition-dropdown', 'condition-mode'):
+                previous = get_payload('map', region, map_state['area'], map_state['condition'], selected_map, boundary_set)
+                patch = figure_patch(previous, figure)
+                if patch is not None:
+                    if markers is not None:
+                        set_viewport_markers(patch, markers)
+                    return patch, new_state
+            if markers is not None:
+                set_viewport_markers(figure, markers)
+            return figure, new_state
         except Exception as e:
             print(f"Error in update_map: {e}")
-            return {}
+            return {}, None
 
     @app.callback(
-        Output('pivot-table', 'data'),
-        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value'), Input('table-dropdown', 'value'), Input('url', 'pathname')]
+        Output('map-plot', 'figure', allow_duplicate=True),
+        [Input('map-plot', 'relayoutData')],
+        [State('map-state', 'data')],
+        prevent_initial_call=True
     )
-    def update_table(selected_area, selected_condition, selected_table, pathname):
+    def update_map_markers(relayout_data, map_state):
+        # The tile layer already streams the points in view; only the scatter map's marker trace follows the view here
+        if not map_state or map_state.get('map') != "Point Scatter Map" or map_state.get('version') != get_data_version():
+            raise PreventUpdate
+        bounds = relayout_viewport(relayout_data or {})
+        if bounds is None:
+            raise PreventUpdate
+        try:
+            markers = get_viewport_markers(map_state['region'], map_state['area'], map_state['condition'], bounds)
+        except Exception as e:
+            print(f"Error in update_map_markers: {e}")
+            raise PreventUpdate
+        patch = Patch()
+        set_viewport_markers(patch, markers)
+        return patch
+
+    @app.callback(
+        [Output('pivot-table', 'data'), Output('search-summary', 'children')],
+        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value'), Input('condition-mode', 'value'), Input('table-dropdown', 'value'), Input('url', 'pathname'), Input('search-input', 'value'), Input('region-dropdown', 'value')]
+    )
+    def update_table(selected_area, selected_conditions, condition_mode, selected_table, pathname, search_query, region):
         if pathname not in ['/data-table', '/']:
             raise PreventUpdate
         try:
-            df_table = fetch_data('data_table')
-            df_table_summary = fetch_data('aggregated_fsa_table')
-            table_data = create_table(df_table, df_table_summary, selected_table, selected_area, selected_condition)
-            return table_data
+            selected_condition = format_condition_selection(selected_conditions, condition_mode)
+            if search_query and selected_table == "Notifications":
+                results, total = search_notifications(search_query, region, selected_area, selected_condition)
+                summary = f"{total:,} matching notifications"
+                if total > len(results):
+                    summary += f", showing the best {len(results):,}; refine the search to see the rest"
+                return results.drop(columns=['searchScore'], errors='ignore').to_dict('records'), summary
+            return get_payload('table', region, selected_area, selected_condition, selected_table), ""
         except Exception as e:
             print(f"Error in update_table: {e}")
-            return []
+            return [], ""
+
+    @app.callback(
+        [Output('trends-chart', 'figure'), Output('trends-table', 'data')],
+        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value'), Input('risk-type-dropdown', 'value'), Input('region-dropdown', 'value')]
+    )
+    def update_trends(selected_area, selected_conditions, risk_type, region):
+        # Every slice is read from the region's count cube in memory, without a query
+        try:
+            cube = load_count_cube(region, get_data_version())
+        except Exception as e:
+            print(f"Error in update_trends: {e}")
+            return {}, []
+        return create_trends(cube, selected_area or "All Areas", trend_measures(selected_conditions), risk_type)
+
+    @app.callback(
+        Output('notification-detail', 'children'),
+        [Input('map-plot', 'clickData'), Input('map-plot', 'hoverData')],
+        [State('region-dropdown', 'value')]
+    )
+    def update_notification_detail(click_data, hover_data, region):
+        data = click_data if ctx.triggered and ctx.triggered[0]['prop_id'] == 'map-plot.clickData' else hover_data
+        points = (data or {}).get('points', [])
+        # Only scatter markers carry a confirmationNo
+        if not points or not points[0].get('customdata'):
+            raise PreventUpdate
+        confirmation_no = points[0]['customdata']
+        # Figures cached before markers carried a flat id array hold one-element lists
+        if isinstance(confirmation_no, list):
+            confirmation_no = confirmation_no[0]
+        try:
+            detail = fetch_notification_detail(region, confirmation_no, get_data_version())
+        except Exception as e:
+            print(f"Error in update_notification_detail: {e}")
+            return "Could not load this notification."
+        if detail is None:
+            return "This notification is no longer in the data."
+        return notification_detail_view(detail)
+
+    @app.callback(
+        [Output('nearby-summary', 'children'), Output('nearby-table', 'data')],
+        [Input('map-plot', 'clickData'), Input('nearby-radius', 'value')],
+        [State('region-dropdown', 'value'), State('condition-dropdown', 'value'), State('condition-mode', 'value')]
+    )
+    def update_nearby(click_data, radius_m, region, selected_conditions, condition_mode):
+        points = (click_data or {}).get('points', [])
+        if not points or not radius_m:
+            raise PreventUpdate
+        # Choropleth clicks carry an FSA rather than a point, so say how to search instead of doing nothing
+        if 'lat' not in points[0]:
+            return "Switch to the scatter map or heatmap and click a point to list the notifications around it.", []
+        lat, lon = points[0]['lat'], points[0]['lon']
+        try:
+            selected_condition = format_condition_selection(selected_conditions, condition_mode)
+            results, total = find_nearby(lat, lon, float(radius_m), region, selected_condition)
+        except ValueError as e:
+            return str(e), []
+        except Exception as e:
+            print(f"Error in update_nearby: {e}")
+            return "Nearby search failed.", []
+        summary = f"{total} notifications within {radius_m:g} m of {lat:.5f}, {lon:.5f}"
+        if total > len(results):
+            summary += f", showing the nearest {len(results)}"
+        return summary, results.to_dict('records')
+
+    @app.callback(
+        [Output('export-csv-link', 'href'), Output('export-parquet-link', 'href')],
+        [Input('area-dropdown', 'value'), Input('condition-dropdown', 'value'), Input('condition-mode', 'value'), Input('region-dropdown', 'value')]
+    )
+    def update_export_links(selected_area, selected_conditions, condition_mode, region):
+        selected_condition = format_condition_selection(selected_conditions, condition_mode)
+        return export_url('csv', region, selected_area, selected_condition), export_url('parquet', region, selected_area, selected_condition)
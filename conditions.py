@@ -0,0 +1,151 @@
+import re
+import numpy as np
+import pandas as pd
+from config import CONDITION_DROPDOWN_OPTIONS
+
+CONDITION_COLUMNS = [option['value'] for option in CONDITION_DROPDOWN_OPTIONS if option['value'] != 'All Conditions']
+# Each condition owns one bit of a notification's conditionMask
+CONDITION_BITS = {condition: 1 << bit for bit, condition in enumerate(CONDITION_COLUMNS)}
+SELECTION_MODES = ('OR', 'AND')
+SELECTION_PATTERN = re.compile(r' (OR|AND) ')
+# Number of set bits in every byte value, for counting rows in packed bitmaps
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.int64)
+
+
+def format_condition_selection(conditions, mode='OR'):
+    """
+    Builds the canonical selection string for a set of conditions, which is what callbacks, cache keys
+    and URLs pass around. One condition is just its name, as before multi-select existed.
+
+    Parameters:
+    conditions (list or str): The selected conditions. "All Conditions" is ignored when others are selected.
+    mode (str): "OR" to match notifications with any of the conditions, "AND" to match those with all of them.
+
+    Returns:
+    str: "All Conditions", a condition name, or the conditions joined by " OR " or " AND ".
+    """
+    if isinstance(conditions, str):
+        conditions = [conditions]
+    selected = set(conditions or [])
+    ordered = [condition for condition in CONDITION_COLUMNS if condition in selected]
+    if not ordered:
+        return "All Conditions"
+    return f" {mode if mode in SELECTION_MODES else 'OR'} ".join(ordered)
+
+
+def parse_condition_selection(selected_condition):
+    """
+    Splits a selection string into its conditions and mode.
+
+    Returns:
+    tuple: The list of conditions, empty for "All Conditions", and "OR" or "AND".
+
+    Raises:
+    ValueError: If a condition is unknown or the selection mixes OR and AND.
+    """
+    if selected_condition in (None, "All Conditions"):
+        return [], 'OR'
+    parts = SELECTION_PATTERN.split(selected_condition)
+    conditions, modes = parts[::2], set(parts[1::2])
+    if len(modes) > 1:
+        raise ValueError(f"Mixed AND/OR selection: {selected_condition}")
+    unknown = [condition for condition in conditions if condition not in CONDITION_BITS]
+    if unknown:
+        raise ValueError(f"Unknown condition: {', '.join(unknown)}")
+    return conditions, modes.pop() if modes else 'OR'
+
+
+def is_condition_combination(selected_condition):
+    return len(parse_condition_selection(selected_condition)[0]) > 1
+
+
+def condition_bitmask(df):
+    """
+    Packs a notification's condition flags into one integer per row.
+
+    Parameters:
+    df (pd.DataFrame): Notifications with the 0/1 condition columns.
+
+    Returns:
+    np.ndarray: The int32 bitmask of each row.
+    """
+    bitmask = np.zeros(len(df), dtype=np.int32)
+    for condition, bit in CONDITION_BITS.items():
+        bitmask |= np.where(df[condition].to_numpy() == 1, bit, 0).astype(np.int32)
+    return bitmask
+
+
+def selection_mask(df, selected_condition):
+    """
+    Finds the rows that match a selection with one bitwise pass over their conditionMask.
+    The mask is computed from the condition columns when the frame does not carry one.
+
+    Parameters:
+    df (pd.DataFrame): Notifications, with conditionMask or the condition columns.
+    selected_condition (str): The selection string.
+
+    Returns:
+    np.ndarray: A boolean array, True for matching rows.
+    """
+    conditions, mode = parse_condition_selection(selected_condition)
+    if not conditions:
+        return np.ones(len(df), dtype=bool)
+    bitmask = df['conditionMask'].to_numpy() if 'conditionMask' in df else condition_bitmask(df)
+    bits = sum(CONDITION_BITS[condition] for condition in conditions)
+    if mode == 'AND':
+        return (bitmask & bits) == bits
+    return (bitmask & bits) != 0
+
+
+def build_condition_index(df):
+    """
+    Builds one packed bitmap per condition over the rows of a table, in row order.
+
+    Parameters:
+    df (pd.DataFrame): Notifications, with conditionMask or the condition columns.
+
+    Returns:
+    dict: The number of rows, the FSA of each row and the packed bitmap of each condition.
+    """
+    bitmask = df['conditionMask'].to_numpy() if 'conditionMask' in df else condition_bitmask(df)
+    return {
+        'rows': len(df),
+        'areas': df['Forward_Sortation_Area'].to_numpy(),
+        'bitmaps': {condition: np.packbits((bitmask & bit) != 0) for condition, bit in CONDITION_BITS.items()},
+    }
+
+
+def selection_bitmap(index, selected_condition, selected_area="All Areas"):
+    """
+    Resolves a selection and area to a packed bitmap of matching rows by combining the condition bitmaps.
+
+    Returns:
+    np.ndarray: The packed bitmap.
+    """
+    conditions, mode = parse_condition_selection(selected_condition)
+    if conditions:
+        combine = np.bitwise_and if mode == 'AND' else np.bitwise_or
+        bitmap = combine.reduce([index['bitmaps'][condition] for condition in conditions])
+    else:
+        bitmap = np.packbits(np.ones(index['rows'], dtype=bool))
+    if selected_area != "All Areas":
+        bitmap = bitmap & np.packbits(index['areas'] == selected_area)
+    return bitmap
+
+
+def count_rows(bitmap):
+    return int(POPCOUNT[bitmap].sum())
+
+
+def cooccurrence_matrix(index, selected_condition="All Conditions", selected_area="All Areas"):
+    """
+    Counts how often every pair of conditions is reported on the same notification, among the
+    notifications matching the selection and area. The diagonal is the count of each condition.
+
+    Returns:
+    pd.DataFrame: A condition by condition matrix of notification counts.
+    """
+    rows = selection_bitmap(index, selected_condition, selected_area)
+    bitmaps = [index['bitmaps'][condition] & rows for condition in CONDITION_COLUMNS]
+    counts = np.array([[count_rows(first & second) for second in bitmaps] for first in bitmaps])
+    return pd.DataFrame(counts, index=CONDITION_COLUMNS, columns=CONDITION_COLUMNS)
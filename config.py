@@ -38,22 +38,198 @@ def get_csv_file_path_1():
     file_path = os.getenv('CSV_FILE_PATH_1')
     return file_path
 
-def get_csv_file_path_2():
+
+def get_fsa_boundary_file():
     """
-    Get the second CSV file path from the environment variables.
+    Get the national FSA boundary file (shapefile or GeoJSON) from the environment variables.
 
     Parameters:
     None
 
     Returns:
-    file_path (str): The CSV file path.
+    file_path (str): The boundary file path, or None if the per-region GeoJSON files are already in place.
     """
-    file_path = os.getenv('CSV_FILE_PATH_2')
+    file_path = os.getenv('FSA_BOUNDARY_FILE')
     return file_path
 
 
+# Regions the dashboard can serve. The first letter of a postal code decides the region of a
+# notification, and PRUID selects the province from Statistics Canada boundary files.
+REGIONS = {
+    'NL': {'label': 'Newfoundland and Labrador', 'pruid': '10', 'postal_prefixes': 'A', 'center': {'lat': 47.5615, 'lon': -52.7126}},
+    'PE': {'label': 'Prince Edward Island', 'pruid': '11', 'postal_prefixes': 'C', 'center': {'lat': 46.2382, 'lon': -63.1311}},
+    'NS': {'label': 'Nova Scotia', 'pruid': '12', 'postal_prefixes': 'B', 'center': {'lat': 44.6488, 'lon': -63.5752}},
+    'NB': {'label': 'New Brunswick', 'pruid': '13', 'postal_prefixes': 'E', 'center': {'lat': 45.9636, 'lon': -66.6431}},
+    'QC': {'label': 'Quebec', 'pruid': '24', 'postal_prefixes': 'GHJ', 'center': {'lat': 45.5019, 'lon': -73.5674}},
+    'ON': {'label': 'Ontario', 'pruid': '35', 'postal_prefixes': 'KLMNP', 'center': {'lat': 43.6532, 'lon': -79.3832}},
+    'MB': {'label': 'Manitoba', 'pruid': '46', 'postal_prefixes': 'R', 'center': {'lat': 49.89106721862937, 'lon': -97.13086449579419}},
+    'SK': {'label': 'Saskatchewan', 'pruid': '47', 'postal_prefixes': 'S', 'center': {'lat': 52.1332, 'lon': -106.6700}},
+    'AB': {'label': 'Alberta', 'pruid': '48', 'postal_prefixes': 'T', 'center': {'lat': 51.0447, 'lon': -114.0719}},
+    'BC': {'label': 'British Columbia', 'pruid': '59', 'postal_prefixes': 'V', 'center': {'lat': 49.2827, 'lon': -123.1207}},
+}
+DEFAULT_REGION = os.getenv('DEFAULT_REGION', 'MB')
+
+# GeoJSON boundary files for the Forward Sortation Areas, one per region
+BOUNDARY_DIR = 'GeoJSON_stuff/Polygons'
+FSA_GEOJSON_PATH = f'{BOUNDARY_DIR}/output_geojson_manitoba_fsa.geojson'
+
+def region_geojson_path(region):
+    """
+    Get the FSA boundary file for a region.
+
+    Parameters:
+    region (str): The region code, e.g. "MB".
+
+    Returns:
+    file_path (str): The GeoJSON file path.
+    """
+    if region == 'MB':
+        return FSA_GEOJSON_PATH
+    return f'{BOUNDARY_DIR}/fsa_{region.lower()}.geojson'
+
+# Boundary sets the bar chart and choropleth can aggregate notifications to. setup_database assigns every
+# notification to a unit of each set once and stores the unit as an integer code in map_table's boundary_<set>
+# column. FSAs come from the notification's postal code; other sets are joined spatially from their GeoJSON
+BOUNDARY_SETS = {
+    'fsa': {
+        'label': 'Forward Sortation Areas', 'unit_label': 'Area', 'column': 'Forward_Sortation_Area',
+        'feature_id': 'CFSAUID', 'attribute': 'Forward_Sortation_Area',
+    },
+    'fed': {
+        'label': 'Federal Electoral Districts', 'unit_label': 'Electoral District', 'column': 'Electoral_District',
+        'feature_id': 'FEDUID', 'feature_name': 'FEDENAME',
+    },
+}
+DEFAULT_BOUNDARY_SET = 'fsa'
+
+def boundary_geojson_path(boundary_set, region):
+    """
+    Get the GeoJSON file of a boundary set for a region.
+
+    Parameters:
+    boundary_set (str): The boundary set, a key of BOUNDARY_SETS.
+    region (str): The region code, e.g. "MB".
+
+    Returns:
+    file_path (str): The GeoJSON file path.
+    """
+    if boundary_set == 'fsa':
+        return region_geojson_path(region)
+    # Named the way GeoJSON_stuff/shp_to_geojson.py writes them
+    if region == 'MB':
+        return f'{BOUNDARY_DIR}/fed_electoral_output_geojson_manitoba.geojson'
+    return f"{BOUNDARY_DIR}/fed_electoral_output_geojson_{REGIONS[region]['pruid']}.geojson"
+
+def region_table(table_name, region):
+    """
+    Get the name of a region's partition of a table.
+
+    Parameters:
+    table_name (str): The base table name, e.g. "map_table".
+    region (str): The region code, e.g. "MB".
+
+    Returns:
+    table_name (str): The partition table name, e.g. "map_table_mb".
+
+    Raises:
+    ValueError: If the region is not in REGIONS.
+    """
+    if region not in REGIONS:
+        raise ValueError(f"Unknown region: {region}")
+    return f"{table_name}_{region.lower()}"
+
+def postal_code_region(postal_code):
+    """
+    Get the region a postal code or FSA belongs to.
+
+    Parameters:
+    postal_code (str): A postal code or Forward Sortation Area.
+
+    Returns:
+    region (str): The region code, or None if the prefix is unknown.
+    """
+    if not isinstance(postal_code, str) or not postal_code:
+        return None
+    prefix = postal_code.strip()[:1].upper()
+    for region, region_config in REGIONS.items():
+        if prefix and prefix in region_config['postal_prefixes']:
+            return region
+    return None
+
+# Vector tile settings
+TILE_CACHE_DIR = os.getenv('TILE_CACHE_DIR', 'tile_cache')
+TILE_CACHE_MAX_BYTES = int(os.getenv('TILE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# The scatter map draws its points from the notifications tile layer; on top of it, a marker trace with this many
+# points at most carries hover and click events for the notifications in view
+SCATTER_TRACE_MAX_POINTS = int(os.getenv('SCATTER_TRACE_MAX_POINTS', 1500))
+# Map size in pixels assumed when working out what a freshly centred map shows, before the browser reports it
+MAP_VIEWPORT_PX = (1600, 1000)
+
+# Seconds between checks of the data_version table
+DATA_VERSION_TTL = int(os.getenv('DATA_VERSION_TTL', 30))
+# setup_database announces new versions on this Postgres NOTIFY channel. While a worker is listening it only
+# re-reads the version as a safety net every DATA_VERSION_LISTEN_TTL seconds; without Postgres it polls instead
+DATA_VERSION_CHANNEL = 'data_version'
+DATA_VERSION_LISTEN_TTL = int(os.getenv('DATA_VERSION_LISTEN_TTL', 300))
+DATA_VERSION_POLL_SECONDS = int(os.getenv('DATA_VERSION_POLL_SECONDS', 5))
+
+# Disk-backed cache of serialized chart, map and table payloads, shared by all workers and kept across restarts
+SERVING_CACHE_PATH = os.getenv('SERVING_CACHE_PATH', 'cache/payload_cache.sqlite')
+SERVING_CACHE_MAX_BYTES = int(os.getenv('SERVING_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Background pre-warming of the serving cache
+PREWARM_ENABLED = os.getenv('PREWARM_ENABLED', 'true').lower() == 'true'
+PREWARM_WORKERS = int(os.getenv('PREWARM_WORKERS', 1))
+PREWARM_START_DELAY = int(os.getenv('PREWARM_START_DELAY', 10))
+PREWARM_POLL_SECONDS = int(os.getenv('PREWARM_POLL_SECONDS', 60))
+
+# Kernel density surface settings
+DENSITY_GRID_SIZE = 2048
+DENSITY_BANDWIDTH_M = 400
+# Heatmap cells below this fraction of the peak density are not drawn
+DENSITY_RENDER_THRESHOLD = 0.01
+
+# Opt-in callback profiler. Requests carrying the admin token in the X-Profile header, the profile
+# query parameter or cookie get a cProfile capture; with PROFILE_SLOW_MS set, slower callbacks are sampled
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SLOW_MS = int(os.getenv('PROFILE_SLOW_MS', 0))
+PROFILE_SAMPLE_INTERVAL_MS = 5
+PROFILE_MAX_CAPTURES = 200
+
+# Partitioned ingest: validation, boundary codes, count cubes and density tiles run on a pool of ETL_WORKERS processes
+# and tables are loaded in ETL_LOAD_CHUNK_ROWS chunks by as many threads
+ETL_PARTITIONED = os.getenv('ETL_PARTITIONED', 'false').lower() == 'true'
+ETL_WORKERS = int(os.getenv('ETL_WORKERS', os.cpu_count() or 1))
+ETL_TILES_PER_AXIS = int(os.getenv('ETL_TILES_PER_AXIS', 4))
+ETL_LOAD_CHUNK_ROWS = int(os.getenv('ETL_LOAD_CHUNK_ROWS', 50000))
+
+# Risk types the count cube and trends page break notifications down by. Free-text entries
+# are matched on their leading "Type I/II/III" and anything else is counted as Other
+RISK_TYPES = ['Type I', 'Type II', 'Type III', 'Other']
+
+# Full-text search settings
+SEARCH_PAGE_SIZE = 200
+SEARCH_MIN_TOKEN_LENGTH = 2
+
+# Rows fetched per round trip when streaming exports
+EXPORT_CHUNK_SIZE = 5000
+
+# JSON API page sizes
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+# Proximity search settings
+NEARBY_DEFAULT_RADIUS_M = 250
+NEARBY_MAX_RADIUS_M = 5000
+NEARBY_MAX_RESULTS = 200
+
 # Dropdown options
+REGION_DROPDOWN_OPTIONS = [{'label': region_config['label'], 'value': region} for region, region_config in REGIONS.items()]
 AREA_DROPDOWN_OPTIONS = [{'label': 'All Areas', 'value': 'All Areas'}]
+RISK_TYPE_DROPDOWN_OPTIONS = [{'label': 'All Risk Types', 'value': 'All Risk Types'}] + [{'label': risk_type, 'value': risk_type} for risk_type in RISK_TYPES]
 CONDITION_DROPDOWN_OPTIONS = [
     {'label': 'All Conditions', 'value': 'All Conditions'},
     {'label': 'Vermiculite', 'value': 'Vermiculite'},
@@ -0,0 +1,216 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+from config import RISK_TYPES
+from conditions import CONDITION_COLUMNS
+
+# The first measure counts notifications, the others count notifications reporting each condition
+MEASURES = ['Notifications'] + CONDITION_COLUMNS
+RISK_TYPE_PATTERN = re.compile(r'^Type (III|II|I)')
+# Year slot for notifications with no usable start year; counted in totals but not in trends
+UNKNOWN_YEAR = 0
+
+
+def risk_type_codes(risk_types):
+    """
+    Maps free-text risk types onto indices into RISK_TYPES.
+
+    Parameters:
+    risk_types (pd.Series): The riskType column.
+
+    Returns:
+    np.ndarray: The index of each notification's risk type, with unrecognised entries counted as Other.
+    """
+    matched = risk_types.astype('string').str.strip().str.extract(RISK_TYPE_PATTERN, expand=False)
+    labels = ('Type ' + matched).fillna('Other')
+    return pd.Categorical(labels, categories=RISK_TYPES).codes.astype(np.intp)
+
+
+def notification_years(df):
+    """
+    Reads each notification's start year, from startYear or else from startDate.
+
+    Returns:
+    np.ndarray: The years, UNKNOWN_YEAR where neither is usable.
+    """
+    years = pd.to_numeric(df['startYear'], errors='coerce') if 'startYear' in df else pd.Series(np.nan, index=df.index)
+    if 'startDate' in df:
+        years = years.fillna(pd.to_datetime(df['startDate'], errors='coerce').dt.year)
+    return years.fillna(UNKNOWN_YEAR).astype(int).to_numpy()
+
+
+def build_count_cube(df):
+    """
+    Counts notifications over FSA x measure x start year x risk type in one bincount per measure.
+
+    The year axis runs through every year from the first to the last, so years with no notifications
+    are present as zeros and year-over-year changes line up.
+
+    Parameters:
+    df (pd.DataFrame): Valid notifications, with 0/1 condition columns.
+
+    Returns:
+    dict: The int32 counts, shaped (FSA, measure, year, risk type), and the labels of each axis.
+    """
+    fsa_codes, fsas = pd.factorize(df['Forward_Sortation_Area'], sort=True)
+    years = notification_years(df)
+    known = years[years != UNKNOWN_YEAR]
+    year_axis = np.arange(known.min(), known.max() + 1) if len(known) else np.array([], dtype=int)
+    if (years == UNKNOWN_YEAR).any():
+        year_axis = np.append(year_axis, UNKNOWN_YEAR)
+    year_codes = np.searchsorted(year_axis[year_axis != UNKNOWN_YEAR], years)
+    year_codes[years == UNKNOWN_YEAR] = len(year_axis) - 1
+
+    shape = (len(fsas), len(year_axis), len(RISK_TYPES))
+    cells = np.ravel_multi_index((fsa_codes, year_codes, risk_type_codes(df['riskType'])), shape)
+    size = int(np.prod(shape))
+    layers = [np.bincount(cells, minlength=size)]
+    layers += [np.bincount(cells, weights=df[condition].to_numpy(), minlength=size) for condition in CONDITION_COLUMNS]
+    counts = np.stack(layers).reshape((len(MEASURES),) + shape).transpose(1, 0, 2, 3)
+    return {
+        'counts': counts.astype(np.int32),
+        'fsas': np.asarray(fsas, dtype=str),
+        'measures': np.array(MEASURES),
+        'years': year_axis.astype(np.int32),
+        'risk_types': np.array(RISK_TYPES),
+    }
+
+
+def merge_count_cubes(cubes):
+    """
+    Sums cubes counted over separate sets of notifications, such as the FSA partitions of a region.
+
+    The merged axes span every partition's FSAs and years, laid out the way build_count_cube lays them out,
+    so the result is the cube build_count_cube gives for all the notifications at once.
+
+    Parameters:
+    cubes (list): Cubes from build_count_cube.
+
+    Returns:
+    dict: The summed cube.
+    """
+    fsas = np.unique(np.concatenate([cube['fsas'] for cube in cubes]))
+    all_years = np.concatenate([cube['years'] for cube in cubes])
+    known = all_years[all_years != UNKNOWN_YEAR]
+    year_axis = np.arange(known.min(), known.max() + 1) if len(known) else np.array([], dtype=int)
+    if (all_years == UNKNOWN_YEAR).any():
+        year_axis = np.append(year_axis, UNKNOWN_YEAR)
+
+    counts = np.zeros((len(fsas), len(MEASURES), len(year_axis), len(RISK_TYPES)), dtype=np.int32)
+    for cube in cubes:
+        fsa_positions = np.searchsorted(fsas, cube['fsas'])
+        # The unknown year is last on every axis, so it is matched by value rather than by sort order
+        year_positions = np.array([np.flatnonzero(year_axis == year)[0] for year in cube['years']], dtype=np.intp)
+        counts[np.ix_(fsa_positions, np.arange(len(MEASURES)), year_positions, np.arange(len(RISK_TYPES)))] += cube['counts']
+    return {
+        'counts': counts,
+        'fsas': fsas.astype(str),
+        'measures': np.array(MEASURES),
+        'years': year_axis.astype(np.int32),
+        'risk_types': np.array(RISK_TYPES),
+    }
+
+
+def cube_aggregates(cube):
+    """
+    Derives the per-FSA totals and percentages, in the layout of aggregated_fsa_table, from the cube.
+
+    Returns:
+    pd.DataFrame: Total_Notifs, Total_<condition> and <condition>_Percent per FSA.
+    """
+    totals = cube['counts'].sum(axis=(2, 3))
+    table = pd.DataFrame({'Forward_Sortation_Area': cube['fsas'], 'Total_Notifs': totals[:, 0]})
+    for position, condition in enumerate(CONDITION_COLUMNS, start=1):
+        table[f"Total_{condition}"] = totals[:, position]
+    for position, condition in enumerate(CONDITION_COLUMNS, start=1):
+        # Rounded half up, like the FSA-summarized CSV this table replaces
+        percent = np.floor(totals[:, position] / np.maximum(totals[:, 0], 1) * 10000 + 0.5) / 100
+        table[f"{condition}_Percent"] = [f"{value:.2f}%" for value in percent]
+    return table
+
+
+def pack_count_cube(cube):
+    """
+    Serialises the cube into one compressed blob for storage in the database.
+
+    Returns:
+    bytes: The compressed .npz payload.
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **cube)
+    return buffer.getvalue()
+
+
+def unpack_count_cube(payload):
+    """
+    Restores a cube written by pack_count_cube, with the FSA positions and region-wide counts
+    precomputed so every slice is an index into an array.
+
+    Returns:
+    dict: The cube.
+    """
+    with np.load(io.BytesIO(payload)) as arrays:
+        cube = {name: arrays[name] for name in arrays.files}
+    cube['fsa_index'] = {fsa: position for position, fsa in enumerate(cube['fsas'])}
+    cube['region_counts'] = cube['counts'].sum(axis=0)
+    return cube
+
+
+def trend_slice(cube, selected_area="All Areas", measures=("Notifications",), risk_type="All Risk Types"):
+    """
+    Reads counts per start year for an area, a set of measures and a risk type.
+
+    Parameters:
+    cube (dict): The cube from unpack_count_cube.
+    selected_area (str): An FSA, or "All Areas" for the whole region.
+    measures (sequence): Entries of MEASURES.
+    risk_type (str): An entry of RISK_TYPES, or "All Risk Types".
+
+    Returns:
+    pd.DataFrame: One row per year and one column per measure. Empty if the area has no notifications.
+    """
+    known = cube['years'] != UNKNOWN_YEAR
+    if selected_area == "All Areas":
+        counts = cube['region_counts']
+    elif selected_area in cube['fsa_index']:
+        counts = cube['counts'][cube['fsa_index'][selected_area]]
+    else:
+        return pd.DataFrame(columns=['Year'] + list(measures))
+    measure_index = [MEASURES.index(measure) for measure in measures]
+    if risk_type == "All Risk Types":
+        counts = counts[measure_index].sum(axis=2)
+    else:
+        counts = counts[measure_index, :, RISK_TYPES.index(risk_type)]
+    trends = pd.DataFrame(counts[:, known].T, columns=list(measures))
+    trends.insert(0, 'Year', cube['years'][known])
+    return trends
+
+
+def year_over_year(trends):
+    """
+    Adds the percentage change from the previous year for each measure of a trend slice.
+
+    Returns:
+    pd.DataFrame: The slice with a "<measure> YoY %" column after each measure, blank where the previous year had none.
+    """
+    table = trends[['Year']].copy()
+    for measure in trends.columns[1:]:
+        previous = trends[measure].shift(1)
+        change = (trends[measure] - previous) / previous.where(previous > 0) * 100
+        table[measure] = trends[measure]
+        table[f"{measure} YoY %"] = change.round(1)
+    return table
+
+
+def trend_measures(conditions):
+    """
+    Picks the measures to chart for the selected conditions, in MEASURES order.
+
+    Returns:
+    list: The selected conditions, or just "Notifications" when none are selected.
+    """
+    if isinstance(conditions, str):
+        conditions = [conditions]
+    selected = set(conditions or [])
+    return [condition for condition in CONDITION_COLUMNS if condition in selected] or ['Notifications']
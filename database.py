@@ -1,26 +1,42 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import os
+import select
 import threading
 import time
-from config import get_database_url
-
-# Database connection setup
-DATABASE_URL = get_database_url()
-
-try:
-    # Create a SQLAlchemy engine for database connections
-    engine = create_engine(
-        DATABASE_URL,
-        pool_size=1,
-        max_overflow=10,
-        pool_timeout=30,
-        pool_recycle=1800,
-        pool_pre_ping=True,
-        echo=True
-    )
-except Exception as e:
-    print(f"Error creating engine: {e}")
-    engine = None
+from config import get_database_url, DATA_VERSION_TTL, DATA_VERSION_LISTEN_TTL
+from config import DATA_VERSION_CHANNEL, DATA_VERSION_POLL_SECONDS
+from conditions import CONDITION_COLUMNS, parse_condition_selection
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """
+    Get the shared SQLAlchemy engine, creating it on first use so importing this module does no database work.
+
+    Parameters:
+    None
+
+    Returns:
+    engine (sqlalchemy.engine.Engine): The engine, or None if it could not be created.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            try:
+                # Create a SQLAlchemy engine for database connections
+                _engine = create_engine(
+                    get_database_url(),
+                    pool_size=1,
+                    max_overflow=10,
+                    pool_timeout=30,
+                    pool_recycle=1800,
+                    pool_pre_ping=True,
+                    echo=True
+                )
+            except Exception as e:
+                print(f"Error creating engine: {e}")
+        return _engine
 
 def close_idle_connections(engine, idle_timeout=1200):
     while True:
@@ -38,4 +54,172 @@ def start_idle_connection_closer(engine):
         thread.daemon = True
         thread.start()
     else:
-        print("Engine is not initialized, cannot start idle connection closer.")
\ No newline at end of file
+        print("Engine is not initialized, cannot start idle connection closer.")
+
+_data_version = None
+_data_version_checked_at = 0
+_data_version_lock = threading.Lock()
+# Set once start_version_listener is running; the data version is then pushed and only re-read as a safety net
+_version_listener = None
+_invalidation_callbacks = []
+
+def get_data_version():
+    """
+    Get the version setup_database stamped on the current data.
+
+    The version is re-read at most every DATA_VERSION_TTL seconds, so callers can use it in every cache key.
+    While the version listener is running, new versions are pushed to this process and the TTL is much longer.
+
+    Parameters:
+    None
+
+    Returns:
+    version (str): The data version, or "unversioned" if the data_version table is missing.
+    """
+    global _data_version, _data_version_checked_at
+    with _data_version_lock:
+        ttl = DATA_VERSION_LISTEN_TTL if _version_listener is not None else DATA_VERSION_TTL
+        if _data_version is not None and time.time() - _data_version_checked_at < ttl:
+            return _data_version
+        previous = _data_version
+        _data_version = read_data_version() or "unversioned"
+        _data_version_checked_at = time.time()
+        version = _data_version
+    if previous is not None and version != previous:
+        run_invalidation_callbacks(version)
+    return version
+
+def read_data_version():
+    """
+    Read the data version straight from the database.
+
+    Returns:
+    version (str): The data version, or None if it could not be read.
+    """
+    try:
+        with get_engine().connect() as conn:
+            return conn.execute(text('SELECT version FROM data_version')).scalar()
+    except Exception as e:
+        print(f"Error fetching data version: {e}")
+        return None
+
+def on_data_version_change(callback):
+    """
+    Register a function to call when this process learns of a new data version, so it can drop state built from older data.
+
+    Parameters:
+    callback (callable): Called with no arguments, after get_data_version already returns the new version.
+
+    Returns:
+    callable: The callback, so this can be used as a decorator.
+    """
+    _invalidation_callbacks.append(callback)
+    return callback
+
+def run_invalidation_callbacks(version):
+    print(f"Data version changed to {version}; dropping stale cached state.")
+    for callback in _invalidation_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print(f"Error invalidating cached state: {e}")
+
+def set_data_version(version):
+    """
+    Record a data version learned from the listener and invalidate cached state if it is new.
+
+    Parameters:
+    version (str): The published data version.
+
+    Returns:
+    None
+    """
+    global _data_version, _data_version_checked_at
+    with _data_version_lock:
+        previous = _data_version
+        _data_version = version
+        _data_version_checked_at = time.time()
+    if version != previous:
+        run_invalidation_callbacks(version)
+
+def listen_for_data_versions():
+    """
+    Wait for setup_database to publish new data versions and apply them.
+
+    On Postgres with psycopg2 this LISTENs on DATA_VERSION_CHANNEL; elsewhere, such as SQLite,
+    it polls the data_version table every DATA_VERSION_POLL_SECONDS. A dropped connection is retried.
+    """
+    while True:
+        engine = get_engine()
+        try:
+            if engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2':
+                listen_with_notify(engine)
+            else:
+                version = read_data_version()
+                if version:
+                    set_data_version(version)
+                time.sleep(DATA_VERSION_POLL_SECONDS)
+        except Exception as e:
+            print(f"Error listening for data versions: {e}")
+            time.sleep(DATA_VERSION_POLL_SECONDS)
+
+def listen_with_notify(engine):
+    """
+    Hold a dedicated connection LISTENing for new data versions until it fails.
+    """
+    connection = engine.raw_connection()
+    try:
+        dbapi_connection = connection.dbapi_connection
+        dbapi_connection.autocommit = True
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {DATA_VERSION_CHANNEL}')
+        # Catch up on a version published before LISTEN started
+        version = read_data_version()
+        if version:
+            set_data_version(version)
+        while True:
+            # Wake up periodically so a dead connection is noticed
+            if select.select([dbapi_connection], [], [], DATA_VERSION_LISTEN_TTL)[0]:
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    set_data_version(dbapi_connection.notifies.pop(0).payload)
+            else:
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+    finally:
+        connection.invalidate()
+
+def start_version_listener():
+    """
+    Start the background thread that applies new data versions as soon as they are published. Once per process.
+    """
+    global _version_listener
+    if _version_listener is None:
+        _version_listener = threading.Thread(target=listen_for_data_versions, name='data-version-listener', daemon=True)
+        _version_listener.start()
+
+def build_filter_clause(selected_area, selected_condition, alias=None):
+    """
+    Builds the SQL equivalent of utils.filter_data for use in WHERE clauses.
+
+    Parameters:
+    selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
+    selected_condition (str): The condition selection, e.g. "Drywall" or "Drywall AND Plaster". If "All Conditions", no condition filtering is applied.
+    alias (str): Optional table alias to qualify the column names with.
+
+    Returns:
+    tuple: The SQL condition string and its bound parameters.
+
+    Raises:
+    ValueError: If the selection names an unknown condition.
+    """
+    prefix = f"{alias}." if alias else ""
+    clauses = ["1 = 1"]
+    params = {}
+    conditions, mode = parse_condition_selection(selected_condition)
+    if conditions:
+        clauses.append("(" + f" {mode} ".join(f'{prefix}"{condition}" = 1' for condition in conditions) + ")")
+    if selected_area != "All Areas":
+        clauses.append(f'{prefix}"Forward_Sortation_Area" = :selected_area')
+        params['selected_area'] = selected_area
+    return " AND ".join(clauses), params
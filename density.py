@@ -0,0 +1,294 @@
+import io
+import numpy as np
+from config import CONDITION_DROPDOWN_OPTIONS, DENSITY_GRID_SIZE, DENSITY_BANDWIDTH_M
+
+CONDITIONS = [option['value'] for option in CONDITION_DROPDOWN_OPTIONS]
+METRES_PER_DEGREE_LAT = 111320.0
+
+
+def surface_bounds(lat, lon, margin=0.02):
+    """
+    Picks the grid extent for a set of points, ignoring the most extreme 0.5% on each side
+    so a few far-away notifications do not stretch the grid over empty land.
+
+    Parameters:
+    lat (np.ndarray): Latitudes of the points.
+    lon (np.ndarray): Longitudes of the points.
+    margin (float): Padding added on every side, in degrees.
+
+    Returns:
+    tuple: The (lat_min, lat_max, lon_min, lon_max) bounds.
+    """
+    lat_min, lat_max = np.percentile(lat, [0.5, 99.5])
+    lon_min, lon_max = np.percentile(lon, [0.5, 99.5])
+    return lat_min - margin, lat_max + margin, lon_min - margin, lon_max + margin
+
+
+def gaussian_kernel(bounds, grid_size, bandwidth_m):
+    """
+    Builds a normalised Gaussian kernel on the grid, truncated at three bandwidths.
+
+    The grid cells are not square on the ground, so the kernel width is worked out separately for latitude and longitude.
+
+    Parameters:
+    bounds (tuple): The grid bounds from surface_bounds.
+    grid_size (int): The number of cells along each axis.
+    bandwidth_m (float): The kernel bandwidth in metres.
+
+    Returns:
+    np.ndarray: The kernel, summing to 1.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds
+    cell_lat_m = (lat_max - lat_min) / grid_size * METRES_PER_DEGREE_LAT
+    cell_lon_m = (lon_max - lon_min) / grid_size * METRES_PER_DEGREE_LAT * np.cos(np.radians((lat_min + lat_max) / 2))
+    sigma_lat = bandwidth_m / cell_lat_m
+    sigma_lon = bandwidth_m / cell_lon_m
+
+    half_lat = max(1, int(np.ceil(3 * sigma_lat)))
+    half_lon = max(1, int(np.ceil(3 * sigma_lon)))
+    y = np.arange(-half_lat, half_lat + 1)[:, None]
+    x = np.arange(-half_lon, half_lon + 1)[None, :]
+    kernel = np.exp(-0.5 * ((y / sigma_lat) ** 2 + (x / sigma_lon) ** 2))
+    return kernel / kernel.sum()
+
+
+def cell_area_km2(bounds, grid_size):
+    """
+    Computes the ground area of one grid cell at the centre of the grid.
+
+    Returns:
+    float: The cell area in square kilometres.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds
+    height_km = (lat_max - lat_min) / grid_size * METRES_PER_DEGREE_LAT / 1000
+    width_km = (lon_max - lon_min) / grid_size * METRES_PER_DEGREE_LAT * np.cos(np.radians((lat_min + lat_max) / 2)) / 1000
+    return height_km * width_km
+
+
+def grid_cells(lat, lon, bounds, grid_size):
+    """
+    Finds the grid cell of every point, the same way np.histogram2d bins them.
+
+    Parameters:
+    lat (np.ndarray): Latitudes of the points.
+    lon (np.ndarray): Longitudes of the points.
+    bounds (tuple): The grid bounds from surface_bounds.
+    grid_size (int): The number of cells along each axis.
+
+    Returns:
+    tuple: The row and column of each point, and a mask of the points that fall inside the grid.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds
+    rows = np.floor((lat - lat_min) / (lat_max - lat_min) * grid_size).astype(np.int64)
+    cols = np.floor((lon - lon_min) / (lon_max - lon_min) * grid_size).astype(np.int64)
+    # Points on the upper edges belong to the last cell
+    rows[lat == lat_max] = grid_size - 1
+    cols[lon == lon_max] = grid_size - 1
+    inside = (rows >= 0) & (rows < grid_size) & (cols >= 0) & (cols < grid_size)
+    return rows, cols, inside
+
+
+def convolve_tile(rows, cols, extent, core, kernel):
+    """
+    Counts points on part of the grid and smooths the counts with the kernel.
+
+    Runs in the ETL process pool for partitioned builds, so it only takes plain arrays.
+
+    Parameters:
+    rows (np.ndarray): Grid rows of the points inside the extent.
+    cols (np.ndarray): Grid columns of the points inside the extent.
+    extent (tuple): The (row_start, row_stop, col_start, col_stop) cells to count, including any halo.
+    core (tuple): The cells to return, relative to the extent.
+    kernel (np.ndarray): The smoothing kernel.
+
+    Returns:
+    np.ndarray: The smoothed counts for the core cells.
+    """
+    # Only ingest needs scipy, so the app does not pay for importing it
+    from scipy.signal import fftconvolve
+
+    row_start, row_stop, col_start, col_stop = extent
+    height, width = row_stop - row_start, col_stop - col_start
+    counts = np.bincount((rows - row_start) * width + (cols - col_start), minlength=height * width)
+    surface = fftconvolve(counts.reshape(height, width).astype(np.float64), kernel, mode='same')
+    core_row_start, core_row_stop, core_col_start, core_col_stop = core
+    return surface[core_row_start:core_row_stop, core_col_start:core_col_stop]
+
+
+def tile_tasks(rows, cols, grid_size, kernel, tiles_per_axis):
+    """
+    Splits the grid into tiles padded with a halo as wide as the kernel radius.
+
+    Every cell in a tile's core then sees all the points within kernel reach, including those in
+    neighbouring tiles, so stitching the cores together gives the same surface as one convolution.
+
+    Yields:
+    tuple: The tile's core cells on the full grid, and the arguments for convolve_tile.
+    """
+    half_rows, half_cols = kernel.shape[0] // 2, kernel.shape[1] // 2
+    edges = np.linspace(0, grid_size, tiles_per_axis + 1).astype(int)
+    for row_start, row_stop in zip(edges[:-1], edges[1:]):
+        for col_start, col_stop in zip(edges[:-1], edges[1:]):
+            extent = (
+                max(0, row_start - half_rows), min(grid_size, row_stop + half_rows),
+                max(0, col_start - half_cols), min(grid_size, col_stop + half_cols),
+            )
+            selected = (rows >= extent[0]) & (rows < extent[1]) & (cols >= extent[2]) & (cols < extent[3])
+            core = (row_start - extent[0], row_stop - extent[0], col_start - extent[2], col_stop - extent[2])
+            yield (row_start, row_stop, col_start, col_stop), (rows[selected], cols[selected], extent, core, kernel)
+
+
+def compute_density_surfaces(df, grid_size=DENSITY_GRID_SIZE, bandwidth_m=DENSITY_BANDWIDTH_M, executor=None, tiles_per_axis=1):
+    """
+    Computes a kernel density surface for every condition with a binned FFT convolution.
+
+    Points are binned onto a fixed grid (O(N)) and the counts are convolved with a Gaussian
+    kernel through the FFT (O(G log G)), so there are no per-point neighbour queries.
+    With an executor the grid is split into halo-padded tiles that are convolved in parallel.
+
+    Parameters:
+    df (pd.DataFrame): The notifications, with Latitude, Longitude and condition columns.
+    grid_size (int): The number of cells along each axis.
+    bandwidth_m (float): The kernel bandwidth in metres.
+    executor (concurrent.futures.Executor): Optional process pool for the tiles.
+    tiles_per_axis (int): How many tiles to split each axis into when an executor is given.
+
+    Returns:
+    dict: The bounds and a notifications-per-km² float32 surface for each condition, with rows running south to north.
+    """
+    df = df.dropna(subset=['Latitude', 'Longitude'])
+    lat = df['Latitude'].to_numpy()
+    lon = df['Longitude'].to_numpy()
+    bounds = surface_bounds(lat, lon)
+    kernel = gaussian_kernel(bounds, grid_size, bandwidth_m)
+    area = cell_area_km2(bounds, grid_size)
+    rows, cols, inside = grid_cells(lat, lon, bounds, grid_size)
+
+    surfaces = {}
+    for condition in CONDITIONS:
+        mask = inside if condition == "All Conditions" else inside & (df[condition] == 1).to_numpy()
+        if executor is None or tiles_per_axis <= 1:
+            full_grid = (0, grid_size, 0, grid_size)
+            surface = convolve_tile(rows[mask], cols[mask], full_grid, full_grid, kernel)
+        else:
+            surface = np.empty((grid_size, grid_size), dtype=np.float64)
+            futures = {
+                executor.submit(convolve_tile, *args): tile
+                for tile, args in tile_tasks(rows[mask], cols[mask], grid_size, kernel, tiles_per_axis)
+            }
+            for future, (row_start, row_stop, col_start, col_stop) in futures.items():
+                surface[row_start:row_stop, col_start:col_stop] = future.result()
+        # The FFT leaves round-off noise where the true result is zero; clearing it keeps the stored arrays compressible
+        surface[surface < 1e-6 * max(surface.max(), 1e-12)] = 0
+        surfaces[condition] = (surface / area).astype(np.float32)
+
+    return {'bounds': np.array(bounds), 'surfaces': surfaces}
+
+
+def sample_surface(density, lat, lon, condition="All Conditions"):
+    """
+    Reads the surface value at each point. Points outside the grid get 0.
+
+    Parameters:
+    density (dict): The result of compute_density_surfaces or unpack_density_surfaces.
+    lat (np.ndarray): Latitudes of the points.
+    lon (np.ndarray): Longitudes of the points.
+    condition (str): Which condition's surface to sample.
+
+    Returns:
+    np.ndarray: The density at each point.
+    """
+    surface = density['surfaces'][condition]
+    lat_min, lat_max, lon_min, lon_max = density['bounds']
+    rows, cols = surface.shape
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    row = np.floor((lat - lat_min) / (lat_max - lat_min) * rows).astype(int)
+    col = np.floor((lon - lon_min) / (lon_max - lon_min) * cols).astype(int)
+    inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+    values = np.zeros(len(lat), dtype=np.float64)
+    values[inside] = surface[row[inside], col[inside]]
+    return values
+
+
+def pack_density_surfaces(density):
+    """
+    Serialises the surfaces into one compressed blob for storage in the database.
+
+    Returns:
+    bytes: The compressed .npz payload.
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, bounds=density['bounds'], **density['surfaces'])
+    return buffer.getvalue()
+
+
+def unpack_density_surfaces(payload):
+    """
+    Restores the surfaces written by pack_density_surfaces.
+
+    Returns:
+    dict: The bounds and the surface for each condition.
+    """
+    with np.load(io.BytesIO(payload)) as arrays:
+        return {
+            'bounds': arrays['bounds'],
+            'surfaces': {condition: arrays[condition] for condition in CONDITIONS if condition in arrays},
+        }
+
+
+def shared_cells(density, threshold=0.0):
+    """
+    Marks the grid cells that any condition's surface reaches the threshold in.
+
+    Drawing every condition on these cells keeps the cell positions the same from one condition to the next,
+    so switching conditions only changes the values.
+
+    Parameters:
+    density (dict): The unpacked surfaces.
+    threshold (float): The fraction of each surface's own maximum a cell must exceed.
+
+    Returns:
+    np.ndarray: A boolean grid, True for the cells to draw.
+    """
+    keep = np.zeros(next(iter(density['surfaces'].values())).shape, dtype=bool)
+    for surface in density['surfaces'].values():
+        if surface.max() > 0:
+            keep |= surface > threshold * surface.max()
+    return keep
+
+
+def surface_cells(density, condition="All Conditions", lat_range=None, lon_range=None, threshold=0.0, cells=None):
+    """
+    Lists the centre and value of every grid cell above a threshold, ready to plot.
+
+    Parameters:
+    density (dict): The unpacked surfaces.
+    condition (str): Which condition's surface to use.
+    lat_range (tuple): Optional (min, max) latitude to crop to.
+    lon_range (tuple): Optional (min, max) longitude to crop to.
+    threshold (float): Cells below this fraction of the maximum are dropped.
+    cells (np.ndarray): Optional boolean grid from shared_cells, listed instead of thresholding this surface.
+
+    Returns:
+    tuple: Arrays of latitude, longitude and density for the kept cells.
+    """
+    surface = density['surfaces'][condition]
+    lat_min, lat_max, lon_min, lon_max = density['bounds']
+    rows, cols = surface.shape
+    lat_centres = lat_min + (np.arange(rows) + 0.5) * (lat_max - lat_min) / rows
+    lon_centres = lon_min + (np.arange(cols) + 0.5) * (lon_max - lon_min) / cols
+
+    if cells is not None:
+        keep = cells.copy()
+    elif surface.max() > 0:
+        keep = surface > threshold * surface.max()
+    else:
+        keep = np.zeros_like(surface, dtype=bool)
+    if lat_range is not None:
+        keep &= ((lat_centres >= lat_range[0]) & (lat_centres <= lat_range[1]))[:, None]
+    if lon_range is not None:
+        keep &= ((lon_centres >= lon_range[0]) & (lon_centres <= lon_range[1]))[None, :]
+
+    row_idx, col_idx = np.nonzero(keep)
+    return lat_centres[row_idx], lon_centres[col_idx], surface[row_idx, col_idx]
@@ -0,0 +1,155 @@
+import re
+import pandas as pd
+from urllib.parse import urlencode
+from flask import Response, request, abort, stream_with_context
+from sqlalchemy import text
+from database import get_engine, build_filter_clause
+from config import EXPORT_CHUNK_SIZE, DEFAULT_REGION, region_table
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def iter_notification_chunks(region, selected_area, selected_condition, chunksize=EXPORT_CHUNK_SIZE):
+    """
+    Streams the filtered Notifications table from a server-side cursor in fixed-size chunks.
+
+    Parameters:
+    region (str): The region whose partition is exported.
+    selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
+    selected_condition (str): The condition to filter by. If "All Conditions", no condition filtering is applied.
+    chunksize (int): The number of rows fetched per chunk.
+
+    Yields:
+    pd.DataFrame: The next chunk of matching rows.
+    """
+    filter_sql, params = build_filter_clause(selected_area, selected_condition)
+    query = text(f'SELECT * FROM {region_table("data_table", region)} WHERE {filter_sql} ORDER BY "confirmationNo"')
+    # stream_results keeps the rows on the database side until each chunk is requested
+    with get_engine().connect().execution_options(stream_results=True, max_row_buffer=chunksize) as conn:
+        for chunk in pd.read_sql_query(query, con=conn, params=params, chunksize=chunksize):
+            yield chunk
+
+
+def generate_csv(chunks):
+    """
+    Encodes DataFrame chunks as one CSV document.
+
+    Parameters:
+    chunks (iterable): The DataFrame chunks to encode.
+
+    Yields:
+    str: The CSV text for each chunk, with the header on the first one.
+    """
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header)
+        header = False
+
+
+class _ChunkSink:
+    """
+    Write-only file object that collects what the Parquet writer produces until it is drained.
+    """
+
+    def __init__(self):
+        self.buffers = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffers.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.buffers)
+        self.buffers = []
+        return data
+
+
+def generate_parquet(chunks):
+    """
+    Encodes DataFrame chunks as one Parquet file, one row group per chunk.
+
+    Parameters:
+    chunks (iterable): The DataFrame chunks to encode.
+
+    Yields:
+    bytes: The Parquet bytes written for each row group, then the footer.
+    """
+    # pyarrow is only imported when someone actually exports Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # Columns that are empty in the first chunk have no type yet; text is the safe choice
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                    for field in schema
+                ])
+                writer = pq.ParquetWriter(sink, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+
+def export_url(export_format, region, selected_area, selected_condition):
+    """
+    Builds the download URL for the current selection.
+
+    Returns:
+    str: The relative export URL.
+    """
+    query = urlencode({'region': region or DEFAULT_REGION, 'area': selected_area or "All Areas", 'condition': selected_condition or "All Conditions"})
+    return f"/export/notifications.{export_format}?{query}"
+
+
+def register_export_routes(server):
+    """
+    Registers the Notifications download endpoint on the Flask server.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app.
+    """
+    @server.route('/export/notifications.<export_format>')
+    def export_notifications(export_format):
+        if export_format not in EXPORT_FORMATS:
+            abort(404)
+        region = request.args.get('region', DEFAULT_REGION)
+        selected_area = request.args.get('area', "All Areas")
+        selected_condition = request.args.get('condition', "All Conditions")
+        try:
+            region_table('data_table', region)
+            build_filter_clause(selected_area, selected_condition)
+        except ValueError:
+            abort(400)
+
+        chunks = iter_notification_chunks(region, selected_area, selected_condition)
+        body = generate_csv(chunks) if export_format == 'csv' else generate_parquet(chunks)
+        filename = re.sub(r'[^A-Za-z0-9_.]', '_', f"notifications_{region}_{selected_area}_{selected_condition}.{export_format}")
+        return Response(
+            stream_with_context(body),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+        )
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from flask import jsonify
+from sqlalchemy import text
+from database import get_engine, get_data_version
+from utils import fetch_region_options, fetch_areas
+from serving_cache import get_payload
+from nearby import get_nearby_index
+from config import DEFAULT_REGION
+
+# Roughly when the process started; uptime and warm-up time are measured from here
+_started_at = time.time()
+_warmup = {
+    'state': 'pending',
+    'steps': {},
+    'finished_at': None,
+    'error': None,
+}
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+# The selections a visitor sees on the landing page
+LANDING_PAYLOADS = [
+    ('chart', None),
+    ('map', 'Point Scatter Map'),
+    ('table', 'Notifications'),
+]
+
+
+def timed_step(name, func, *args):
+    """
+    Runs one warm-up step and records how long it took, in milliseconds.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    with _warmup_lock:
+        _warmup['steps'][name] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def run_warmup():
+    """
+    Does the database and plotting work the first visitor would otherwise wait for:
+    connects, reads the data version and regions, builds the landing page payloads and the proximity index.
+    """
+    with _warmup_lock:
+        _warmup['state'] = 'running'
+    try:
+        version = timed_step('data_version', get_data_version)
+        timed_step('regions', fetch_region_options)
+        timed_step('areas', fetch_areas, DEFAULT_REGION, version)
+        for kind, view in LANDING_PAYLOADS:
+            timed_step(f"{kind}_payload", get_payload, kind, DEFAULT_REGION, 'All Areas', 'All Conditions', view)
+        timed_step('nearby_index', get_nearby_index, DEFAULT_REGION)
+        state, error = 'ready', None
+    except Exception as e:
+        logging.error(f"Error warming up: {e}")
+        state, error = 'failed', str(e)
+
+    with _warmup_lock:
+        _warmup.update(state=state, error=error, finished_at=time.time())
+    logging.info(f"Warm-up {state} {time.time() - _started_at:.2f}s after import: {_warmup['steps']}")
+
+
+def start_warmup():
+    """
+    Starts the warm-up thread once per process, so gunicorn can answer while it runs.
+    """
+    global _warmup_thread
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=run_warmup, name='warmup', daemon=True)
+        _warmup_thread.start()
+
+
+def database_reachable():
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text('SELECT 1'))
+        return True
+    except Exception as e:
+        print(f"Error checking database: {e}")
+        return False
+
+
+def register_health_routes(server):
+    """
+    Registers the liveness and readiness endpoints.
+
+    /healthz answers as soon as the process is serving and never touches the database.
+    /ready answers 200 once warm-up has finished and the database is reachable, and 503 until then.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app.
+    """
+    @server.route('/healthz')
+    def healthz():
+        return jsonify({'status': 'ok', 'uptime_s': round(time.time() - _started_at, 2)})
+
+    @server.route('/ready')
+    def ready():
+        with _warmup_lock:
+            warmup = {**_warmup, 'steps': dict(_warmup['steps'])}
+        if warmup['finished_at'] is not None:
+            warmup['warmup_s'] = round(warmup['finished_at'] - _started_at, 2)
+        ready = warmup['state'] == 'ready' and database_reachable()
+        return jsonify({'ready': ready, 'warmup': warmup}), 200 if ready else 503
@@ -0,0 +1,159 @@
+import json
+import threading
+import numpy as np
+from flask import jsonify, request, abort
+from database import get_data_version, on_data_version_change
+from conditions import parse_condition_selection, selection_mask
+from serving_cache import fetch_table
+from config import REGIONS, DEFAULT_REGION, region_table, NEARBY_DEFAULT_RADIUS_M, NEARBY_MAX_RADIUS_M, NEARBY_MAX_RESULTS
+
+EARTH_RADIUS_M = 6371008.8
+NEARBY_COLUMNS = [
+    'confirmationNo', 'formattedAddress', 'startDate', 'endDate', 'owner', 'contractor',
+    'Forward_Sortation_Area', 'Latitude', 'Longitude'
+]
+
+_index_lock = threading.Lock()
+# Indexes are built per region and data version the first time the region is searched
+_nearby_indexes = {}
+
+
+def to_unit_vectors(lat, lon):
+    """
+    Converts latitude/longitude to points on the unit sphere.
+
+    Straight-line (chord) distance between these points grows with great-circle distance, so a
+    k-d tree over them answers haversine radius queries exactly, like a BallTree with the haversine metric.
+
+    Returns:
+    np.ndarray: An (n, 3) array of x, y, z coordinates.
+    """
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Computes great-circle distances in metres.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def build_nearby_index(region, version):
+    """
+    Builds the k-d tree over a region's notifications.
+
+    Parameters:
+    region (str): The region code.
+    version (str): The data version the rows belong to.
+
+    Returns:
+    tuple: The k-d tree and the notifications, in the same order as the tree's points.
+    """
+    # scipy is imported here, when the first index is built, to keep it off the startup path
+    from scipy.spatial import cKDTree
+
+    df = fetch_table(region_table('map_table', region), version)
+    df = df.dropna(subset=['Latitude', 'Longitude']).reset_index(drop=True)
+    tree = cKDTree(to_unit_vectors(df['Latitude'], df['Longitude']))
+    return tree, df
+
+
+def get_nearby_index(region):
+    version = get_data_version()
+    key = (region, version)
+    with _index_lock:
+        if key not in _nearby_indexes:
+            # Drop the region's index for older data before building the new one
+            for stale_key in [k for k in _nearby_indexes if k[0] == region]:
+                del _nearby_indexes[stale_key]
+            _nearby_indexes[key] = build_nearby_index(region, version)
+        return _nearby_indexes[key]
+
+
+def reset_nearby_indexes():
+    """
+    Drops the in-memory proximity indexes so they are rebuilt from fresh data on the next search.
+    """
+    with _index_lock:
+        _nearby_indexes.clear()
+
+
+on_data_version_change(reset_nearby_indexes)
+
+
+def find_nearby(lat, lon, radius_m=NEARBY_DEFAULT_RADIUS_M, region=DEFAULT_REGION, selected_condition="All Conditions", limit=NEARBY_MAX_RESULTS):
+    """
+    Finds the notifications within a distance of a point, nearest first.
+
+    Parameters:
+    lat (float): Latitude of the point.
+    lon (float): Longitude of the point.
+    radius_m (float): The search radius in metres.
+    region (str): The region to search.
+    selected_condition (str): Only return notifications matching this condition selection, unless "All Conditions".
+    limit (int): The maximum number of notifications to return.
+
+    Returns:
+    tuple: The nearest notifications with a distance_m column, and the number within the radius before the limit.
+
+    Raises:
+    ValueError: If the region or condition is unknown, or the point or radius is out of range.
+    """
+    if region not in REGIONS:
+        raise ValueError(f"Unknown region: {region}")
+    parse_condition_selection(selected_condition)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Latitude or longitude out of range")
+    if not 0 < radius_m <= NEARBY_MAX_RADIUS_M:
+        raise ValueError(f"Radius must be between 0 and {NEARBY_MAX_RADIUS_M} metres")
+
+    tree, df = get_nearby_index(region)
+    # The chord length on the unit sphere that corresponds to the radius along the surface
+    chord = 2 * np.sin(radius_m / (2 * EARTH_RADIUS_M))
+    candidates = np.asarray(tree.query_ball_point(to_unit_vectors([lat], [lon])[0], chord), dtype=int)
+
+    if selected_condition != "All Conditions" and len(candidates):
+        candidates = candidates[selection_mask(df.iloc[candidates], selected_condition)]
+
+    distances = haversine_m(lat, lon, df['Latitude'].to_numpy()[candidates], df['Longitude'].to_numpy()[candidates])
+    order = np.argsort(distances, kind='stable')[:limit]
+    results = df.iloc[candidates[order]][NEARBY_COLUMNS].copy()
+    results['distance_m'] = distances[order].round(1)
+    return results.reset_index(drop=True), len(candidates)
+
+
+def register_nearby_routes(server):
+    """
+    Registers the JSON proximity search endpoint on the Flask server.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app.
+    """
+    @server.route('/nearby')
+    def nearby():
+        try:
+            lat = float(request.args['lat'])
+            lon = float(request.args['lon'])
+            radius_m = float(request.args.get('radius', NEARBY_DEFAULT_RADIUS_M))
+            limit = min(max(int(request.args.get('limit', NEARBY_MAX_RESULTS)), 1), NEARBY_MAX_RESULTS)
+            results, total = find_nearby(
+                lat,
+                lon,
+                radius_m,
+                request.args.get('region', DEFAULT_REGION),
+                request.args.get('condition', "All Conditions"),
+                limit,
+            )
+        except (KeyError, ValueError):
+            abort(400)
+        return jsonify({
+            'lat': lat,
+            'lon': lon,
+            'radius_m': radius_m,
+            'total': int(total),
+            'results': json.loads(results.to_json(orient='records', date_format='iso')),
+        })
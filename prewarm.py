@@ -0,0 +1,236 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import get_context
+from flask import jsonify, request
+from database import get_engine, get_data_version
+from utils import fetch_region_options, fetch_areas, fetch_boundary_sets
+from serving_cache import build_and_store, payload_key, is_cached, cache_stats, add_live_requests, live_request_count
+from config import CONDITION_DROPDOWN_OPTIONS, PREWARM_WORKERS, PREWARM_START_DELAY, PREWARM_POLL_SECONDS, SERVING_CACHE_PATH
+
+MAP_TYPES = ["Point Scatter Map", "Density Heatmap", "Choropleth Tile Map"]
+TABLE_TYPES = ["Notifications", "Totals", "Percentages", "Co-occurrence"]
+
+_status = {
+    'state': 'idle',
+    'version': None,
+    'total': 0,
+    'done': 0,
+    'skipped': 0,
+    'failed': 0,
+    'started_at': None,
+    'finished_at': None,
+}
+_status_lock = threading.Lock()
+_prewarm_thread = None
+
+
+def update_status(**changes):
+    with _status_lock:
+        _status.update(changes)
+
+
+def increment_status(field):
+    with _status_lock:
+        _status[field] += 1
+
+
+def get_status():
+    with _status_lock:
+        status = dict(_status)
+    return {**status, 'live_requests': live_request_count(), 'cache': cache_stats()}
+
+
+def enumerate_combinations(version):
+    """
+    Lists every selection the dashboard can ask for, once per distinct payload.
+
+    Parameters:
+    version (str): The data version the payloads will be built from.
+
+    Returns:
+    list: Tuples of (kind, region, area, condition, view, boundary set).
+    """
+    conditions = [option['value'] for option in CONDITION_DROPDOWN_OPTIONS]
+    combinations = []
+    seen = set()
+    for region in [option['value'] for option in fetch_region_options()]:
+        areas = ["All Areas"] + list(fetch_areas(region, version))
+        boundary_sets = fetch_boundary_sets(region, version)
+        for selected_area in areas:
+            for selected_condition in conditions:
+                candidates = [('chart', None)] + [('map', view) for view in MAP_TYPES] + [('table', view) for view in TABLE_TYPES]
+                for kind, view in candidates:
+                    for boundary_set in boundary_sets:
+                        key = payload_key(kind, region, selected_area, selected_condition, view, boundary_set, version)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        combinations.append((kind, region, selected_area, selected_condition, view, boundary_set))
+    return combinations
+
+
+def init_worker():
+    """
+    Runs in each pool process: lowers its priority below the web workers and drops
+    database connections inherited from the parent.
+    """
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+    get_engine().dispose(close=False)
+
+
+def wait_for_idle(poll_interval=0.05, max_wait=5.0):
+    """
+    Holds back the next pre-warm task while live callbacks are running, so pre-warming yields to users.
+    Waits at most max_wait seconds so a steady trickle of traffic cannot stall pre-warming forever.
+
+    Only the worker holding the pre-warm lock runs this, but it sees callbacks on every gunicorn
+    worker, as each one records its count in the shared serving cache database.
+    """
+    waited = 0.0
+    while live_request_count() > 0 and waited < max_wait:
+        time.sleep(poll_interval)
+        waited += poll_interval
+
+
+def run_prewarm(version):
+    """
+    Builds every payload missing from the serving cache for a data version on a process pool.
+
+    Parameters:
+    version (str): The data version to pre-warm.
+
+    Returns:
+    None
+    """
+    combinations = enumerate_combinations(version)
+    update_status(state='running', version=version, total=len(combinations), done=0, skipped=0, failed=0,
+                  started_at=time.time(), finished_at=None)
+    logging.info(f"Pre-warming {len(combinations)} payloads for data version {version}.")
+
+    pending = {}
+    with ProcessPoolExecutor(max_workers=PREWARM_WORKERS, mp_context=get_context('spawn'), initializer=init_worker) as pool:
+        for combination in combinations:
+            key = payload_key(*combination, version)
+            if is_cached(key):
+                increment_status('skipped')
+                continue
+            if get_data_version() != version:
+                logging.info("Data changed during pre-warm; restarting with the new version.")
+                break
+
+            wait_for_idle()
+            # Keep one task per worker in flight so live traffic is never queued behind a backlog
+            while len(pending) >= PREWARM_WORKERS:
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect_results(completed, pending)
+            pending[pool.submit(build_and_store, *combination, version)] = key
+
+        completed, _ = wait(pending)
+        collect_results(completed, pending)
+
+    update_status(state='idle', finished_at=time.time())
+    status = get_status()
+    logging.info(f"Pre-warm of {version} finished: {status['done']} built, {status['skipped']} already cached, {status['failed']} failed.")
+
+
+def collect_results(completed, pending):
+    """
+    Records finished pre-warm builds. The pool processes have already written them to the serving cache.
+    """
+    for future in completed:
+        key = pending.pop(future)
+        try:
+            future.result()
+            increment_status('done')
+        except Exception as e:
+            logging.error(f"Error pre-warming {key}: {e}")
+            increment_status('failed')
+        status = get_status()
+        progress = status['done'] + status['failed']
+        if progress % 100 == 0:
+            logging.info(f"Pre-warm progress: {progress + status['skipped']}/{status['total']}")
+
+
+def acquire_prewarm_lock():
+    """
+    Takes the machine-wide pre-warm lock without blocking. The serving cache is shared,
+    so one worker pre-warming is enough.
+
+    Returns:
+    file: The open lock file while it is held, or None if another worker holds it.
+    """
+    lock_path = f"{SERVING_CACHE_PATH}.prewarm.lock"
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    lock_file = open(lock_path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        lock_file.close()
+        return None
+
+
+def prewarm_loop():
+    """
+    Pre-warms after boot, then again whenever setup_database publishes a new data version.
+    """
+    time.sleep(PREWARM_START_DELAY)
+    warmed_version = None
+    while True:
+        version = get_data_version()
+        if version != warmed_version:
+            lock_file = acquire_prewarm_lock()
+            if lock_file is None:
+                update_status(state='waiting')
+            else:
+                try:
+                    run_prewarm(version)
+                    warmed_version = version
+                except Exception as e:
+                    logging.error(f"Error pre-warming cache: {e}")
+                    update_status(state='failed', finished_at=time.time())
+                finally:
+                    lock_file.close()
+        time.sleep(PREWARM_POLL_SECONDS)
+
+
+def start_prewarm():
+    """
+    Starts the background pre-warm thread once per process.
+    """
+    global _prewarm_thread
+    if _prewarm_thread is None:
+        _prewarm_thread = threading.Thread(target=prewarm_loop, name='prewarm', daemon=True)
+        _prewarm_thread.start()
+
+
+def register_prewarm_routes(server):
+    """
+    Tracks live callback requests for wait_for_idle and registers the pre-warm status endpoint.
+    Counts are kept per worker in the serving cache database, so the status endpoint and the
+    pre-warming worker see traffic on all workers, whichever worker they run in.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app.
+    """
+    @server.before_request
+    def count_live_request():
+        if request.path.endswith('/_dash-update-component'):
+            add_live_requests(1)
+            request.environ['prewarm.live'] = True
+
+    @server.teardown_request
+    def release_live_request(exc):
+        if request.environ.pop('prewarm.live', False):
+            add_live_requests(-1)
+
+    @server.route('/prewarm/status')
+    def prewarm_status():
+        return jsonify(get_status())
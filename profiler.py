@@ -0,0 +1,260 @@
+import cProfile
+import functools
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import jsonify, request, abort, send_from_directory
+from config import ADMIN_TOKEN, PROFILE_DIR, PROFILE_SLOW_MS, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_MAX_CAPTURES
+
+PROFILE_COOKIE = 'profile'
+CAPTURE_SUFFIXES = ('.pstats', '.folded')
+
+# Only one deterministic profile runs at a time; concurrent requests fall back to sampling
+_cprofile_lock = threading.Lock()
+_sampler_lock = threading.Lock()
+# Collapsed stack counts per thread id, for the requests currently being sampled
+_sampled_threads = {}
+_sampler_thread = None
+
+
+def token_matches(value):
+    return bool(ADMIN_TOKEN) and value is not None and hmac.compare_digest(str(value), ADMIN_TOKEN)
+
+
+def requested_profile():
+    """
+    Checks whether the current request asked to be profiled, through the X-Profile header,
+    the profile query parameter or the profile cookie. The value must be the admin token,
+    so visitors cannot make the server profile their requests.
+    """
+    value = request.headers.get('X-Profile') or request.args.get('profile') or request.cookies.get(PROFILE_COOKIE)
+    return token_matches(value)
+
+
+def selection_parameters():
+    """
+    Reads the callback's outputs and the values of its inputs and state from the Dash request body.
+
+    Returns:
+    dict: The output, and the value of each input and state keyed by "id.property".
+    """
+    body = request.get_json(silent=True) or {}
+    selection = {}
+    for item in body.get('inputs', []) + body.get('state', []):
+        if not isinstance(item, dict) or 'id' not in item:
+            continue
+        value = item.get('value')
+        # Figures and stores are not selections, and would bloat the metadata
+        if not isinstance(value, (str, int, float, bool, type(None))):
+            value = f"<{type(value).__name__}>"
+        selection[f"{item['id']}.{item.get('property')}"] = value
+    return {'output': body.get('output'), 'selection': selection}
+
+
+def collapse_stack(frame):
+    """
+    Formats a stack as one line of the collapsed format flamegraph.pl and speedscope read, outermost frame first.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def sample_stacks():
+    """
+    Samples the stacks of every thread being profiled until none are left.
+    """
+    global _sampler_thread
+    interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+    while True:
+        with _sampler_lock:
+            if not _sampled_threads:
+                _sampler_thread = None
+                return
+            frames = sys._current_frames()
+            for thread_id, counts in _sampled_threads.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    counts[collapse_stack(frame)] += 1
+        time.sleep(interval)
+
+
+def start_sampling():
+    global _sampler_thread
+    thread_id = threading.get_ident()
+    with _sampler_lock:
+        _sampled_threads[thread_id] = Counter()
+        if _sampler_thread is None:
+            _sampler_thread = threading.Thread(target=sample_stacks, name='profile-sampler', daemon=True)
+            _sampler_thread.start()
+    return thread_id
+
+
+def stop_sampling(thread_id):
+    with _sampler_lock:
+        return _sampled_threads.pop(thread_id, Counter())
+
+
+def save_capture(kind, write, duration_ms, trigger, selection):
+    """
+    Writes a capture and its metadata to PROFILE_DIR and prunes the oldest captures over PROFILE_MAX_CAPTURES.
+
+    Parameters:
+    kind (str): The file suffix, ".pstats" or ".folded".
+    write (callable): Writes the capture to the path it is given.
+    duration_ms (float): How long the callback took.
+    trigger (str): What asked for the capture, "request" or "slow".
+    selection (dict): The output and selection parameters of the callback.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    capture_id = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+    write(os.path.join(PROFILE_DIR, capture_id + kind))
+    metadata = {
+        'id': capture_id,
+        'file': capture_id + kind,
+        'captured_at': time.time(),
+        'duration_ms': round(duration_ms, 1),
+        'trigger': trigger,
+        'pid': os.getpid(),
+        **selection,
+    }
+    with open(os.path.join(PROFILE_DIR, capture_id + '.json'), 'w') as f:
+        json.dump(metadata, f)
+    prune_captures()
+
+
+def list_captures():
+    """
+    Reads the metadata of the stored captures, newest first.
+
+    Returns:
+    list: The metadata dicts.
+    """
+    captures = []
+    if not os.path.isdir(PROFILE_DIR):
+        return captures
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(captures, key=lambda capture: capture['captured_at'], reverse=True)
+
+
+def prune_captures():
+    for capture in list_captures()[PROFILE_MAX_CAPTURES:]:
+        for suffix in ('.json',) + CAPTURE_SUFFIXES:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, capture['id'] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def write_folded(counts):
+    def write(path):
+        with open(path, 'w') as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+    return write
+
+
+def profile_callback(dispatch):
+    """
+    Wraps the Dash callback dispatch view with the opt-in profiler.
+
+    A request that asks for a profile gets a deterministic cProfile capture, saved as a .pstats file.
+    With PROFILE_SLOW_MS set, every other callback is sampled and the collapsed stacks are saved as a
+    .folded file when it takes longer than the threshold.
+
+    Parameters:
+    dispatch (callable): The view function behind /_dash-update-component.
+
+    Returns:
+    callable: The wrapped view function.
+    """
+    @functools.wraps(dispatch)
+    def profiled_dispatch(*args, **kwargs):
+        profile_requested = requested_profile()
+        if profile_requested and _cprofile_lock.acquire(blocking=False):
+            try:
+                profile = cProfile.Profile()
+                start = time.perf_counter()
+                response = profile.runcall(dispatch, *args, **kwargs)
+                duration_ms = (time.perf_counter() - start) * 1000
+                save_capture('.pstats', profile.dump_stats, duration_ms, 'request', selection_parameters())
+                return response
+            finally:
+                _cprofile_lock.release()
+
+        if PROFILE_SLOW_MS <= 0 and not profile_requested:
+            return dispatch(*args, **kwargs)
+
+        thread_id = start_sampling()
+        start = time.perf_counter()
+        try:
+            return dispatch(*args, **kwargs)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            counts = stop_sampling(thread_id)
+            trigger = 'request' if profile_requested else 'slow'
+            if counts and (trigger == 'request' or duration_ms >= PROFILE_SLOW_MS):
+                try:
+                    save_capture('.folded', write_folded(counts), duration_ms, trigger, selection_parameters())
+                except OSError as e:
+                    print(f"Error saving profile: {e}")
+
+    return profiled_dispatch
+
+
+def require_admin():
+    # Without an admin token the routes do not exist
+    if not ADMIN_TOKEN:
+        abort(404)
+    if not token_matches(request.headers.get('X-Admin-Token') or request.args.get('token')):
+        abort(403)
+
+
+def register_profiler_routes(server):
+    """
+    Wraps the Dash callback dispatch with the profiler and registers the admin routes that list
+    and download captures. Requesting any page with ?profile=<admin token> sets the profile cookie,
+    so every callback the browser makes afterwards is profiled; ?profile=off clears it.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app, after the Dash routes are registered.
+    """
+    for rule in server.url_map.iter_rules():
+        if rule.rule.endswith('/_dash-update-component'):
+            server.view_functions[rule.endpoint] = profile_callback(server.view_functions[rule.endpoint])
+
+    @server.after_request
+    def set_profile_cookie(response):
+        value = request.args.get('profile')
+        if value == 'off':
+            response.delete_cookie(PROFILE_COOKIE)
+        elif token_matches(value):
+            response.set_cookie(PROFILE_COOKIE, value, httponly=True, samesite='Strict')
+        return response
+
+    @server.route('/admin/profiles')
+    def profile_captures():
+        require_admin()
+        return jsonify({'captures': list_captures()})
+
+    @server.route('/admin/profiles/<capture_file>')
+    def profile_capture_file(capture_file):
+        require_admin()
+        if not capture_file.endswith(CAPTURE_SUFFIXES):
+            abort(404)
+        return send_from_directory(os.path.abspath(PROFILE_DIR), capture_file, as_attachment=True)
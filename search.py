@@ -0,0 +1,179 @@
+import re
+import json
+import numpy as np
+import pandas as pd
+from flask import jsonify, request, abort
+from sqlalchemy import text
+from database import get_engine, build_filter_clause
+from config import SEARCH_PAGE_SIZE, SEARCH_MIN_TOKEN_LENGTH, DEFAULT_REGION, region_table
+
+# Columns covered by the index and how much a match in each one counts towards the score
+SEARCH_FIELDS = {
+    'contractor': 3.0,
+    'owner': 2.0,
+    'formattedAddress': 2.0,
+    'supportDescription': 1.0,
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(value):
+    """
+    Splits a text value into lowercase alphanumeric tokens.
+
+    Parameters:
+    value (str): The text to tokenize. Missing values produce no tokens.
+
+    Returns:
+    list: The tokens, in order of appearance.
+    """
+    if not isinstance(value, str):
+        return []
+    return [token for token in TOKEN_PATTERN.findall(value.lower()) if len(token) >= SEARCH_MIN_TOKEN_LENGTH]
+
+
+def build_search_index(df, k1=1.2, b=0.75):
+    """
+    Builds the inverted index over the searchable Notification columns.
+
+    Every (token, notification) pair gets a BM25 score summed over the indexed fields,
+    each weighted by SEARCH_FIELDS, so a query only has to add up precomputed scores.
+
+    Parameters:
+    df (pd.DataFrame): The notifications, with a confirmationNo column and the SEARCH_FIELDS columns.
+    k1 (float): BM25 term frequency saturation.
+    b (float): BM25 length normalisation.
+
+    Returns:
+    pd.DataFrame: The postings with token, confirmationNo and score columns.
+    """
+    n_docs = len(df)
+    postings = []
+    for field, weight in SEARCH_FIELDS.items():
+        tokens = df[field].map(tokenize)
+        lengths = tokens.map(len)
+        avg_length = max(lengths.mean(), 1.0)
+        exploded = pd.DataFrame({
+            'confirmationNo': df['confirmationNo'],
+            'length': lengths,
+            'token': tokens,
+        }).explode('token').dropna(subset=['token'])
+        if exploded.empty:
+            continue
+
+        tf = exploded.groupby(['token', 'confirmationNo', 'length']).size().rename('tf').reset_index()
+        df_count = tf.groupby('token')['confirmationNo'].transform('nunique')
+        idf = np.log((n_docs - df_count + 0.5) / (df_count + 0.5) + 1)
+        norm = tf['tf'] + k1 * (1 - b + b * tf['length'] / avg_length)
+        tf['score'] = weight * idf * tf['tf'] * (k1 + 1) / norm
+        postings.append(tf[['token', 'confirmationNo', 'score']])
+
+    if not postings:
+        return pd.DataFrame(columns=['token', 'confirmationNo', 'score'])
+    index = pd.concat(postings).groupby(['token', 'confirmationNo'], as_index=False)['score'].sum()
+    index['score'] = index['score'].round(6)
+    return index
+
+
+def search_notifications(query, region=DEFAULT_REGION, selected_area="All Areas", selected_condition="All Conditions", page=0, page_size=SEARCH_PAGE_SIZE):
+    """
+    Finds notifications matching every term in the query, ranked by score.
+
+    The last term is matched as a prefix so results update while a word is still being typed.
+
+    Parameters:
+    query (str): The search text.
+    region (str): The region whose partition is searched.
+    selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
+    selected_condition (str): The condition to filter by. If "All Conditions", no condition filtering is applied.
+    page (int): The zero-based results page.
+    page_size (int): The number of results per page.
+
+    Returns:
+    tuple: The matching rows from data_table as a DataFrame (best match first) and the total number of matches.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return pd.DataFrame(), 0
+
+    # Each term is checked on its own, so one token can satisfy both an exact term and the prefix term
+    params = {}
+    term_matches = []
+    for i, term in enumerate(terms):
+        if i == len(terms) - 1:
+            params[f"term_{i}"] = f"{term}%"
+            term_matches.append(f"s.token LIKE :term_{i}")
+        else:
+            params[f"term_{i}"] = term
+            term_matches.append(f"s.token = :term_{i}")
+    any_term = ' OR '.join(term_matches)
+    every_term = ' AND '.join(f"MAX(CASE WHEN {match} THEN 1 ELSE 0 END) = 1" for match in term_matches)
+
+    search_table = region_table('search_index', region)
+    data_table = region_table('data_table', region)
+    filter_sql, filter_params = build_filter_clause(selected_area, selected_condition, alias='d')
+    params.update(filter_params)
+    params.update({'limit': page_size, 'offset': page * page_size})
+
+    matches_sql = f"""
+        SELECT s."confirmationNo" AS "confirmationNo", SUM(s.score) AS score
+        FROM {search_table} s
+        JOIN {data_table} d ON d."confirmationNo" = s."confirmationNo"
+        WHERE ({any_term}) AND {filter_sql}
+        GROUP BY s."confirmationNo"
+        HAVING {every_term}
+    """
+    try:
+        with get_engine().connect() as conn:
+            total = conn.execute(text(f"SELECT COUNT(*) FROM ({matches_sql}) m"), params).scalar()
+            ranked = pd.read_sql_query(
+                text(f"""
+                    SELECT d.*, m.score AS "searchScore"
+                    FROM ({matches_sql}) m
+                    JOIN {data_table} d ON d."confirmationNo" = m."confirmationNo"
+                    ORDER BY m.score DESC, d."confirmationNo"
+                    LIMIT :limit OFFSET :offset
+                """),
+                con=conn,
+                params=params,
+            )
+        return ranked, total
+    except Exception as e:
+        print(f"Error searching notifications: {e}")
+        return pd.DataFrame(), 0
+
+
+def register_search_routes(server):
+    """
+    Registers the JSON search endpoint on the Flask server.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app.
+    """
+    @server.route('/search')
+    def search():
+        query = request.args.get('q', '')
+        try:
+            page = max(int(request.args.get('page', 0)), 0)
+            page_size = min(max(int(request.args.get('page_size', SEARCH_PAGE_SIZE)), 1), SEARCH_PAGE_SIZE)
+        except ValueError:
+            abort(400)
+        try:
+            results, total = search_notifications(
+                query,
+                request.args.get('region', DEFAULT_REGION),
+                request.args.get('area', "All Areas"),
+                request.args.get('condition', "All Conditions"),
+                page,
+                page_size,
+            )
+        except ValueError:
+            abort(400)
+        return jsonify({
+            'query': query,
+            'page': page,
+            'page_size': page_size,
+            'total': int(total),
+            'results': json.loads(results.to_json(orient='records', date_format='iso')),
+        })
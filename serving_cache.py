@@ -0,0 +1,524 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import Future
+from functools import lru_cache
+import numpy as np
+from database import get_data_version, on_data_version_change
+from utils import fetch_data, create_chart, create_map, create_table, create_cooccurrence_table, absolutize_tile_urls, boundary_aggregates
+from utils import viewport_markers, pack_figure_arrays
+from conditions import build_condition_index, selection_bitmap
+from config import region_table, SERVING_CACHE_MAX_BYTES, SERVING_CACHE_PATH, DEFAULT_BOUNDARY_SET
+
+PAYLOAD_KINDS = ('chart', 'map', 'table')
+
+# One SQLite connection per thread; the database file itself is shared by every worker process
+_local = threading.local()
+# Payloads being built in this process, keyed by payload key, so identical requests share one build
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_flight_counts = Counter()
+# The pid whose stale live_requests row this process has already cleared
+_live_pid = None
+_live_lock = threading.Lock()
+
+
+@lru_cache(maxsize=32)
+def fetch_table(table_name, version):
+    """
+    Fetches a table once per data version, so building many payloads does not re-read the same rows.
+
+    Parameters:
+    table_name (str): The name of the table to fetch data from.
+    version (str): The data version the rows belong to.
+
+    Returns:
+    pd.DataFrame: The table. Callers must not modify it.
+    """
+    return fetch_data(table_name)
+
+
+@lru_cache(maxsize=32)
+def fetch_condition_index(region, version):
+    """
+    Builds the per-condition bitmaps over a region's map_table rows once per data version.
+
+    Returns:
+    dict: The index from conditions.build_condition_index.
+    """
+    return build_condition_index(fetch_table(region_table('map_table', region), version))
+
+
+def payload_key(kind, region, selected_area, selected_condition, view, boundary_set, version):
+    """
+    Builds the cache key for a payload, leaving out the selections the payload does not depend on.
+
+    Parameters:
+    kind (str): "chart", "map" or "table".
+    region (str): The region code.
+    selected_area (str): The selected area.
+    selected_condition (str): The selected condition.
+    view (str): The map type or table type. Ignored for charts.
+    boundary_set (str): The boundary set. Only charts and choropleth maps depend on it.
+    version (str): The data version.
+
+    Returns:
+    tuple: The cache key.
+    """
+    if kind == 'chart':
+        view = None
+    if kind == 'table' or (kind == 'map' and view != "Choropleth Tile Map"):
+        boundary_set = None
+    if kind == 'table' and view in ("Totals", "Percentages"):
+        # The summary tables list every FSA and are not filtered by area or condition
+        selected_area, selected_condition = None, None
+    return (kind, region, selected_area, selected_condition, view, boundary_set, version)
+
+
+def summary_table(region, selected_area, selected_condition, boundary_set, version):
+    """
+    Aggregates the region's notifications to a boundary set from their precomputed boundary codes.
+    Data loaded before boundary codes existed falls back to the FSA-summarized table.
+
+    Returns:
+    pd.DataFrame: The aggregates, in the layout of aggregated_fsa_table.
+    """
+    units = fetch_table(region_table('boundary_units', region), version)
+    if units.empty and boundary_set == DEFAULT_BOUNDARY_SET:
+        return fetch_table(region_table('aggregated_fsa_table', region), version)
+    if boundary_set not in set(units.get('boundary_set', [])):
+        raise ValueError(f"No {boundary_set} boundaries loaded for {region}")
+    return boundary_aggregates(fetch_table(region_table('map_table', region), version), units, boundary_set, selected_area, selected_condition)
+
+
+def build_payload(kind, region, selected_area, selected_condition, view, boundary_set, version):
+    """
+    Builds the serialized chart, map or table for a selection.
+
+    Parameters:
+    kind (str): "chart", "map" or "table".
+    region (str): The region code.
+    selected_area (str): The area to filter by.
+    selected_condition (str): The condition to filter by.
+    view (str): The map type for maps, the table type for tables.
+    boundary_set (str): The boundary set charts and choropleth maps aggregate to.
+    version (str): The data version to build from.
+
+    Returns:
+    str: The payload as JSON.
+    """
+    import plotly.io as pio
+
+    if kind == 'chart':
+        df_summary = summary_table(region, selected_area, selected_condition, boundary_set, version)
+        return pio.to_json(create_chart(df_summary, selected_area, selected_condition, boundary_set))
+    if kind == 'map':
+        df_map = fetch_table(region_table('map_table', region), version)
+        if view == "Choropleth Tile Map":
+            df_summary = summary_table(region, selected_area, selected_condition, boundary_set, version)
+        else:
+            df_summary = fetch_table(region_table('aggregated_fsa_table', region), version)
+        figure = json.loads(pio.to_json(create_map(df_map, df_summary, view, selected_area, selected_condition, region, boundary_set)))
+        return json.dumps(pack_figure_arrays(figure))
+    if kind == 'table' and view == "Co-occurrence":
+        records = create_cooccurrence_table(fetch_condition_index(region, version), selected_area, selected_condition)
+        return json.dumps(records, default=str)
+    if kind == 'table':
+        df_summary = fetch_table(region_table('aggregated_fsa_table', region), version)
+        df_table = fetch_table(region_table('data_table', region), version)
+        return json.dumps(create_table(df_table, df_summary, view, selected_area, selected_condition), default=str)
+    raise ValueError(f"Unknown payload kind: {kind}")
+
+
+def get_connection():
+    """
+    Opens this thread's connection to the cache database, creating the schema on first use.
+
+    WAL mode lets every gunicorn worker read while one of them writes, and the file outlives restarts.
+
+    Returns:
+    sqlite3.Connection: The connection.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(SERVING_CACHE_PATH) or '.', exist_ok=True)
+        conn = sqlite3.connect(SERVING_CACHE_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS payloads (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS payloads_last_access_idx ON payloads (last_access)')
+        # Running total of the payload sizes, kept in step with every write so eviction never sums the table
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute("INSERT OR IGNORE INTO cache_meta (name, value) SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM payloads")
+        # Callbacks running in each worker process, so pre-warming can yield to traffic on any worker
+        conn.execute('CREATE TABLE IF NOT EXISTS live_requests (pid INTEGER PRIMARY KEY, value INTEGER NOT NULL)')
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Runs the enclosed statements as one write transaction, so a payload change and the size total
+    it implies are committed together.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def total_bytes(conn):
+    return conn.execute("SELECT value FROM cache_meta WHERE name = 'total_bytes'").fetchone()[0]
+
+
+def add_to_total(conn, delta):
+    conn.execute("UPDATE cache_meta SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+
+
+def add_live_requests(delta):
+    """
+    Adjusts this worker's count of callbacks in progress.
+
+    Each worker keeps its own row, so a worker that dies mid-request leaves a row that
+    live_request_count ignores, rather than a shared total that never drops back to zero.
+    """
+    global _live_pid
+    try:
+        conn = get_connection()
+        pid = os.getpid()
+        with _live_lock:
+            if _live_pid != pid:
+                # A row left behind by an earlier process with the same pid is stale
+                conn.execute('DELETE FROM live_requests WHERE pid = ?', (pid,))
+                _live_pid = pid
+        conn.execute(
+            'INSERT INTO live_requests (pid, value) VALUES (?, ?) ON CONFLICT (pid) DO UPDATE SET value = value + excluded.value',
+            (pid, delta),
+        )
+    except sqlite3.Error as e:
+        print(f"Error updating live request count: {e}")
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def live_request_count():
+    """
+    Counts the callbacks in progress across every worker process sharing the serving cache.
+
+    Returns:
+    int: The number of live callbacks, or 0 if the cache database cannot be read.
+    """
+    try:
+        rows = get_connection().execute('SELECT pid, value FROM live_requests WHERE value > 0').fetchall()
+    except sqlite3.Error:
+        return 0
+    return sum(value for pid, value in rows if process_alive(pid))
+
+
+def encode_key(key):
+    return json.dumps(list(key))
+
+
+def get_cached(key):
+    """
+    Looks up a payload and marks it as recently used.
+
+    Returns:
+    str: The payload, or None on a miss.
+    """
+    try:
+        conn = get_connection()
+        row = conn.execute('SELECT payload, last_access FROM payloads WHERE key = ?', (encode_key(key),)).fetchone()
+        if row is None:
+            return None
+        payload, last_access = row
+        now = time.time()
+        # Only refresh the access time once a minute so hot reads do not turn into writes
+        if now - last_access > 60:
+            conn.execute('UPDATE payloads SET last_access = ? WHERE key = ?', (now, encode_key(key)))
+        return zlib.decompress(payload).decode('utf-8')
+    except sqlite3.Error as e:
+        print(f"Error reading serving cache: {e}")
+        return None
+
+
+def set_cached(key, payload):
+    """
+    Stores a payload, evicting the least recently used ones to stay within SERVING_CACHE_MAX_BYTES.
+    """
+    compressed = zlib.compress(payload.encode('utf-8'), 6)
+    try:
+        conn = get_connection()
+        with transaction(conn):
+            replaced = conn.execute('SELECT size FROM payloads WHERE key = ?', (encode_key(key),)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO payloads (key, version, payload, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                (encode_key(key), key[-1], compressed, len(compressed), time.time()),
+            )
+            add_to_total(conn, len(compressed) - (replaced[0] if replaced else 0))
+        if total_bytes(conn) > SERVING_CACHE_MAX_BYTES:
+            evict(conn)
+    except sqlite3.Error as e:
+        print(f"Error writing serving cache: {e}")
+
+
+def evict(conn, batch_size=50):
+    """
+    Deletes the least recently used payloads until the cache is back under 90% of its budget.
+    """
+    target = SERVING_CACHE_MAX_BYTES * 0.9
+    while True:
+        with transaction(conn):
+            # Re-read inside the transaction, as another worker may have evicted in the meantime
+            if total_bytes(conn) <= target:
+                return
+            rows = conn.execute('SELECT key, size FROM payloads ORDER BY last_access LIMIT ?', (batch_size,)).fetchall()
+            if not rows:
+                return
+            conn.executemany('DELETE FROM payloads WHERE key = ?', [(row[0],) for row in rows])
+            add_to_total(conn, -sum(row[1] for row in rows))
+
+
+def is_cached(key):
+    try:
+        row = get_connection().execute('SELECT 1 FROM payloads WHERE key = ?', (encode_key(key),)).fetchone()
+        return row is not None
+    except sqlite3.Error:
+        return False
+
+
+def cache_stats():
+    """
+    Reports the size of the serving cache.
+
+    Returns:
+    dict: The number of entries and compressed bytes held.
+    """
+    try:
+        conn = get_connection()
+        entries, size = conn.execute('SELECT COUNT(*) FROM payloads').fetchone()[0], total_bytes(conn)
+    except sqlite3.Error:
+        entries, size = None, None
+    return {
+        'entries': entries,
+        'bytes': size,
+        'max_bytes': SERVING_CACHE_MAX_BYTES,
+        'path': SERVING_CACHE_PATH,
+        'single_flight': flight_stats(),
+    }
+
+
+def flight_stats():
+    """
+    Reports how this process's cache misses were served.
+
+    Returns:
+    dict: The payloads built, the requests that waited on a build already running in this process
+    or in another worker, the builds that failed, and the builds in flight right now.
+    """
+    with _in_flight_lock:
+        return {
+            'built': _flight_counts['built'],
+            'coalesced': _flight_counts['coalesced'],
+            'coalesced_across_workers': _flight_counts['coalesced_across_workers'],
+            'failed': _flight_counts['failed'],
+            'in_flight': len(_in_flight),
+        }
+
+
+def count_flight(field):
+    with _in_flight_lock:
+        _flight_counts[field] += 1
+
+
+def lock_path(key):
+    """
+    Names the lock file for a payload key. Lock files live in one directory per data version,
+    so purging a version removes its locks with it.
+    """
+    digest = hashlib.sha1(encode_key(key).encode('utf-8')).hexdigest()
+    return os.path.join(f"{SERVING_CACHE_PATH}.locks", str(key[-1]), f"{digest}.lock")
+
+
+def build_exclusively(key, build):
+    """
+    Builds a payload while holding its machine-wide lock, unless another worker stored it while we waited.
+
+    Parameters:
+    key (tuple): The payload key.
+    build (callable): Builds the payload.
+
+    Returns:
+    str: The payload.
+    """
+    path = lock_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock_file = open(path, 'w')
+    except OSError as e:
+        # Without the lock workers may build the same payload twice, which is wasteful but correct
+        print(f"Error opening serving cache lock: {e}")
+        payload = build()
+        set_cached(key, payload)
+        count_flight('built')
+        return payload
+    with lock_file:
+        # The lock is released when the file closes, including when a worker dies mid-build
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        payload = get_cached(key)
+        if payload is not None:
+            count_flight('coalesced_across_workers')
+            return payload
+        payload = build()
+        set_cached(key, payload)
+        count_flight('built')
+        return payload
+
+
+def single_flight(key, build):
+    """
+    Runs at most one build per payload key at a time. Threads asking for a key that is already being
+    built in this process wait for that build and share its result, and workers asking for a key another
+    worker is building wait on its lock and then read the payload from the shared cache.
+
+    Parameters:
+    key (tuple): The payload key.
+    build (callable): Builds the payload.
+
+    Returns:
+    str: The payload.
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+        else:
+            _flight_counts['coalesced'] += 1
+    if not leader:
+        return future.result()
+
+    try:
+        payload = build_exclusively(key, build)
+        future.set_result(payload)
+        return payload
+    except Exception as e:
+        count_flight('failed')
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+@on_data_version_change
+def purge_stale_payloads():
+    """
+    Deletes payloads built from older data versions and drops the tables read for them.
+    """
+    fetch_table.cache_clear()
+    fetch_condition_index.cache_clear()
+    version = get_data_version()
+    try:
+        conn = get_connection()
+        with transaction(conn):
+            conn.execute('DELETE FROM payloads WHERE version != ?', (version,))
+            # Purges are rare, so the total is simply recounted
+            conn.execute("UPDATE cache_meta SET value = (SELECT COALESCE(SUM(size), 0) FROM payloads) WHERE name = 'total_bytes'")
+    except sqlite3.Error as e:
+        print(f"Error purging serving cache: {e}")
+    lock_root = f"{SERVING_CACHE_PATH}.locks"
+    if os.path.isdir(lock_root):
+        for name in os.listdir(lock_root):
+            if name != str(version):
+                shutil.rmtree(os.path.join(lock_root, name), ignore_errors=True)
+
+
+def build_and_store(kind, region, selected_area, selected_condition, view, boundary_set, version):
+    """
+    Builds a payload and writes it straight to the shared cache. Used by the pre-warm pool
+    so payloads do not have to be copied back to the parent process. A payload a live request
+    is already building is waited for rather than built twice.
+
+    Returns:
+    int: The size of the payload.
+    """
+    key = payload_key(kind, region, selected_area, selected_condition, view, boundary_set, version)
+    payload = build_exclusively(key, lambda: build_payload(kind, region, selected_area, selected_condition, view, boundary_set, version))
+    return len(payload)
+
+
+def get_payload(kind, region, selected_area, selected_condition, view=None, boundary_set=DEFAULT_BOUNDARY_SET):
+    """
+    Returns the payload for a selection from the serving cache, building it on a miss.
+    Concurrent misses for the same payload share a single build.
+
+    Parameters:
+    kind (str): "chart", "map" or "table".
+    region (str): The region code.
+    selected_area (str): The area to filter by.
+    selected_condition (str): The condition to filter by.
+    view (str): The map type for maps, the table type for tables.
+    boundary_set (str): The boundary set charts and choropleth maps aggregate to.
+
+    Returns:
+    dict or list: The decoded figure or table records, ready to return from a callback.
+    """
+    version = get_data_version()
+    key = payload_key(kind, region, selected_area, selected_condition, view, boundary_set, version)
+    payload = get_cached(key)
+    if payload is None:
+        payload = single_flight(key, lambda: build_payload(kind, region, selected_area, selected_condition, view, boundary_set, version))
+
+    data = json.loads(payload)
+    if kind == 'map':
+        absolutize_tile_urls(data)
+    return data
+
+
+def get_viewport_markers(region, selected_area, selected_condition, bounds):
+    """
+    Picks the scatter map markers for the notifications in a map view, from the per-version
+    map_table and condition index, so panning never rebuilds or re-sends a figure.
+
+    Parameters:
+    region (str): The region code.
+    selected_area (str): The area to filter by.
+    selected_condition (str): The condition to filter by.
+    bounds (tuple): The (west, south, east, north) view bounds in degrees.
+
+    Returns:
+    dict: The markers from utils.viewport_markers.
+    """
+    version = get_data_version()
+    df = fetch_table(region_table('map_table', region), version)
+    selected = np.unpackbits(selection_bitmap(fetch_condition_index(region, version), selected_condition, selected_area)).astype(bool)
+    return viewport_markers(df, selected, bounds)
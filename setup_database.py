@@ -1,12 +1,26 @@
 import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
 import logging
-from config import get_database_url, get_csv_file_path_1, get_csv_file_path_2
-from scipy.spatial import cKDTree
+from config import get_database_url, get_csv_file_path_1, get_fsa_boundary_file
+from config import REGIONS, region_table, region_geojson_path, postal_code_region, DATA_VERSION_CHANNEL
+from config import ETL_PARTITIONED, ETL_WORKERS, ETL_TILES_PER_AXIS, ETL_LOAD_CHUNK_ROWS
+from config import BOUNDARY_SETS, boundary_geojson_path
+from database import CONDITION_COLUMNS
+from conditions import condition_bitmask
 import numpy as np
+import geopandas as gpd
+from shapely.strtree import STRtree
+from search import build_search_index
+from density import compute_density_surfaces, sample_surface, pack_density_surfaces
+from cube import build_count_cube, merge_count_cubes, cube_aggregates, pack_count_cube
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -14,93 +28,462 @@ load_dotenv()
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def calculate_density_column(df):
+def calculate_density_column(df, density):
     """
-    Calculate the density column based on the distribution of data points.
+    Calculate the density column by sampling the kernel density surface at every notification.
     
     Parameters:
     df (pd.DataFrame): The input DataFrame containing latitude and longitude columns.
+    density (dict): The surfaces from compute_density_surfaces for the same notifications.
     
     Returns:
-    pd.Series: The calculated density column.
+    pd.Series: The calculated density column, in notifications per km².
     """
     try:
-        # Reset DataFrame index to ensure alignment
-        df.reset_index(drop=True, inplace=True)
-        
-        # Debug: Print shape of DataFrame
-        logging.info(f"DataFrame shape: {df.shape}")
-        
         # Check for empty DataFrame
         if df.empty:
             logging.error("DataFrame is empty.")
-            return pd.Series()
+            return pd.Series(dtype=np.float64)
 
-        # Define grid size or bins
-        grid_size = 0.01  # Define grid cell size (adjust as needed)
+        density_values = sample_surface(density, df['Latitude'].to_numpy(), df['Longitude'].to_numpy())
+        return pd.Series(density_values.round(6), index=df.index, dtype=np.float64)
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+        return pd.Series(dtype=np.float64)  # Return empty Series in case of error
 
-        # Calculate the number of grid cells in latitude and longitude directions
-        lat_bins = np.linspace(df['Latitude'].min(), df['Latitude'].max(), num=8090)
-        lon_bins = np.linspace(df['Longitude'].min(), df['Longitude'].max(), num=10530)
+# Base names of the tables loaded per region, which are all published through shadow tables
+REGION_TABLES = (
+    'asbestos_data', 'map_table', 'data_table', 'aggregated_fsa_table', 'search_index',
+    'density_surface', 'boundary_units', 'count_cube',
+)
 
-        # Debug: Print dimensions of lat_bins and lon_bins
-        logging.info(f"lat_bins dimensions: {lat_bins.shape}")
-        logging.info(f"lon_bins dimensions: {lon_bins.shape}")
+def shadow_table(table_name, version):
+    """
+    Get the name a table is loaded under before it is swapped in by publish_tables.
 
-        # Create a 2D histogram to count the number of data points in each grid cell
-        hist, _, _ = np.histogram2d(df['Latitude'], df['Longitude'], bins=[lat_bins, lon_bins])
-        
-        # Debug: Print dimensions of hist
-        logging.info(f"hist dimensions: {hist.shape}")
+    Parameters:
+    table_name (str): The live table name.
+    version (str): The data version being loaded.
 
-        # Create a KDTree for efficient nearest neighbor search
-        tree = cKDTree(df[['Latitude', 'Longitude']])
-        
-        # Function to calculate density value for a single row
-        def calculate_density(row):
-            try:
-                # Find indices of nearest neighbors within a certain radius (e.g., grid_size / 2)
-                num_neighbors = len(tree.query_ball_point([row['Latitude'], row['Longitude']], grid_size / 2))
-                
-                # Calculate density value
-                lat_index = np.digitize(row['Latitude'], lat_bins) - 1
-                lon_index = np.digitize(row['Longitude'], lon_bins) - 1
-                density_value = round(num_neighbors / hist[lat_index, lon_index], 6)
-                
-                return density_value
-            except Exception as e:
-                logging.error(f"Error calculating density for row: {row}, error: {e}")
-                return np.nan  # Return NaN if an error occurs for this row
-        
-        # Apply the function to each row in the DataFrame to calculate density values
-        density_values = df.apply(calculate_density, axis=1)
+    Returns:
+    str: The shadow table name.
+    """
+    return f"{table_name}__v{version}"
 
-        # Return the calculated density values as a Series with the same index as the input DataFrame
-        return density_values.astype(np.float64)
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-        return pd.Series()  # Return empty Series in case of error
+def create_density_surface_table(density, engine, region, version):
+    """
+    Store a region's kernel density surfaces as one compressed blob.
+
+    Parameters:
+    density (dict): The surfaces from compute_density_surfaces.
+    engine (sqlalchemy.engine.Engine): The database engine.
+    region (str): The region code.
+    version (str): The data version being loaded.
+
+    Returns:
+    str: The live name of the table written.
+    """
+    table_name = region_table('density_surface', region)
+    payload = pack_density_surfaces(density)
+    logging.info(f"Density surfaces for {region} packed into {len(payload)} bytes.")
+    pd.DataFrame({'region': [region], 'payload': [payload]}).to_sql(
+        shadow_table(table_name, version), engine, index=False, if_exists='replace'
+    )
+    return table_name
 
+def create_count_cube_table(cube, engine, region, version):
+    """
+    Store a region's count cube as one compressed blob.
 
+    Parameters:
+    cube (dict): The cube from build_count_cube.
+    engine (sqlalchemy.engine.Engine): The database engine.
+    region (str): The region code.
+    version (str): The data version being loaded.
 
+    Returns:
+    str: The live name of the table written.
+    """
+    table_name = region_table('count_cube', region)
+    payload = pack_count_cube(cube)
+    logging.info(f"Count cube for {region} of shape {cube['counts'].shape} packed into {len(payload)} bytes.")
+    pd.DataFrame({'region': [region], 'payload': [payload]}).to_sql(
+        shadow_table(table_name, version), engine, index=False, if_exists='replace'
+    )
+    return table_name
 
-def create_engine_and_tables(file_path_1, file_path_2, database_url):
+def create_search_index(df, engine, region, version):
     """
-    Create a database engine and multiple table schemas from a CSV file.
+    Build the inverted search index for a region and write it to its search_index partition.
 
     Parameters:
-    file_path_1 (str): The path to the CSV file containing the overall data.
-    file_path_2 (str): The path to the CSV file containing the FSA-summarized data.
+    df (pd.DataFrame): The notifications written to the region's data_table.
+    engine (sqlalchemy.engine.Engine): The database engine.
+    region (str): The region code.
+    version (str): The data version being loaded.
+
+    Returns:
+    str: The live name of the table written.
+    """
+    # Index names include the version so they never clash with the indexes of the live tables
+    search_table = shadow_table(region_table('search_index', region), version)
+    data_table = shadow_table(region_table('data_table', region), version)
+    search_index = build_search_index(df)
+    logging.info(f"Search index for {region} has {len(search_index)} postings.")
+    search_index.to_sql(search_table, engine, index=False, if_exists='replace', method='multi', chunksize=10000)
+
+    # Prefix lookups use LIKE 'term%', which needs a pattern-aware index on Postgres
+    token_opclass = ' text_pattern_ops' if engine.dialect.name == 'postgresql' else ''
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {search_table}_token_idx ON {search_table} (token{token_opclass})'))
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {data_table}_confirmation_idx ON {data_table} ("confirmationNo")'))
+    return region_table('search_index', region)
+
+def create_region_boundary_files(boundary_file, regions):
+    """
+    Split a national FSA boundary file into one GeoJSON file per region.
+
+    Parameters:
+    boundary_file (str): The national FSA boundary shapefile or GeoJSON, with PRUID and CFSAUID columns.
+    regions (list): The region codes to write boundary files for.
+
+    Returns:
+    None
+    """
+    gdf = gpd.read_file(boundary_file).to_crs('epsg:4326')
+    for region in regions:
+        region_gdf = gdf[gdf['PRUID'] == REGIONS[region]['pruid']]
+        if region_gdf.empty:
+            logging.warning(f"No boundaries found for {region} in {boundary_file}.")
+            continue
+        output_path = region_geojson_path(region)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        region_gdf.to_file(output_path, driver='GeoJSON')
+        logging.info(f"Boundary file for {region} saved to {output_path}")
+
+@lru_cache(maxsize=None)
+def read_boundaries(path):
+    """
+    Read a boundary file and index its polygons, once per process, so ETL workers that handle
+    several partitions of a region do not re-read it for each one.
+
+    Returns:
+    tuple: The GeoDataFrame in EPSG:4326 and an STRtree over its geometries.
+    """
+    gdf = gpd.read_file(path).to_crs('epsg:4326')
+    return gdf, STRtree(gdf.geometry.values)
+
+def boundary_units(df, region):
+    """
+    List the units of each boundary set available for the region, numbered by the codes assign_boundary_codes gives them.
+
+    Parameters:
+    df (pd.DataFrame): All of the region's notifications, since units that are notification attributes are taken from them.
+    region (str): The region code.
+
+    Returns:
+    pd.DataFrame: The units of every set, with their code, id and display name.
+    """
+    units = []
+    for boundary_set, boundary in BOUNDARY_SETS.items():
+        if 'attribute' in boundary:
+            # The unit is already an attribute of the notification
+            unit_ids = sorted(df[boundary['attribute']].dropna().unique())
+            names = unit_ids
+        else:
+            path = boundary_geojson_path(boundary_set, region)
+            if not os.path.exists(path):
+                logging.info(f"No {boundary['label']} boundaries for {region} at {path}.")
+                continue
+            gdf, _ = read_boundaries(path)
+            unit_ids = gdf[boundary['feature_id']].astype(str).tolist()
+            names = gdf[boundary['feature_name']].astype(str).tolist() if boundary.get('feature_name') in gdf else unit_ids
+        units.append(pd.DataFrame({
+            'boundary_set': boundary_set,
+            'code': np.arange(len(unit_ids), dtype=np.int32),
+            'unit': unit_ids,
+            'name': names,
+        }))
+    return pd.concat(units, ignore_index=True)
+
+def boundary_codes(df, region, units):
+    """
+    Find the unit of every notification in each boundary set of units.
+
+    The unit is stored as an integer code in a boundary_<set> column, -1 when the notification falls
+    outside every unit, so the app can aggregate to any set with np.bincount instead of a spatial join.
+    The codes only depend on the notification and the units, so any subset of the region can be coded on its own.
+
+    Parameters:
+    df (pd.DataFrame): Some or all of the region's notifications.
+    region (str): The region code.
+    units (pd.DataFrame): The region's units from boundary_units.
+
+    Returns:
+    pd.DataFrame: One boundary_<set> column per set, on the index of df.
+    """
+    codes = pd.DataFrame(index=df.index)
+    for boundary_set in units['boundary_set'].unique():
+        boundary = BOUNDARY_SETS[boundary_set]
+        if 'attribute' in boundary:
+            unit_ids = units.loc[units['boundary_set'] == boundary_set, 'unit'].tolist()
+            set_codes = pd.Categorical(df[boundary['attribute']], categories=unit_ids).codes.astype(np.int32)
+        else:
+            _, tree = read_boundaries(boundary_geojson_path(boundary_set, region))
+            points = gpd.points_from_xy(df['Longitude'], df['Latitude'])
+            point_index, unit_index = tree.query(points, predicate='intersects')
+            set_codes = np.full(len(df), -1, dtype=np.int32)
+            # A point on a shared edge matches both units; reversing keeps its first match
+            set_codes[point_index[::-1]] = unit_index[::-1]
+        codes[f"boundary_{boundary_set}"] = set_codes
+    return codes
+
+def report_unplaced(df, region, units):
+    """
+    Log how many of the region's notifications fall outside every unit of each boundary set.
+    """
+    for boundary_set in units['boundary_set'].unique():
+        outside = int((df[f"boundary_{boundary_set}"] < 0).sum())
+        if outside:
+            logging.warning(f"{outside} notifications in {region} fall outside every {BOUNDARY_SETS[boundary_set]['unit_label']}.")
+
+def assign_boundary_codes(df, region):
+    """
+    Assign every notification to a unit of each boundary set available for the region.
+
+    Parameters:
+    df (pd.DataFrame): The region's notifications. The boundary_<set> code columns are added to it.
+    region (str): The region code.
+
+    Returns:
+    pd.DataFrame: The units of every set, with their code, id and display name.
+    """
+    units = boundary_units(df, region)
+    for column, set_codes in boundary_codes(df, region, units).items():
+        df[column] = set_codes
+    return units
+
+def code_and_count_partition(df, region, units):
+    """
+    Assign boundary codes to one FSA partition of a region and count its notifications into a cube.
+
+    Runs in the ETL process pool for partitioned builds; the partition cubes are summed by merge_count_cubes.
+
+    Returns:
+    tuple: The partition's boundary code columns and its count cube.
+    """
+    return boundary_codes(df, region, units), build_count_cube(df)
+
+def create_boundary_units_table(units, engine, region, version):
+    """
+    Store the units behind a region's boundary codes.
+
+    Returns:
+    str: The live table name.
+    """
+    table_name = region_table('boundary_units', region)
+    units.to_sql(shadow_table(table_name, version), engine, index=False, if_exists='replace')
+    logging.info(f"Boundary sets for {region}: {units.groupby('boundary_set').size().to_dict()} units.")
+    return table_name
+
+def validate_notifications(df):
+    """
+    Drop notifications that cannot be placed or identified, normalise the condition flags to 0/1
+    and pack them into the conditionMask bitmask.
+
+    Parameters:
+    df (pd.DataFrame): The raw notifications.
+
+    Returns:
+    pd.DataFrame: The valid notifications.
+    """
+    valid = df.dropna(subset=['confirmationNo', 'Forward_Sortation_Area', 'Latitude', 'Longitude']).copy()
+    for condition in CONDITION_COLUMNS:
+        valid[condition] = (pd.to_numeric(valid[condition], errors='coerce').fillna(0) > 0).astype(int)
+    valid['conditionMask'] = condition_bitmask(valid)
+    return valid
+
+def partition_by_fsa(df, partitions):
+    """
+    Split notifications into partitions that each hold whole FSAs, so a partition's rows stay together by area.
+
+    Parameters:
+    df (pd.DataFrame): The notifications.
+    partitions (int): The number of partitions.
+
+    Returns:
+    list: The non-empty partitions.
+    """
+    codes, _ = pd.factorize(df['Forward_Sortation_Area'])
+    return [part for _, part in df.groupby(codes % partitions) if not part.empty]
+
+def load_table(table_df, table_name, engine, load_workers=1):
+    """
+    Write a DataFrame to a new table, appending chunks from several threads when load_workers > 1.
+
+    Parameters:
+    table_df (pd.DataFrame): The rows to write.
+    table_name (str): The table name.
+    engine (sqlalchemy.engine.Engine): The database engine.
+    load_workers (int): The number of concurrent connections to load with.
+
+    Returns:
+    None
+    """
+    if load_workers <= 1 or len(table_df) <= ETL_LOAD_CHUNK_ROWS:
+        table_df.to_sql(table_name, engine, index=False, if_exists='replace', method='multi', chunksize=1000)
+        return
+
+    # Create the table empty, then fill it from parallel connections
+    table_df.head(0).to_sql(table_name, engine, index=False, if_exists='replace')
+    chunks = [table_df.iloc[start:start + ETL_LOAD_CHUNK_ROWS] for start in range(0, len(table_df), ETL_LOAD_CHUNK_ROWS)]
+    with ThreadPoolExecutor(max_workers=load_workers) as loaders:
+        futures = [
+            loaders.submit(chunk.to_sql, table_name, engine, index=False, if_exists='append', method='multi', chunksize=1000)
+            for chunk in chunks
+        ]
+        for future in futures:
+            future.result()
+
+def create_region_tables(region, df, df2, engine, version, load_workers=1):
+    """
+    Write one region's partition of every table, under shadow names.
+
+    Parameters:
+    region (str): The region code.
+    df (pd.DataFrame): The region's notifications, with the Density column.
+    df2 (pd.DataFrame): The region's FSA-summarized data, derived from its count cube.
+    engine (sqlalchemy.engine.Engine): The database engine.
+    version (str): The data version being loaded.
+    load_workers (int): The number of concurrent connections to load with.
+
+    Returns:
+    list: The live names of the tables written.
+    """
+    # Define the columns for each table
+    map_table_columns = [
+        'Forward_Sortation_Area', 'confirmationNo', 'startDate', 'endDate', 'Latitude', 'Longitude', 'formattedAddress',
+        'postalCode', 'owner', 'contractor', 'Vermiculite', 'Piping', 'Drywall', 'Insulation',
+        'Tiling', 'Floor_Tiles', 'Ceiling_Tiles', 'Ducting', 'Plaster', 'Stucco_Stipple', 'Fittings', 'Density', 'conditionMask'
+    ]
     
+    data_table_columns = [
+        'confirmationNo', 'startDate', 'endDate','formattedAddress', 'supportDescription', 'owner', 'contractor', 'Vermiculite',
+        'Piping', 'Drywall', 'Insulation', 'Tiling', 'Floor_Tiles', 'Ceiling_Tiles',
+        'Ducting', 'Plaster', 'Stucco_Stipple', 'Fittings', 'Forward_Sortation_Area'
+    ]
+
+    # The boundary codes from assign_boundary_codes travel with the map rows
+    map_table_columns += [column for column in df.columns if column.startswith('boundary_')]
+
+    tables = {
+        region_table('asbestos_data', region): df,
+        region_table('map_table', region): df[map_table_columns],
+        region_table('data_table', region): df[data_table_columns],
+        region_table('aggregated_fsa_table', region): df2,
+    }
+    for table_name, table_df in tables.items():
+        load_table(table_df, shadow_table(table_name, version), engine, load_workers)
+
+    # Map markers only carry the confirmationNo, and their details are looked up by it
+    asbestos_table = shadow_table(region_table('asbestos_data', region), version)
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {asbestos_table}_confirmation_idx ON {asbestos_table} ("confirmationNo")'))
+
+    # Build the full-text search index over the notifications
+    search_table = create_search_index(df[data_table_columns], engine, region, version)
+    logging.info(f"Tables for {region} created with {len(df)} notifications.")
+    return list(tables) + [search_table]
+
+def drop_stale_shadow_tables(engine):
+    """
+    Drop shadow tables left behind by an ingest that failed before publishing. Only names shadow_table or
+    publish_tables could have produced for this app's tables are matched, so other tables in the database are never touched.
+
+    Parameters:
+    engine (sqlalchemy.engine.Engine): The database engine.
+
+    Returns:
+    None
+    """
+    live_tables = [region_table(base, region) for base in REGION_TABLES for region in REGIONS] + ['regions']
+    stale_pattern = re.compile(rf"^({'|'.join(re.escape(name) for name in live_tables)})(__v\d+|__old)$")
+    stale_tables = [name for name in inspect(engine).get_table_names() if stale_pattern.match(name)]
+    with engine.begin() as conn:
+        for table_name in stale_tables:
+            conn.execute(text(f'DROP TABLE IF EXISTS {table_name}'))
+    if stale_tables:
+        logging.info(f"Dropped {len(stale_tables)} stale shadow tables.")
+
+def publish_tables(engine, table_names, version):
+    """
+    Swap the loaded shadow tables in for the live ones and stamp the new data version, all in one transaction,
+    so running apps see either the old data or the new data and never a mix.
+
+    On Postgres the new version is also sent with NOTIFY, which is delivered when the transaction commits,
+    so running apps can drop their cached state straight away.
+
+    Parameters:
+    engine (sqlalchemy.engine.Engine): The database engine.
+    table_names (list): The live names of the tables loaded for this version.
+    version (str): The data version being published.
+
+    Returns:
+    None
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            # Wait for running reads of the old tables to finish, but not forever
+            conn.execute(text("SET LOCAL lock_timeout = '30s'"))
+        for table_name in table_names:
+            if table_name in existing_tables:
+                conn.execute(text(f'ALTER TABLE {table_name} RENAME TO {table_name}__old'))
+            conn.execute(text(f'ALTER TABLE {shadow_table(table_name, version)} RENAME TO {table_name}'))
+            if table_name in existing_tables:
+                conn.execute(text(f'DROP TABLE {table_name}__old'))
+
+        conn.execute(text('CREATE TABLE IF NOT EXISTS data_version (version TEXT, updated_at TEXT)'))
+        conn.execute(text('DELETE FROM data_version'))
+        conn.execute(
+            text('INSERT INTO data_version (version, updated_at) VALUES (:version, :updated_at)'),
+            {'version': version, 'updated_at': pd.Timestamp.now('UTC').isoformat()},
+        )
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text('SELECT pg_notify(:channel, :version)'), {'channel': DATA_VERSION_CHANNEL, 'version': version})
+    logging.info(f"Published {len(table_names)} tables as data version {version}.")
+
+def create_engine_and_tables(file_path_1, database_url, boundary_file=None, partitioned=ETL_PARTITIONED, workers=ETL_WORKERS):
+    """
+    Create a database engine and the region-partitioned table schemas from the CSV files.
+
+    Each region's FSA x condition x start year x risk type count cube is computed from its notifications,
+    and the FSA totals and percentages are derived from it.
+
+    In partitioned mode the notifications are split by FSA and validated on a process pool, each
+    region's FSA partitions get their boundary codes and count cubes on the same pool, the density
+    surfaces are convolved there as halo-padded tiles, and the tables are loaded over several
+    connections. The result is the same as the serial build.
+
+    Parameters:
+    file_path_1 (str): The path to the CSV file containing the overall data.
     database_url (str): The database URL for creating the SQLAlchemy engine.
+    boundary_file (str): Optional national FSA boundary file to split into per-region GeoJSON files.
+    partitioned (bool): Whether to run the partitioned parallel build.
+    workers (int): The number of processes and loader connections in partitioned mode.
 
     Returns:
     None
     """
+    pool = None
     try:
         # Create engine
         engine = create_engine(database_url)
 
+        # Everything is loaded under shadow names for this version and swapped in at the end
+        version = time.strftime('%Y%m%d%H%M%S', time.gmtime())
+        drop_stale_shadow_tables(engine)
+
         # Load data from CSV
         df = pd.read_csv(file_path_1)
         
@@ -109,41 +492,71 @@ def create_engine_and_tables(file_path_1, file_path_2, database_url):
             logging.error("DataFrame is empty.")
             return
 
-        # Calculate density column
-        df['Density'] = calculate_density_column(df)
-        
-        df2 = pd.read_csv(file_path_2)
+        started = time.time()
+        raw_count = len(df)
+        if partitioned:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            # A few partitions per worker keeps the pool busy when FSAs differ in size
+            df = pd.concat(pool.map(validate_notifications, partition_by_fsa(df, workers * 4)))
+        else:
+            df = validate_notifications(df)
+        if len(df) < raw_count:
+            logging.warning(f"Dropping {raw_count - len(df)} notifications with no confirmation number, FSA or coordinates.")
 
-        # Define the columns for each table
-        map_table_columns = [
-            'Forward_Sortation_Area', 'confirmationNo', 'startDate', 'endDate', 'Latitude', 'Longitude', 'formattedAddress',
-            'postalCode', 'owner', 'contractor', 'Vermiculite', 'Piping', 'Drywall', 'Insulation',
-            'Tiling', 'Floor_Tiles', 'Ceiling_Tiles', 'Ducting', 'Plaster', 'Stucco_Stipple', 'Fittings', 'Density'
-        ]
-        
-        data_table_columns = [
-            'confirmationNo', 'startDate', 'endDate','formattedAddress', 'supportDescription', 'owner', 'contractor', 'Vermiculite',
-            'Piping', 'Drywall', 'Insulation', 'Tiling', 'Floor_Tiles', 'Ceiling_Tiles',
-            'Ducting', 'Plaster', 'Stucco_Stipple', 'Fittings', 'Forward_Sortation_Area'
-        ]
-        
+        # Partition the notifications by the region of their FSA
+        df_regions = df['Forward_Sortation_Area'].map(postal_code_region)
+        if df_regions.isna().any():
+            logging.warning(f"Dropping {df_regions.isna().sum()} notifications with no known region.")
 
-        # Create or replace general table
-        df.to_sql('asbestos_data', engine, index=False, if_exists='replace', method='multi')
-        
-        # Create or replace special tables
-        df[map_table_columns].to_sql('map_table', engine, index=False, if_exists='replace', method='multi')
-        df[data_table_columns].to_sql('data_table', engine, index=False, if_exists='replace', method='multi')
-        
-        df2.to_sql('aggregated_fsa_table', engine, index=False, if_exists='replace', method='multi')
+        # SQLite allows one writer at a time, so parallel loads would only wait on each other
+        load_workers = workers if partitioned and engine.dialect.name != 'sqlite' else 1
+
+        regions = []
+        table_names = []
+        for region, region_df in df.groupby(df_regions):
+            # Kernel density surfaces per condition, then the point density sampled from them
+            region_df = region_df.copy()
+            density = compute_density_surfaces(region_df, executor=pool, tiles_per_axis=ETL_TILES_PER_AXIS)
+            region_df['Density'] = calculate_density_column(region_df, density)
+            if pool is not None:
+                # Boundary codes and cube counts are worked out per FSA partition and the cubes summed
+                units = boundary_units(region_df, region)
+                parts = partition_by_fsa(region_df, workers * 4)
+                results = list(pool.map(code_and_count_partition, parts, repeat(region), repeat(units)))
+                for column, set_codes in pd.concat([codes for codes, _ in results]).items():
+                    region_df[column] = set_codes
+                cube = merge_count_cubes([part_cube for _, part_cube in results])
+            else:
+                units = assign_boundary_codes(region_df, region)
+                cube = build_count_cube(region_df)
+            report_unplaced(region_df, region, units)
+
+            table_names += create_region_tables(region, region_df, cube_aggregates(cube), engine, version, load_workers)
+            table_names.append(create_count_cube_table(cube, engine, region, version))
+            table_names.append(create_density_surface_table(density, engine, region, version))
+            table_names.append(create_boundary_units_table(units, engine, region, version))
+            regions.append({'region': region, 'label': REGIONS[region]['label'], 'notifications': len(region_df)})
+
+        # Record which regions have data so the app only offers those
+        pd.DataFrame(regions).to_sql(shadow_table('regions', version), engine, index=False, if_exists='replace')
+        table_names.append('regions')
+
+        if boundary_file:
+            create_region_boundary_files(boundary_file, [entry['region'] for entry in regions])
+
+        publish_tables(engine, table_names, version)
         
-        logging.info("Tables created and data inserted successfully.")
+        mode = f"partitioned over {workers} workers" if partitioned else "serially"
+        logging.info(f"Tables created and data inserted successfully, {mode} in {time.time() - started:.1f}s.")
     except FileNotFoundError as e:
         logging.error(f"File not found: {e}")
     except SQLAlchemyError as e:
         logging.error(f"An error occurred with the database: {e}")
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 def main():
     """
@@ -159,9 +572,9 @@ def main():
     DATABASE_URL = get_database_url()
     
     file_path_1 = get_csv_file_path_1()
-    file_path_2 = get_csv_file_path_2()
+    boundary_file = get_fsa_boundary_file()
 
-    create_engine_and_tables(file_path_1, file_path_2, DATABASE_URL)
+    create_engine_and_tables(file_path_1, DATABASE_URL, boundary_file)
 
 if __name__ == '__main__':
     main()
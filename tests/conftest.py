@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_DIR = os.path.join(REPO_DIR, 'CSV_DATA_FILES')
+NOTIFICATIONS_CSV = os.path.join(CSV_DIR, 'asbestos-data-workspace-current-110624.csv')
+AGGREGATE_CSV = os.path.join(CSV_DIR, 'aggregateByFSA_asbestos_data.csv')
+
+# The modules under test read their settings at import time, so point them at scratch files first
+_scratch = tempfile.mkdtemp(prefix='asbestos-tests-')
+os.environ['MAPBOX_ACCESS_TOKEN'] = 'test-token'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_scratch, 'test.sqlite')}"
+os.environ['SERVING_CACHE_PATH'] = os.path.join(_scratch, 'payload_cache.sqlite')
+os.environ['PREWARM_ENABLED'] = 'false'
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture(scope='session')
+def notifications():
+    """
+    The Manitoba notifications CSV, validated the way setup_database loads it.
+    """
+    from setup_database import validate_notifications
+    return validate_notifications(pd.read_csv(NOTIFICATIONS_CSV))
@@ -0,0 +1,76 @@
+import pytest
+from flask import Flask
+import api
+from api import encode_cursor, decode_cursor, register_api_routes
+from config import region_table
+from database import get_engine
+
+
+@pytest.fixture(scope='module')
+def client(notifications):
+    notifications.head(300).to_sql(region_table('data_table', 'MB'), get_engine(), if_exists='replace', index=False)
+    server = Flask(__name__)
+    register_api_routes(server)
+    return server.test_client()
+
+
+@pytest.fixture
+def data_version(monkeypatch):
+    version = {'current': 'v1'}
+    monkeypatch.setattr(api, 'get_data_version', lambda: version['current'])
+    return version
+
+
+@pytest.mark.parametrize('confirmation_no', [0, 7, 20240611123456])
+def test_cursor_round_trip(confirmation_no):
+    assert decode_cursor(encode_cursor(confirmation_no)) == confirmation_no
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', encode_cursor('12'), encode_cursor(True), encode_cursor(None)])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_pages_cover_every_match_once(client, data_version, notifications):
+    expected = sorted(notifications.head(300).loc[lambda df: df['Drywall'] == 1, 'confirmationNo'].astype(int))
+    assert len(expected) > 25
+    seen, cursor = [], None
+    while True:
+        query = {'region': 'MB', 'condition': 'Drywall', 'limit': 25}
+        if cursor:
+            query['cursor'] = cursor
+        body = client.get('/api/notifications', query_string=query).get_json()
+        assert body['count'] <= 25
+        seen += [row['confirmationNo'] for row in body['results']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_bad_cursor_is_a_400(client, data_version):
+    assert client.get('/api/notifications', query_string={'cursor': 'not a cursor'}).status_code == 400
+
+
+def test_matching_if_none_match_is_a_304(client, data_version):
+    first = client.get('/api/notifications', query_string={'region': 'MB', 'limit': 5})
+    assert first.status_code == 200
+    etag = first.headers['ETag'].strip('"')
+
+    repeat = client.get('/api/notifications', query_string={'region': 'MB', 'limit': 5}, headers={'If-None-Match': f'"{etag}"'})
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+    assert repeat.headers['ETag'].strip('"') == etag
+
+    other_query = client.get('/api/notifications', query_string={'region': 'MB', 'limit': 6}, headers={'If-None-Match': f'"{etag}"'})
+    assert other_query.status_code == 200
+
+    data_version['current'] = 'v2'
+    new_data = client.get('/api/notifications', query_string={'region': 'MB', 'limit': 5}, headers={'If-None-Match': f'"{etag}"'})
+    assert new_data.status_code == 200
+    assert new_data.headers['ETag'].strip('"') != etag
+
+
+def test_non_numeric_notification_id_is_a_404(client, data_version):
+    assert client.get('/api/notifications/abc', query_string={'region': 'MB'}).status_code == 404
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from conditions import selection_mask, build_condition_index, selection_bitmap, count_rows, format_condition_selection
+
+SELECTIONS = [
+    (["Drywall"], 'OR'),
+    (["Drywall", "Piping"], 'OR'),
+    (["Vermiculite", "Insulation", "Plaster"], 'OR'),
+    (["Drywall", "Piping"], 'AND'),
+    (["Drywall", "Plaster", "Stucco_Stipple"], 'AND'),
+]
+
+
+def pandas_filter(df, conditions, mode):
+    flags = df[conditions] == 1
+    return (flags.all(axis=1) if mode == 'AND' else flags.any(axis=1)).to_numpy()
+
+
+@pytest.mark.parametrize('conditions, mode', SELECTIONS)
+def test_selection_mask_matches_pandas_filter(notifications, conditions, mode):
+    selected_condition = format_condition_selection(conditions, mode)
+    expected = pandas_filter(notifications, conditions, mode)
+    assert expected.any()
+    np.testing.assert_array_equal(selection_mask(notifications, selected_condition), expected)
+    # Frames without a conditionMask are masked from their condition columns
+    without_mask = notifications.drop(columns='conditionMask')
+    np.testing.assert_array_equal(selection_mask(without_mask, selected_condition), expected)
+
+
+@pytest.mark.parametrize('conditions, mode', SELECTIONS)
+@pytest.mark.parametrize('selected_area', ["All Areas", "R2H", "R3T"])
+def test_selection_bitmap_matches_pandas_filter(notifications, conditions, mode, selected_area):
+    index = build_condition_index(notifications)
+    bitmap = selection_bitmap(index, format_condition_selection(conditions, mode), selected_area)
+
+    expected = pandas_filter(notifications, conditions, mode)
+    if selected_area != "All Areas":
+        expected = expected & (notifications['Forward_Sortation_Area'] == selected_area).to_numpy()
+    np.testing.assert_array_equal(np.unpackbits(bitmap, count=index['rows']).astype(bool), expected)
+    assert count_rows(bitmap) == expected.sum()
+
+
+def test_all_conditions_selects_every_row(notifications):
+    index = build_condition_index(notifications)
+    assert selection_mask(notifications, "All Conditions").all()
+    assert count_rows(selection_bitmap(index, "All Conditions")) == len(notifications)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import AGGREGATE_CSV
+from cube import build_count_cube, merge_count_cubes, cube_aggregates, pack_count_cube, unpack_count_cube, trend_slice
+from cube import notification_years, UNKNOWN_YEAR
+from setup_database import partition_by_fsa
+
+
+@pytest.fixture(scope='module')
+def cube(notifications):
+    return build_count_cube(notifications)
+
+
+def test_cube_aggregates_match_fsa_summary_csv(cube):
+    expected = pd.read_csv(AGGREGATE_CSV)
+    expected = expected[expected['Forward_Sortation_Area'] != 'Total'].reset_index(drop=True)
+    table = cube_aggregates(cube)
+    assert list(table['Forward_Sortation_Area']) == list(expected['Forward_Sortation_Area'])
+    assert sorted(table.columns) == sorted(expected.columns)
+    pd.testing.assert_frame_equal(table[expected.columns], expected, check_dtype=False)
+
+
+def test_cube_totals_match_csv_total_row(cube):
+    expected = pd.read_csv(AGGREGATE_CSV).set_index('Forward_Sortation_Area').loc['Total']
+    totals = cube['counts'].sum(axis=(0, 2, 3))
+    assert totals[0] == expected['Total_Notifs']
+    for position, measure in enumerate(cube['measures'][1:], start=1):
+        assert totals[position] == expected[f"Total_{measure}"]
+
+
+def test_trend_slice_sums_to_known_year_counts(cube, notifications):
+    trends = trend_slice(unpack_count_cube(pack_count_cube(cube)))
+    assert trends['Notifications'].sum() == (notification_years(notifications) != UNKNOWN_YEAR).sum()
+    assert list(trends['Year']) == list(range(trends['Year'].min(), trends['Year'].max() + 1))
+
+
+def test_merged_partition_cubes_equal_whole_cube(cube, notifications):
+    merged = merge_count_cubes([build_count_cube(part) for part in partition_by_fsa(notifications, 7)])
+    for axis in ('fsas', 'measures', 'years', 'risk_types'):
+        np.testing.assert_array_equal(merged[axis], cube[axis])
+    np.testing.assert_array_equal(merged['counts'], cube['counts'])
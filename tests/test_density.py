@@ -0,0 +1,25 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+from density import compute_density_surfaces, CONDITIONS
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+# The wide bandwidth gives a halo larger than the tiles themselves
+@pytest.mark.parametrize('grid_size, bandwidth_m, tiles_per_axis', [(256, 400, 4), (256, 400, 3), (128, 20000, 8)])
+def test_tiled_surfaces_equal_single_pass(notifications, executor, grid_size, bandwidth_m, tiles_per_axis):
+    single = compute_density_surfaces(notifications, grid_size=grid_size, bandwidth_m=bandwidth_m)
+    tiled = compute_density_surfaces(notifications, grid_size=grid_size, bandwidth_m=bandwidth_m,
+                                     executor=executor, tiles_per_axis=tiles_per_axis)
+    np.testing.assert_array_equal(tiled['bounds'], single['bounds'])
+    assert list(tiled['surfaces']) == CONDITIONS
+    for condition in CONDITIONS:
+        expected = single['surfaces'][condition]
+        assert expected.max() > 0
+        # Each tile is its own FFT, so only round-off may differ
+        np.testing.assert_allclose(tiled['surfaces'][condition], expected, rtol=0, atol=expected.max() * 1e-5)
@@ -0,0 +1,80 @@
+import base64
+import os
+import threading
+import time
+import pytest
+import serving_cache
+from serving_cache import payload_key, get_connection, set_cached, get_cached, total_bytes, single_flight
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """
+    Points the serving cache at an empty database for one test.
+    """
+    monkeypatch.setattr(serving_cache, 'SERVING_CACHE_PATH', str(tmp_path / 'payload_cache.sqlite'))
+    monkeypatch.setattr(serving_cache._local, 'conn', None, raising=False)
+    yield get_connection()
+    serving_cache._local.conn.close()
+    serving_cache._local.conn = None
+
+
+def test_payload_key_changes_with_data_version():
+    selection = ('map', 'MB', 'R2H', 'Drywall', 'Density Heatmap', 'fed')
+    assert payload_key(*selection, 'v1') == payload_key(*selection, 'v1')
+    assert payload_key(*selection, 'v1') != payload_key(*selection, 'v2')
+    assert payload_key(*selection, 'v2')[-1] == 'v2'
+
+
+def test_payload_key_ignores_selections_the_payload_does_not_use():
+    assert payload_key('chart', 'MB', 'R2H', 'Drywall', 'Density Heatmap', 'fed', 'v1') == \
+        payload_key('chart', 'MB', 'R2H', 'Drywall', None, 'fed', 'v1')
+    assert payload_key('map', 'MB', 'R2H', 'Drywall', 'Density Heatmap', 'fed', 'v1') == \
+        payload_key('map', 'MB', 'R2H', 'Drywall', 'Density Heatmap', 'ed', 'v1')
+    assert payload_key('map', 'MB', 'R2H', 'Drywall', 'Choropleth Tile Map', 'fed', 'v1') != \
+        payload_key('map', 'MB', 'R2H', 'Drywall', 'Choropleth Tile Map', 'ed', 'v1')
+
+
+def test_evict_keeps_total_within_budget(cache, monkeypatch):
+    budget = 20000
+    monkeypatch.setattr(serving_cache, 'SERVING_CACHE_MAX_BYTES', budget)
+    for number in range(60):
+        # Random payloads barely compress, so each one takes a real share of the budget
+        payload = base64.b64encode(os.urandom(1500)).decode('ascii')
+        set_cached(payload_key('chart', 'MB', f"R{number}A", 'Drywall', None, 'fed', 'v1'), payload)
+        assert total_bytes(cache) <= budget
+
+    stored = cache.execute('SELECT COUNT(*), SUM(size) FROM payloads').fetchone()
+    assert 0 < stored[0] < 60
+    assert stored[1] == total_bytes(cache)
+    # The most recent payload survives eviction
+    assert get_cached(payload_key('chart', 'MB', 'R59A', 'Drywall', None, 'fed', 'v1')) is not None
+
+
+def test_single_flight_builds_once_under_concurrency(cache):
+    key = payload_key('map', 'MB', 'All Areas', 'Drywall', 'Density Heatmap', None, 'v1')
+    calls = []
+    calls_lock = threading.Lock()
+
+    def build():
+        with calls_lock:
+            calls.append(threading.get_ident())
+        time.sleep(0.2)
+        return 'payload'
+
+    start = threading.Barrier(8)
+    results = [None] * 8
+
+    def request(position):
+        start.wait()
+        results[position] = single_flight(key, build)
+
+    threads = [threading.Thread(target=request, args=(position,)) for position in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['payload'] * 8
+    assert get_cached(key) == 'payload'
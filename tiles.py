@@ -0,0 +1,380 @@
+import os
+import re
+import threading
+import numpy as np
+import mapbox_vector_tile
+from flask import Response, request, abort, send_file
+from shapely.geometry import box, shape, Point
+from shapely.strtree import STRtree
+from shapely.ops import transform
+from utils import load_geojson
+from serving_cache import fetch_table, fetch_condition_index
+from database import get_data_version, on_data_version_change
+from conditions import parse_condition_selection, selection_bitmap
+from config import TILE_CACHE_DIR, TILE_CACHE_MAX_BYTES, TILE_EXTENT, TILE_BUFFER
+from config import REGIONS, BOUNDARY_SETS, region_table, region_geojson_path, boundary_geojson_path
+
+# Half the width of the Web Mercator world in metres
+ORIGIN_SHIFT = 20037508.342789244
+TILE_LAYERS = ('notifications', 'fsa')
+FSA_PATTERN = re.compile(r'^[A-Z][0-9][A-Z]$')
+
+_index_lock = threading.Lock()
+# Indexes are built per region and data version the first time one of its tiles is requested
+_point_indexes = {}
+_polygon_indexes = {}
+_cache_lock = threading.Lock()
+_cache_bytes = None
+
+
+def lonlat_to_mercator(lon, lat):
+    """
+    Projects WGS 84 longitude/latitude to Web Mercator metres.
+
+    Parameters:
+    lon (float or np.ndarray): Longitude in degrees.
+    lat (float or np.ndarray): Latitude in degrees.
+
+    Returns:
+    tuple: The projected (x, y) coordinates.
+    """
+    x = np.asarray(lon) * ORIGIN_SHIFT / 180.0
+    y = np.log(np.tan((90.0 + np.asarray(lat)) * np.pi / 360.0)) * ORIGIN_SHIFT / np.pi
+    return x, y
+
+
+def tile_bounds(z, x, y):
+    """
+    Computes the Web Mercator bounds of an XYZ tile.
+
+    Parameters:
+    z (int): The zoom level.
+    x (int): The tile column.
+    y (int): The tile row, counted from the top.
+
+    Returns:
+    tuple: The (minx, miny, maxx, maxy) bounds in metres.
+    """
+    tile_size = 2 * ORIGIN_SHIFT / (2 ** z)
+    minx = -ORIGIN_SHIFT + x * tile_size
+    maxy = ORIGIN_SHIFT - y * tile_size
+    return minx, maxy - tile_size, minx + tile_size, maxy
+
+
+def build_point_index(region, version):
+    """
+    Builds the spatial index over the notification points in a region's map_table.
+
+    The rows come from the serving cache's per-version copy of the table, so tiles do not read it a second time.
+
+    Parameters:
+    region (str): The region code.
+    version (str): The data version to index.
+
+    Returns:
+    dict: The STRtree, the projected points, and the map_table row and confirmationNo/FSA of each point.
+    """
+    df = fetch_table(region_table('map_table', region), version)
+    rows = np.flatnonzero(df['Latitude'].notna().to_numpy() & df['Longitude'].notna().to_numpy())
+    xs, ys = lonlat_to_mercator(df['Longitude'].to_numpy()[rows], df['Latitude'].to_numpy()[rows])
+    points = [Point(px, py) for px, py in zip(xs, ys)]
+    return {
+        'tree': STRtree(points),
+        'points': points,
+        'rows': rows,
+        'properties': df[['confirmationNo', 'Forward_Sortation_Area']].iloc[rows].astype(str).to_dict('records'),
+    }
+
+
+def build_polygon_index(region):
+    """
+    Builds the spatial index over the FSA polygons from a region's GeoJSON boundary file.
+
+    Parameters:
+    region (str): The region code.
+
+    Returns:
+    dict: The STRtree, the projected polygons and their FSA codes.
+    """
+    geojson_data = load_geojson(region_geojson_path(region))
+    polygons = []
+    codes = []
+    for feature in geojson_data['features']:
+        geometry = transform(lambda lon, lat, z=None: lonlat_to_mercator(lon, lat), shape(feature['geometry']))
+        polygons.append(geometry)
+        codes.append(feature['properties'].get('CFSAUID'))
+    return {
+        'tree': STRtree(polygons),
+        'polygons': polygons,
+        'codes': codes,
+    }
+
+
+def get_point_index(region, version):
+    key = (region, version)
+    with _index_lock:
+        if key not in _point_indexes:
+            # Drop the region's index for older data before building the new one
+            for stale_key in [k for k in _point_indexes if k[0] == region]:
+                del _point_indexes[stale_key]
+            _point_indexes[key] = build_point_index(region, version)
+        return _point_indexes[key]
+
+
+def get_polygon_index(region):
+    key = (region, get_data_version())
+    with _index_lock:
+        if key not in _polygon_indexes:
+            for stale_key in [k for k in _polygon_indexes if k[0] == region]:
+                del _polygon_indexes[stale_key]
+            _polygon_indexes[key] = build_polygon_index(region)
+        return _polygon_indexes[key]
+
+
+def reset_tile_indexes():
+    """
+    Drops the in-memory spatial indexes so they are rebuilt from fresh data on the next tile request.
+    """
+    with _index_lock:
+        _point_indexes.clear()
+        _polygon_indexes.clear()
+
+
+on_data_version_change(reset_tile_indexes)
+
+
+def notification_features(region, bounds, selected_area, selected_condition):
+    """
+    Collects the notification points that fall inside the tile bounds and match the selection.
+
+    Parameters:
+    region (str): The region code.
+    bounds (tuple): The buffered tile bounds in Web Mercator metres.
+    selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
+    selected_condition (str): The condition selection to filter by. If "All Conditions", no condition filtering is applied.
+
+    Returns:
+    list: The features for the notifications layer.
+    """
+    version = get_data_version()
+    index = get_point_index(region, version)
+    candidates = index['tree'].query(box(*bounds))
+    if len(candidates) == 0:
+        return []
+
+    if selected_area != "All Areas" or selected_condition != "All Conditions":
+        # The condition index is over map_table rows, the same rows the points were taken from
+        selected = np.unpackbits(selection_bitmap(fetch_condition_index(region, version), selected_condition, selected_area)).astype(bool)
+        candidates = candidates[selected[index['rows'][candidates]]]
+
+    return [{'geometry': index['points'][i], 'properties': index['properties'][i]} for i in np.sort(candidates)]
+
+
+def fsa_features(region, bounds, z):
+    """
+    Collects the FSA polygons that intersect the tile, clipped to the buffered tile and simplified for the zoom level.
+
+    Parameters:
+    region (str): The region code.
+    bounds (tuple): The buffered tile bounds in Web Mercator metres.
+    z (int): The zoom level, used to pick the simplification tolerance.
+
+    Returns:
+    list: The features for the fsa layer.
+    """
+    index = get_polygon_index(region)
+    clip_box = box(*bounds)
+    # Roughly a quarter of a tile pixel at this zoom level
+    tolerance = 2 * ORIGIN_SHIFT / (2 ** z) / TILE_EXTENT / 4
+    features = []
+    for i in index['tree'].query(clip_box):
+        geometry = index['polygons'][i].intersection(clip_box).simplify(tolerance)
+        if geometry.is_empty:
+            continue
+        features.append({'geometry': geometry, 'properties': {'CFSAUID': index['codes'][i]}})
+    return features
+
+
+def encode_tile(region, layer, z, x, y, selected_area="All Areas", selected_condition="All Conditions"):
+    """
+    Encodes a single Mapbox Vector Tile for the requested layer.
+
+    Parameters:
+    region (str): The region code.
+    layer (str): Either "notifications" or "fsa".
+    z (int): The zoom level.
+    x (int): The tile column.
+    y (int): The tile row.
+    selected_area (str): The area filter applied to the notifications layer.
+    selected_condition (str): The condition filter applied to the notifications layer.
+
+    Returns:
+    bytes: The encoded tile.
+    """
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    pad = (maxx - minx) * TILE_BUFFER / TILE_EXTENT
+    buffered = (minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+    if layer == 'notifications':
+        features = notification_features(region, buffered, selected_area, selected_condition)
+    else:
+        features = fsa_features(region, buffered, z)
+
+    return mapbox_vector_tile.encode(
+        [{'name': layer, 'features': features}],
+        default_options={'quantize_bounds': (minx, miny, maxx, maxy), 'extents': TILE_EXTENT},
+    )
+
+
+def tile_cache_path(region, layer, z, x, y, selected_area, selected_condition):
+    """
+    Builds the on-disk cache path for a tile. The data version is part of the path,
+    so tiles of replaced data are never served and age out through LRU eviction.
+
+    Returns:
+    str: The path of the cached tile file.
+    """
+    variant = f"{selected_area}__{selected_condition}".replace(' ', '_').replace(os.sep, '_')
+    return os.path.join(TILE_CACHE_DIR, get_data_version(), region, layer, variant, str(z), str(x), f"{y}.pbf")
+
+
+def read_cached_tile(path):
+    """
+    Reads a tile from the disk cache and marks it as recently used.
+
+    Returns:
+    bytes: The tile, or None if it is not cached.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        # The modification time doubles as the last access time for LRU eviction
+        os.utime(path)
+        return data
+    except FileNotFoundError:
+        return None
+
+
+def write_cached_tile(path, data):
+    """
+    Writes a tile to the disk cache and evicts the least recently used tiles when over budget.
+    """
+    global _cache_bytes
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, _, size in scan_tile_cache())
+        else:
+            _cache_bytes += len(data)
+        if _cache_bytes > TILE_CACHE_MAX_BYTES:
+            _cache_bytes = evict_tile_cache(TILE_CACHE_MAX_BYTES * 0.9)
+
+
+def scan_tile_cache():
+    """
+    Lists every cached tile with its last access time and size.
+
+    Returns:
+    list: Tuples of (path, mtime, size).
+    """
+    entries = []
+    for root, _, files in os.walk(TILE_CACHE_DIR):
+        for name in files:
+            if not name.endswith('.pbf'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+    return entries
+
+
+def evict_tile_cache(target_bytes):
+    """
+    Deletes the least recently used tiles until the cache fits in target_bytes.
+
+    Parameters:
+    target_bytes (float): The size the cache should shrink to.
+
+    Returns:
+    int: The size of the cache after eviction.
+    """
+    entries = sorted(scan_tile_cache(), key=lambda entry: entry[1])
+    total = sum(size for _, _, size in entries)
+    for path, _, size in entries:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def get_tile(region, layer, z, x, y, selected_area="All Areas", selected_condition="All Conditions"):
+    """
+    Returns a tile from the disk cache, encoding and caching it on a miss.
+
+    Returns:
+    bytes: The encoded tile.
+    """
+    if layer == 'fsa':
+        selected_area, selected_condition = "All Areas", "All Conditions"
+    path = tile_cache_path(region, layer, z, x, y, selected_area, selected_condition)
+    data = read_cached_tile(path)
+    if data is None:
+        data = encode_tile(region, layer, z, x, y, selected_area, selected_condition)
+        try:
+            write_cached_tile(path, data)
+        except OSError as e:
+            print(f"Error caching tile {path}: {e}")
+    return data
+
+
+def register_tile_routes(server):
+    """
+    Registers the vector tile endpoint, and the boundary GeoJSON the choropleth references, on the Flask server.
+
+    Parameters:
+    server (flask.Flask): The Flask server behind the Dash app.
+    """
+    @server.route('/tiles/<region>/<layer>/<int:z>/<int:x>/<int:y>.pbf')
+    def serve_tile(region, layer, z, x, y):
+        if region not in REGIONS or layer not in TILE_LAYERS or not 0 <= z <= 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            abort(404)
+        selected_area = request.args.get('area', "All Areas")
+        selected_condition = request.args.get('condition', "All Conditions")
+        try:
+            parse_condition_selection(selected_condition)
+        except ValueError:
+            abort(400)
+        if selected_area != "All Areas" and not FSA_PATTERN.match(selected_area):
+            abort(400)
+        try:
+            data = get_tile(region, layer, z, x, y, selected_area, selected_condition)
+        except Exception as e:
+            print(f"Error serving tile {region}/{layer}/{z}/{x}/{y}: {e}")
+            abort(500)
+        response = Response(data, mimetype='application/vnd.mapbox-vector-tile')
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+    @server.route('/boundaries/<boundary_set>/<region>.geojson')
+    def serve_boundaries(boundary_set, region):
+        if region not in REGIONS or boundary_set not in BOUNDARY_SETS:
+            abort(404)
+        path = os.path.abspath(boundary_geojson_path(boundary_set, region))
+        if not os.path.isfile(path):
+            abort(404)
+        # Conditional requests are answered from the file's ETag, so a reload costs a 304
+        response = send_file(path, mimetype='application/geo+json', conditional=True)
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        return response
@@ -1,14 +1,20 @@
 import pandas as pd
-import plotly.express as px
-from database import engine
+from database import get_engine, get_data_version, on_data_version_change, CONDITION_COLUMNS
+from sqlalchemy import text
 import os
 import time
 import json
-from config import load_config
+from functools import lru_cache
+from config import load_config, FSA_GEOJSON_PATH, REGIONS, DEFAULT_REGION
+from config import region_table, AREA_DROPDOWN_OPTIONS, REGION_DROPDOWN_OPTIONS, DENSITY_RENDER_THRESHOLD
+from config import BOUNDARY_SETS, DEFAULT_BOUNDARY_SET, SCATTER_TRACE_MAX_POINTS, MAP_VIEWPORT_PX
+from density import unpack_density_surfaces, surface_cells, shared_cells
+from cube import unpack_count_cube, trend_slice, year_over_year
+from conditions import selection_mask, is_condition_combination, cooccurrence_matrix
 import numpy as np
-from scipy.spatial import cKDTree
-
-MAPBOX_ACCESS_TOKEN = load_config()
+import base64
+from urllib.parse import urlencode
+from flask import has_request_context, request
 
 def filter_data(df, selected_area, selected_condition):
     """
@@ -17,7 +23,7 @@ def filter_data(df, selected_area, selected_condition):
     Parameters:
     df (pd.DataFrame): The input DataFrame containing the data.
     selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
-    selected_condition (str): The condition to filter by. If "All Conditions", no condition filtering is applied.
+    selected_condition (str): The condition selection, e.g. "Drywall" or "Vermiculite OR Insulation". If "All Conditions", no condition filtering is applied.
 
     Returns:
     pd.DataFrame: The filtered DataFrame.
@@ -26,7 +32,7 @@ def filter_data(df, selected_area, selected_condition):
         filtered_df = df.copy()
         
         if selected_condition != "All Conditions":
-            filtered_df = filtered_df[filtered_df[selected_condition] == 1]
+            filtered_df = filtered_df[selection_mask(filtered_df, selected_condition)]
         
         if selected_area != "All Areas":
             filtered_df = filtered_df[filtered_df['Forward_Sortation_Area'] == selected_area]
@@ -36,6 +42,118 @@ def filter_data(df, selected_area, selected_condition):
         print(f"Error filtering data: {e}")
         return pd.DataFrame()
 
+@lru_cache(maxsize=None)
+def load_geojson(path=FSA_GEOJSON_PATH):
+    """
+    Loads a GeoJSON file once and keeps it in memory for later calls.
+
+    Parameters:
+    path (str): The path to the GeoJSON file.
+
+    Returns:
+    dict: The parsed GeoJSON data.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+def tile_url_template(region, layer, **params):
+    """
+    Builds the {z}/{x}/{y} URL template for a vector tile layer served by tiles.py.
+
+    Parameters:
+    region (str): The region code.
+    layer (str): The tile layer name ("notifications" or "fsa").
+    **params: Extra query parameters, such as area and condition.
+
+    Returns:
+    str: The relative URL template. Figures are cached without a host, so absolutize_tile_urls adds it when they are served.
+    """
+    # The data version busts browser caches of tiles when the data is refreshed
+    query = f"?{urlencode({**params, 'v': get_data_version()})}"
+    return f"/tiles/{region}/{layer}/{{z}}/{{x}}/{{y}}.pbf{query}"
+
+def boundary_url(boundary_set, region):
+    """
+    Builds the URL tiles.py serves a boundary set's GeoJSON from, so choropleth figures reference the
+    geometry instead of embedding it and the browser downloads it once.
+
+    Returns:
+    str: The relative URL.
+    """
+    return f"/boundaries/{boundary_set}/{region}.geojson"
+
+def absolutize_tile_urls(figure, host_url=None):
+    """
+    Prefixes the relative vector tile URLs in a serialized figure with the host, which Mapbox GL requires.
+
+    Parameters:
+    figure (dict): The figure as a dictionary.
+    host_url (str): The host to prefix. Defaults to the host of the current request.
+
+    Returns:
+    dict: The same figure, updated in place.
+    """
+    if host_url is None:
+        if not has_request_context():
+            return figure
+        host_url = request.host_url
+    base = host_url.rstrip('/')
+    for layer in figure.get('layout', {}).get('mapbox', {}).get('layers', []):
+        sources = layer.get('source')
+        if isinstance(sources, list):
+            layer['source'] = [f"{base}{source}" if isinstance(source, str) and source.startswith('/') else source for source in sources]
+    return figure
+
+def is_typed_array(value):
+    return isinstance(value, dict) and 'bdata' in value
+
+def typed_array(values, floats=False):
+    """
+    Encodes a numeric array in Plotly's base64 typed array form, which plotly.js reads directly and which is
+    a fraction of the size of the same numbers written out in JSON.
+
+    Parameters:
+    values (sequence): A one-dimensional array of numbers.
+    floats (bool): Whether float values may be stored as float32. Only coordinates can, as float32 is within
+    a metre on the ground but would show its rounding in hover text.
+
+    Returns:
+    dict or list: The {'dtype', 'bdata'} typed array in the smallest type that holds the values exactly,
+    or the values as a list when they cannot be packed.
+    """
+    array = np.asarray(values)
+    if array.ndim != 1 or array.size == 0 or array.dtype.kind not in 'iuf' or (array.dtype.kind == 'f' and not floats):
+        return array.tolist()
+    if array.dtype.kind == 'f':
+        dtype = 'f4'
+    elif array.min() >= 0 and array.max() <= 255:
+        dtype = 'u1'
+    elif array.min() >= 0 and array.max() <= 65535:
+        dtype = 'u2'
+    elif array.min() >= -2 ** 31 and array.max() < 2 ** 31:
+        dtype = 'i4'
+    else:
+        return array.tolist()
+    return {'dtype': dtype, 'bdata': base64.b64encode(array.astype(f'<{dtype}').tobytes()).decode('ascii')}
+
+def pack_figure_arrays(figure):
+    """
+    Replaces the coordinate, value and id arrays of a serialized figure's traces with typed arrays.
+
+    Parameters:
+    figure (dict): The figure as a dictionary.
+
+    Returns:
+    dict: The same figure, updated in place.
+    """
+    for trace in figure.get('data', []):
+        for key in ('lat', 'lon', 'z', 'customdata'):
+            values = trace.get(key)
+            # Lists with missing values decode to object arrays and are left as they are
+            if isinstance(values, list) and values:
+                trace[key] = typed_array(values, floats=key in ('lat', 'lon'))
+    return figure
+
 def fetch_data(table_name):
     """
     Fetches data from the specified table in the database.
@@ -48,47 +166,248 @@ def fetch_data(table_name):
     """
     query = f'SELECT * FROM {table_name}'
     try:
-        return pd.read_sql_query(query, con=engine)
+        return pd.read_sql_query(query, con=get_engine())
     except Exception as e:
         print(f"Error fetching data from {table_name}: {e}")
         return pd.DataFrame()
 
-def create_chart(df, selected_area, selected_condition):
+@lru_cache(maxsize=32)
+def load_density_surfaces(region, version=None):
+    """
+    Loads the kernel density surfaces that setup_database precomputed for a region.
+
+    Parameters:
+    region (str): The region code.
+    version (str): The data version, so a refresh loads the new surfaces.
+
+    Returns:
+    dict: The grid bounds, one surface per condition and the cells every condition is drawn on.
+    """
+    query = f'SELECT payload FROM {region_table("density_surface", region)}'
+    payload = pd.read_sql_query(query, con=get_engine())['payload'].iloc[0]
+    density = unpack_density_surfaces(bytes(payload))
+    density['cells'] = shared_cells(density, DENSITY_RENDER_THRESHOLD)
+    return density
+
+@lru_cache(maxsize=32)
+def load_count_cube(region, version=None):
+    """
+    Loads the FSA x condition x start year x risk type count cube that setup_database computed for a region.
+
+    Parameters:
+    region (str): The region code.
+    version (str): The data version, so a refresh loads the new cube.
+
+    Returns:
+    dict: The cube from cube.unpack_count_cube.
+    """
+    query = f'SELECT payload FROM {region_table("count_cube", region)}'
+    payload = pd.read_sql_query(query, con=get_engine())['payload'].iloc[0]
+    return unpack_count_cube(bytes(payload))
+
+def fetch_region_options():
+    """
+    Fetches the regions that have data, for the region dropdown.
+
+    Returns:
+    list: The dropdown options. Falls back to the default region if the regions table is missing.
+    """
+    regions_df = fetch_data('regions')
+    if regions_df.empty:
+        return [option for option in REGION_DROPDOWN_OPTIONS if option['value'] == DEFAULT_REGION]
+    available = set(regions_df['region'])
+    return [option for option in REGION_DROPDOWN_OPTIONS if option['value'] in available]
+
+@lru_cache(maxsize=64)
+def fetch_areas(region, version=None):
+    """
+    Fetches the FSA codes present in a region. Only the region's own partition is queried,
+    and the result is kept so each region is queried once.
+
+    Parameters:
+    region (str): The region code.
+    version (str): The data version, so a refresh queries again.
+
+    Returns:
+    tuple: The FSA codes, sorted.
+    """
+    table_name = region_table('map_table', region)
+    query = f'SELECT DISTINCT "Forward_Sortation_Area" FROM {table_name} ORDER BY "Forward_Sortation_Area"'
+    return tuple(pd.read_sql_query(query, con=get_engine())['Forward_Sortation_Area'].dropna())
+
+NOTIFICATION_DETAIL_COLUMNS = [
+    'confirmationNo', 'formattedAddress', 'postalCode', 'Forward_Sortation_Area', 'startDate', 'endDate',
+    'submittedDate', 'owner', 'contractor', 'riskType', 'supportDescription'
+]
+
+@lru_cache(maxsize=1024)
+def fetch_notification_detail(region, confirmation_no, version=None):
+    """
+    Fetches the full record of one notification with an indexed lookup on confirmationNo.
+
+    Parameters:
+    region (str): The region code.
+    confirmation_no: The notification's confirmationNo.
+    version (str): The data version, so a refresh queries again.
+
+    Returns:
+    dict: The notification's details, with the conditions found listed under 'conditions', or None if there is no such notification.
+    """
+    columns = ", ".join(f'"{column}"' for column in NOTIFICATION_DETAIL_COLUMNS + CONDITION_COLUMNS)
+    query = text(f'SELECT {columns} FROM {region_table("asbestos_data", region)} WHERE "confirmationNo" = :confirmation_no')
+    rows = pd.read_sql_query(query, con=get_engine(), params={'confirmation_no': confirmation_no})
+    if rows.empty:
+        return None
+    row = json.loads(rows.iloc[:1].to_json(orient='records', date_format='iso'))[0]
+    detail = {column: row[column] for column in NOTIFICATION_DETAIL_COLUMNS}
+    detail['conditions'] = [condition for condition in CONDITION_COLUMNS if row[condition] == 1]
+    return detail
+
+@lru_cache(maxsize=64)
+def fetch_boundary_sets(region, version=None):
+    """
+    Fetches the boundary sets setup_database assigned a region's notifications to.
+
+    Parameters:
+    region (str): The region code.
+    version (str): The data version, so a refresh queries again.
+
+    Returns:
+    tuple: The boundary set keys, in BOUNDARY_SETS order. Only FSAs if the region has no boundary units table.
+    """
+    units = fetch_data(region_table('boundary_units', region))
+    if units.empty:
+        return (DEFAULT_BOUNDARY_SET,)
+    available = set(units['boundary_set'])
+    return tuple(boundary_set for boundary_set in BOUNDARY_SETS if boundary_set in available)
+
+# Entries for older data versions would never be used again
+on_data_version_change(load_density_surfaces.cache_clear)
+on_data_version_change(load_count_cube.cache_clear)
+on_data_version_change(fetch_areas.cache_clear)
+on_data_version_change(fetch_notification_detail.cache_clear)
+on_data_version_change(fetch_boundary_sets.cache_clear)
+
+def fetch_boundary_options(region):
+    """
+    Builds the boundary set dropdown options for a region.
+
+    Returns:
+    list: The dropdown options.
+    """
+    try:
+        boundary_sets = fetch_boundary_sets(region, get_data_version())
+    except Exception as e:
+        print(f"Error fetching boundary sets for {region}: {e}")
+        boundary_sets = (DEFAULT_BOUNDARY_SET,)
+    return [{'label': BOUNDARY_SETS[boundary_set]['label'], 'value': boundary_set} for boundary_set in boundary_sets]
+
+def boundary_aggregates(df, units, boundary_set, selected_area="All Areas", selected_condition="All Conditions"):
+    """
+    Counts the notifications and conditions in every unit of a boundary set, from the integer codes
+    setup_database stored in the boundary_<set> column.
+
+    Parameters:
+    df (pd.DataFrame): The map_table rows, with the boundary code columns.
+    units (pd.DataFrame): The boundary_units rows for the region.
+    boundary_set (str): The boundary set to aggregate to.
+    selected_area (str): For sets other than FSAs, only count the notifications in this FSA.
+    selected_condition (str): A combination of conditions gets its own Total_ and _Percent columns.
+
+    Returns:
+    pd.DataFrame: One row per unit with notifications, in the layout of aggregated_fsa_table,
+    keyed by the boundary set's column and with a Name column.
+    """
+    boundary = BOUNDARY_SETS[boundary_set]
+    units = units[units['boundary_set'] == boundary_set].sort_values('code')
+    codes = df[f"boundary_{boundary_set}"].to_numpy()
+    mask = codes >= 0
+    if selected_area != "All Areas" and boundary_set != 'fsa':
+        mask &= (df['Forward_Sortation_Area'] == selected_area).to_numpy()
+    codes = codes[mask]
+
+    aggregates = pd.DataFrame({
+        boundary['column']: units['unit'].to_numpy(),
+        'Name': units['name'].to_numpy(),
+        'Total_Notifs': np.bincount(codes, minlength=len(units)),
+    })
+    counted = list(CONDITION_COLUMNS)
+    for condition in CONDITION_COLUMNS:
+        aggregates[f"Total_{condition}"] = np.bincount(codes, weights=df[condition].to_numpy()[mask], minlength=len(units)).astype(int)
+    if is_condition_combination(selected_condition):
+        matches = selection_mask(df, selected_condition)[mask]
+        aggregates[f"Total_{selected_condition}"] = np.bincount(codes, weights=matches, minlength=len(units)).astype(int)
+        counted.append(selected_condition)
+
+    # Units without notifications are left out, as in the FSA-summarized CSV
+    aggregates = aggregates[aggregates['Total_Notifs'] > 0].reset_index(drop=True)
+    for condition in counted:
+        # Rounded half up and formatted like the CSV, which create_chart and the choropleth parse
+        percent = np.floor(aggregates[f"Total_{condition}"] / aggregates['Total_Notifs'] * 10000 + 0.5) / 100
+        aggregates[f"{condition}_Percent"] = percent.map(lambda v: f"{v:.2f}%")
+    return aggregates
+
+def fetch_area_options(region):
+    """
+    Builds the area dropdown options for a region.
+
+    Parameters:
+    region (str): The region code.
+
+    Returns:
+    list: The dropdown options, starting with "All Areas".
+    """
+    try:
+        return AREA_DROPDOWN_OPTIONS + [{'label': area, 'value': area} for area in fetch_areas(region, get_data_version())]
+    except Exception as e:
+        print(f"Error fetching area options for {region}: {e}")
+        return AREA_DROPDOWN_OPTIONS
+
+def create_chart(df, selected_area, selected_condition, boundary_set=DEFAULT_BOUNDARY_SET):
     """
     Generates a bar chart for the selected condition or overall notification counts.
 
     Parameters:
-    df (pd.DataFrame): The input DataFrame containing the data.
+    df (pd.DataFrame): The aggregates for the boundary set, from boundary_aggregates or aggregated_fsa_table.
     selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
     selected_condition (str): The condition to filter by. If "All Conditions", no condition filtering is applied.
+    boundary_set (str): The boundary set the bars are drawn for.
 
     Returns:
     plotly.graph_objs._figure.Figure: The generated bar chart.
     """
+    # plotly.express is imported on first use because it is the slowest import in the app
+    import plotly.express as px
     try:
+        boundary = BOUNDARY_SETS[boundary_set]
+        column = boundary['column']
         
         df_chart = df.copy()
-        df_chart = df_chart[df_chart['Forward_Sortation_Area'] != 'Total']
+        df_chart = df_chart[df_chart[column] != 'Total']
+        if 'Name' not in df_chart:
+            df_chart['Name'] = df_chart[column]
         
-        if selected_area == "All Areas":
+        # The selected FSA is a bar of its own only in the FSA chart; other sets show where its notifications fall
+        if selected_area == "All Areas" or boundary_set != 'fsa':
+            scope = "" if selected_area == "All Areas" else f" in {selected_area}"
             if selected_condition == "All Conditions":
-                title_text = "Total Notifications by Area"
+                title_text = f"Total Notifications{scope} by {boundary['unit_label']}"
             else:
-                title_text = f"Percentage of Time Asbestos is found in {selected_condition} by Area"
+                title_text = f"Percentage of Time Asbestos is found in {selected_condition}{scope} by {boundary['unit_label']}"
         else:
             if selected_condition == "All Conditions":
-                area_value_ttlcount = df_chart.loc[df_chart['Forward_Sortation_Area'] == selected_area, 'Total_Notifs'].values
+                area_value_ttlcount = df_chart.loc[df_chart[column] == selected_area, 'Total_Notifs'].values
                 title_text = f"Notification Count for {selected_area}: {area_value_ttlcount[0]}"
             else:
-                area_value_percent = df_chart.loc[df_chart['Forward_Sortation_Area'] == selected_area, f"{selected_condition}_Percent"].values
+                area_value_percent = df_chart.loc[df_chart[column] == selected_area, f"{selected_condition}_Percent"].values
                 title_text = f"Percentage of Time Asbestos is found in {selected_condition} for {selected_area}: {area_value_percent[0]}"
             
-        chart_x_axis = 'Forward_Sortation_Area'
+        chart_x_axis = 'Name'
         chart_y_axis = 'Total_Notifs'
         if selected_condition != "All Conditions":
             chart_y_axis = f"{selected_condition}_Percent"
 
-        df_chart['Highlight'] = df_chart['Forward_Sortation_Area'].apply(lambda x: 'Selected' if x == selected_area else 'Other')
+        df_chart['Highlight'] = df_chart[column].apply(lambda x: 'Selected' if x == selected_area else 'Other')
         color_discrete_map = {'Selected': 'red', 'Other': 'blue'}
         
         # Check if the DataFrame is empty after filtering
@@ -104,7 +423,7 @@ def create_chart(df, selected_area, selected_condition):
             tickvals = np.arange(min_val, max_val + 5, 5)
         
         fig = px.bar(df_chart, x=chart_x_axis, y=chart_y_axis, color='Highlight', color_discrete_map=color_discrete_map, title=title_text, 
-                    hover_name='Forward_Sortation_Area')
+                    hover_name='Name', labels={'Name': column})
         
         if selected_condition != "All Conditions":
             # Add percentage symbol to y-axis labels
@@ -156,7 +475,58 @@ def create_table(df, df2, selected_table, selected_area, selected_condition):
         return []
 
 
-def create_map(df, df2, selected_map, selected_area, selected_condition):
+def create_cooccurrence_table(index, selected_area, selected_condition):
+    """
+    Lays out the condition co-occurrence matrix for the table view.
+
+    Parameters:
+    index (dict): The region's condition index from conditions.build_condition_index.
+    selected_area (str): The area to count in. If "All Areas", every notification is counted.
+    selected_condition (str): Only count the notifications matching this selection.
+
+    Returns:
+    list: One record per condition, with the number of notifications that also report each other condition.
+    """
+    try:
+        matrix = cooccurrence_matrix(index, selected_condition, selected_area)
+        return matrix.rename_axis('Condition').reset_index().to_dict('records')
+    except Exception as e:
+        print(f"Error creating co-occurrence table: {e}")
+        return []
+
+
+def create_trends(cube, selected_area, measures, risk_type):
+    """
+    Generates the year-over-year trend chart and table for an area, by indexing into the count cube.
+
+    Parameters:
+    cube (dict): The region's cube from load_count_cube.
+    selected_area (str): The area to chart. If "All Areas", the whole region is charted.
+    measures (list): "Notifications" and/or condition names, one line each.
+    risk_type (str): The risk type to count, or "All Risk Types".
+
+    Returns:
+    tuple: The line chart and the table records, with the change from the previous year for each measure.
+    """
+    import plotly.express as px
+    try:
+        trends = trend_slice(cube, selected_area, measures, risk_type)
+        scope = "All Areas" if selected_area == "All Areas" else selected_area
+        risk = "" if risk_type == "All Risk Types" else f", {risk_type}"
+        title_text = f"Notifications per Year in {scope}{risk}"
+        if trends.empty:
+            return px.line(title="No data available for the selected criteria."), []
+
+        long_df = trends.melt(id_vars='Year', var_name='Measure', value_name='Count')
+        long_df['Measure'] = long_df['Measure'].str.replace('_', ' ')
+        fig = px.line(long_df, x='Year', y='Count', color='Measure', markers=True, title=title_text)
+        fig.update_layout(xaxis={'dtick': 1}, legend_title_text='')
+        return fig, year_over_year(trends).to_dict('records')
+    except Exception as e:
+        print(f"Error creating trends: {e}")
+        return px.line(), []
+
+def create_map(df, df2, selected_map, selected_area, selected_condition, region=DEFAULT_REGION, boundary_set=DEFAULT_BOUNDARY_SET):
     """
     Creates a map visualization of the filtered data.
 
@@ -166,26 +536,26 @@ def create_map(df, df2, selected_map, selected_area, selected_condition):
     selected_map (str): The selected map type ("Density Heatmap", "Choropleth Tile Map", or "Scatter Map").
     selected_area (str): The area to filter by. If "All Areas", no area filtering is applied.
     selected_condition (str): The condition to filter by. If "All Conditions", no condition filtering is applied.
+    region (str): The region being shown, which picks the boundary file and map centre.
+    boundary_set (str): The boundary set df2 was aggregated to, drawn by the choropleth.
 
     Returns:
     plotly.graph_objs._figure.Figure: The generated map visualization.
     """
+    import plotly.express as px
     df = df.copy()
     df2 = df2.copy()
-    df2 = df2[df2['Forward_Sortation_Area'] != 'Overall']
+    df2 = df2[df2[BOUNDARY_SETS[boundary_set]['column']] != 'Overall']
     filtered_df = filter_data(df, selected_area, selected_condition)
 
-    # Load the GeoJSON file
-    with open('GeoJSON_stuff/Polygons/output_geojson_manitoba_fsa.geojson') as f:
-        geojson_data = json.load(f)
-
     try:
         if selected_map == "Density Heatmap":
-            fig = create_density_heatmap(filtered_df, geojson_data, selected_area, selected_condition)
+            area_df = df if selected_area == "All Areas" else df[df['Forward_Sortation_Area'] == selected_area]
+            fig = create_density_heatmap(filtered_df, selected_area, selected_condition, region, area_df)
         elif selected_map == "Choropleth Tile Map":
-            fig = create_choropleth_map(df2, geojson_data, selected_area, selected_condition)
+            fig = create_choropleth_map(df2, selected_area, selected_condition, region, boundary_set)
         else:  # Scatter Map
-            fig = create_scatter_map(filtered_df, geojson_data, selected_area, selected_condition)
+            fig = create_scatter_map(filtered_df, selected_area, selected_condition, region)
                 
         clocktime = time.strftime("%H:%M:%S")
         unique_id = f"{selected_area}_{selected_condition}_{clocktime}"
@@ -197,22 +567,108 @@ def create_map(df, df2, selected_map, selected_area, selected_condition):
         print(f"Error creating map: {e}")
         return px.scatter_mapbox(title="Error creating map")
 
-def create_density_heatmap(filtered_df, geojson_data, selected_area, selected_condition):
+def figure_patch(previous, current):
+    """
+    Builds a Dash Patch that turns the figure the browser has into the new one, sending only the parts that changed.
+
+    Parameters:
+    previous (dict): The figure the browser is showing.
+    current (dict): The figure to show.
+
+    Returns:
+    dash.Patch: The partial update, or None if the traces differ in number or type, or the patch would not
+    be smaller than the figure, and the whole figure must be sent.
+    """
+    from dash import Patch
+    previous_traces = previous.get('data', [])
+    current_traces = current.get('data', [])
+    if len(previous_traces) != len(current_traces):
+        return None
+    if any(old.get('type') != new.get('type') for old, new in zip(previous_traces, current_traces)):
+        return None
+
+    patch = Patch()
+    for i, (old, new) in enumerate(zip(previous_traces, current_traces)):
+        patch_changes(patch['data'][i], old, new)
+    patch_changes(patch['layout'], previous.get('layout', {}), current.get('layout', {}))
+    if len(json.dumps(patch.to_plotly_json())) >= len(json.dumps(current)):
+        return None
+    return patch
+
+def patch_changes(patch, old, new):
+    """
+    Records in a Patch every difference between two dictionaries from a figure.
+    Nested dictionaries and equal-length lists of dictionaries are compared item by item, so an unchanged
+    Mapbox layer or template is not sent; any other value that differs, including a typed array, is replaced whole.
+
+    Parameters:
+    patch (dash.Patch): The Patch, pointing at the same place as old and new.
+    old (dict): The part of the figure the browser has.
+    new (dict): The same part of the new figure.
+    """
+    for key in old.keys() - new.keys():
+        del patch[key]
+    for key, value in new.items():
+        old_value = old.get(key)
+        if isinstance(old_value, dict) and isinstance(value, dict) and not is_typed_array(value):
+            patch_changes(patch[key], old_value, value)
+        elif (isinstance(old_value, list) and isinstance(value, list) and len(old_value) == len(value)
+                and all(isinstance(item, dict) for item in old_value + value)):
+            for index, (old_item, new_item) in enumerate(zip(old_value, value)):
+                patch_changes(patch[key][index], old_item, new_item)
+        elif key not in old or old_value != value:
+            patch[key] = value
+
+def create_density_heatmap(filtered_df, selected_area, selected_condition, region=DEFAULT_REGION, area_df=None):
+    import plotly.express as px
     center = {
         "lat": filtered_df['Latitude'].median(),
         "lon": filtered_df['Longitude'].median()
     }
     zoom = 10 if selected_area == "All Areas" else 12
 
+    # Surfaces are precomputed per condition, so combinations of conditions are drawn from their points
+    heatmap_df = filtered_df
+    radius = 30
+    peak = None
+    if not is_condition_combination(selected_condition):
+        try:
+            # Draw the precomputed kernel density surface, cropped to the selected area. Every condition is drawn
+            # on the same cells of the same crop, so changing the condition only changes the cell values
+            density = load_density_surfaces(region, get_data_version())
+            area_df = filtered_df if area_df is None else area_df
+            lat_range = lon_range = None
+            if selected_area != "All Areas" and not area_df.empty:
+                lat_range = (area_df['Latitude'].min(), area_df['Latitude'].max())
+                lon_range = (area_df['Longitude'].min(), area_df['Longitude'].max())
+            lat, lon, z = surface_cells(density, selected_condition, lat_range, lon_range, cells=density['cells'])
+            # The values are scaled to 0-255 of the peak, which is as many shades as the colour scale draws;
+            # the colour bar is labelled in notifications per km² below
+            peak = float(z.max()) if len(z) else 0.0
+            levels = np.rint(z / peak * 255) if peak > 0 else np.zeros(len(z))
+            heatmap_df = pd.DataFrame({'Latitude': lat, 'Longitude': lon, 'Density': levels.astype(np.uint8)})
+            # The surface is already smoothed, so each cell only needs a small radius to cover its neighbours
+            radius = 8
+        except Exception as e:
+            print(f"Error loading density surface for {region}, falling back to points: {e}")
+
     fig = px.density_mapbox(
-        filtered_df, lat='Latitude', lon='Longitude', color_continuous_scale='plasma',
-        z='Density', radius=30, center=center, zoom=zoom, mapbox_style="satellite-streets",
-        hover_name='Forward_Sortation_Area'
+        heatmap_df, lat='Latitude', lon='Longitude', color_continuous_scale='plasma',
+        z='Density', radius=radius, center=center, zoom=zoom, mapbox_style="satellite-streets",
+        labels={'Density': 'Notifications per km²'}
     )
     fig.update_layout(
-        mapbox_accesstoken=MAPBOX_ACCESS_TOKEN,
+        mapbox_accesstoken=load_config(),
         margin={"r": 0, "t": 0, "l": 0, "b": 0}
     )
+    if peak:
+        ticks = np.linspace(0, peak, 5)
+        fig.update_layout(coloraxis={
+            'cmin': 0, 'cmax': 255,
+            'colorbar': {'tickvals': (ticks / peak * 255).round(1).tolist(), 'ticktext': [f"{tick:.3g}" for tick in ticks]},
+        })
+    # Cells have no values worth reading on hover, but clicks still reach the nearby search
+    fig.update_traces(hoverinfo='none', hovertemplate=None)
     # Set uirevision based on selection criteria
     clocktime = time.strftime("%H:%M:%S")
     unique_id = f"{selected_area}_{selected_condition}_{clocktime}"
@@ -220,13 +676,14 @@ def create_density_heatmap(filtered_df, geojson_data, selected_area, selected_co
     
     return fig
 
-def create_choropleth_map(df2, geojson_data, selected_area, selected_condition):
+def create_choropleth_map(df2, selected_area, selected_condition, region=DEFAULT_REGION, boundary_set=DEFAULT_BOUNDARY_SET):
+    import plotly.express as px
+    boundary = BOUNDARY_SETS[boundary_set]
     choropleth_df = df2.copy()
-    center = {
-        "lat": 49.89106721862937,
-        "lon": -97.13086449579419
-    }
-    choropleth_df = choropleth_df[choropleth_df['Forward_Sortation_Area'] != 'Total']
+    center = REGIONS[region]['center']
+    choropleth_df = choropleth_df[choropleth_df[boundary['column']] != 'Total']
+    if 'Name' not in choropleth_df:
+        choropleth_df['Name'] = choropleth_df[boundary['column']]
     
     if selected_condition != "All Conditions":
         # Remove the percentage symbol from the string in data
@@ -237,15 +694,16 @@ def create_choropleth_map(df2, geojson_data, selected_area, selected_condition):
 
     zoom = 10
 
+    # The browser fetches the boundaries once from their URL rather than with every figure
     fig = px.choropleth_mapbox(
-        choropleth_df, geojson=geojson_data, featureidkey="properties.CFSAUID",
-        locations='Forward_Sortation_Area', color=color, color_continuous_scale="rdbu_r",
-        hover_name='Forward_Sortation_Area', zoom=zoom, center=center,
+        choropleth_df, geojson=boundary_url(boundary_set, region), featureidkey=f"properties.{boundary['feature_id']}",
+        locations=boundary['column'], color=color, color_continuous_scale="rdbu_r",
+        hover_name='Name', zoom=zoom, center=center,
         mapbox_style="satellite",
     )
         
     fig.update_layout(
-        mapbox_accesstoken=MAPBOX_ACCESS_TOKEN,
+        mapbox_accesstoken=load_config(),
         margin={"r": 0, "t": 0, "l": 0, "b": 0}
     )
     clocktime = time.strftime("%H:%M:%S")
@@ -253,47 +711,153 @@ def create_choropleth_map(df2, geojson_data, selected_area, selected_condition):
     fig.update_layout(uirevision=unique_id)
     return fig
 
-def create_scatter_map(filtered_df, geojson_data, selected_area, selected_condition):
+def create_scatter_map(filtered_df, selected_area, selected_condition, region=DEFAULT_REGION):
+    import plotly.express as px
     center = {
         "lat": filtered_df['Latitude'].median(),
         "lon": filtered_df['Longitude'].median()
     }
+    # The points are drawn by the notifications tile layer, so the browser only loads the tiles in view.
+    # The marker trace stays empty here: set_viewport_markers fills it with the notifications in view
+    # when the figure is served, as tile layers raise no hover or click events
     fig = px.scatter_mapbox(
-        filtered_df,
+        filtered_df[['Latitude', 'Longitude', 'confirmationNo']].iloc[:0],
         lat='Latitude',
         lon='Longitude',
-        hover_name='contractor',
-        hover_data=['formattedAddress', 'startDate', 'postalCode', 'confirmationNo'],
         size_max=5,
         zoom=10 if selected_area == "All Areas" else 12,
         center=center,
     )
-    # Adjust opacity of the scatter points
-    fig.update_traces(marker={'opacity': 0.75, 'allowoverlap': True})
+    fig.update_traces(
+        customdata=[],
+        marker={'size': 8, 'opacity': 0.75, 'allowoverlap': True},
+        hovertemplate="Notification %{customdata}<extra></extra>",
+    )
+    mapbox_layers = [{
+        "minzoom": 0,
+        "maxzoom": 22,
+        "type": "line",
+        "sourcetype": "vector",
+        "source": [tile_url_template(region, 'fsa')],
+        "sourcelayer": "fsa",
+        "color": "hsl(0, 96%, 50%)",
+        "opacity": 0.25,
+        "line": {
+        "dash": [
+            3,
+            1
+        ],
+        },
+        "below": "traces",
+        },
+        {
+        "minzoom": 0,
+        "maxzoom": 22,
+        "type": "circle",
+        "sourcetype": "vector",
+        "source": [tile_url_template(region, 'notifications', area=selected_area, condition=selected_condition)],
+        "sourcelayer": "notifications",
+        "color": "#636efa",
+        "opacity": 0.75,
+        "circle": {"radius": 4},
+        "below": "traces",
+        }
+        ]
     fig.update_layout(
         mapbox_style="streets",
-        mapbox_accesstoken=MAPBOX_ACCESS_TOKEN,
+        mapbox_accesstoken=load_config(),
         margin={"r": 0, "t": 0, "l": 0, "b": 0},
-        mapbox_layers=[{
-            "minzoom": 0,
-            "maxzoom": 22,
-            "type": "line",
-            "source": "composite",
-            "color": "hsl(0, 96%, 50%)",
-            "opacity": 0.25,
-            "line": {
-            "dash": [
-                3,
-                1
-            ],
-            },
-            "below": "traces",
-            "source": geojson_data
-            }     
-            ]
+        mapbox_layers=mapbox_layers
     )
     clocktime = time.strftime("%H:%M:%S")
     unique_id = f"{selected_area}_{selected_condition}_{clocktime}"
     fig.update_layout(uirevision=unique_id)
     
     return fig
+
+def map_viewport(center, zoom, width_px=MAP_VIEWPORT_PX[0], height_px=MAP_VIEWPORT_PX[1]):
+    """
+    Works out the area a Mapbox map of the given size shows at a centre and zoom.
+
+    Parameters:
+    center (dict): The map centre, with lat and lon.
+    zoom (float): The Mapbox zoom level.
+    width_px (int): The map width in pixels.
+    height_px (int): The map height in pixels.
+
+    Returns:
+    tuple: The (west, south, east, north) bounds in degrees.
+    """
+    # Mapbox GL tiles are 512 pixels, so the Web Mercator world is 512 * 2 ** zoom pixels across
+    world_px = 512 * 2 ** zoom
+    x = (center['lon'] + 180) / 360
+    y = (1 - np.arcsinh(np.tan(np.radians(center['lat']))) / np.pi) / 2
+    half_x, half_y = width_px / 2 / world_px, height_px / 2 / world_px
+    west, east = (x - half_x) * 360 - 180, (x + half_x) * 360 - 180
+    north = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * max(y - half_y, 0)))))
+    south = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * min(y + half_y, 1)))))
+    return float(west), float(south), float(east), float(north)
+
+def relayout_viewport(relayout_data):
+    """
+    Reads the area a map shows from its relayoutData after the user pans or zooms.
+
+    Returns:
+    tuple: The (west, south, east, north) bounds in degrees, or None if the event carries no map view.
+    """
+    corners = relayout_data.get('mapbox._derived', {}).get('coordinates')
+    if corners:
+        lons, lats = zip(*corners)
+        return min(lons), min(lats), max(lons), max(lats)
+    if 'mapbox.center' in relayout_data and 'mapbox.zoom' in relayout_data:
+        return map_viewport(relayout_data['mapbox.center'], relayout_data['mapbox.zoom'])
+    return None
+
+def viewport_markers(df, selected, bounds, limit=SCATTER_TRACE_MAX_POINTS):
+    """
+    Picks the selected notifications inside a map view for the scatter map's marker trace.
+
+    Parameters:
+    df (pd.DataFrame): The region's map_table.
+    selected (np.ndarray): A boolean mask of the rows matching the area and condition selection.
+    bounds (tuple): The (west, south, east, north) view bounds in degrees.
+    limit (int): The most markers to send. A view with more gets none, and the map asks the user to zoom in.
+
+    Returns:
+    dict: The lat, lon and customdata arrays, and whether every notification in view has a marker.
+    """
+    west, south, east, north = bounds
+    lat = df['Latitude'].to_numpy(dtype=float)
+    lon = df['Longitude'].to_numpy(dtype=float)
+    rows = np.flatnonzero(selected[:len(df)] & (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east))
+    complete = len(rows) <= limit
+    if not complete:
+        rows = rows[:0]
+    return {
+        'lat': typed_array(lat[rows], floats=True),
+        'lon': typed_array(lon[rows], floats=True),
+        'customdata': typed_array(df['confirmationNo'].to_numpy()[rows]),
+        'complete': complete,
+    }
+
+def set_viewport_markers(figure, markers):
+    """
+    Puts the markers for the notifications in view into the scatter map's trace. Works on a figure
+    dictionary and on a dash.Patch alike, so a full figure and a partial update carry the same markers.
+
+    Parameters:
+    figure (dict or dash.Patch): The scatter map figure, or a Patch of it.
+    markers (dict): The result of viewport_markers.
+    """
+    trace = figure['data'][0]
+    trace['lat'] = markers['lat']
+    trace['lon'] = markers['lon']
+    trace['customdata'] = markers['customdata']
+    # Without markers the notifications are still drawn by the tile layer, but cannot be hovered or clicked
+    figure['layout']['annotations'] = [] if markers['complete'] else [{
+        'text': "Zoom in to hover over or select individual notifications",
+        'showarrow': False,
+        'xref': 'paper', 'yref': 'paper', 'x': 0.01, 'y': 0.99,
+        'xanchor': 'left', 'yanchor': 'top',
+        'bgcolor': 'rgba(255, 255, 255, 0.8)',
+    }]